@@ -4,10 +4,10 @@ doit tasks for the project.
 
 import logging
 import os
-from functools import wraps
-from itertools import chain
+import shlex
+import sys
+from functools import partial, wraps
 from pathlib import Path
-from shutil import rmtree
 from typing import Any, Dict, List, Tuple
 
 from doit.tools import config_changed, run_once
@@ -30,10 +30,7 @@ FINAL_OUTPUTS_PATH = OUTPUTS_PATH / "final"
 # Data paths
 BACKGROUND_PATH = DATA_PATH / "background"
 POETRY_LOCK = Path("poetry.lock")
-FRACTOPO_FILES = [
-    *list(Path("fractopo/fractopo").rglob("*.py")),
-    Path("fractopo/poetry.lock"),
-]
+FRACTOPO_PATH = Path("fractopo")
 TRACE_DATA_PATH = DATA_PATH / "trace_data/traces"
 AREA_DATA_PATH = DATA_PATH / "trace_data/area"
 TRACES_20M_DIR = TRACE_DATA_PATH / "20m"
@@ -121,8 +118,9 @@ POINTS_OF_INTEREST_PATH = BACKGROUND_PATH / "points_of_interest.geojson"
 BACKGROUND_OUTPUTS_PATH = OUTPUTS_PATH / "background"
 QGIS_FIGS_PATH = QGIS_PATH / "outputs"
 RASTERS_PATH = OUTPUTS_PATH / "rasters"
-RESAMPLED_RASTERS_PATH = RASTERS_PATH / "resampled_rasters"
 OPTIMIZED_RASTERS_PATH = RASTERS_PATH / "optimized_rasters"
+PREPARED_RASTERS_PATH = RASTERS_PATH / "prepared_rasters"
+ORTHOMOSAICS_ZIP_PATH = OUTPUTS_PATH / "geta_orthomosaics.zip"
 CONCATENATED_DATA_PATH = OUTPUTS_PATH / "concatenated"
 NETWORK_OUTPUTS_PATH = OUTPUTS_PATH / "networks"
 QGIS_OUTPUTS_PATH = OUTPUTS_PATH / "qgis"
@@ -133,7 +131,6 @@ SHORELINE_PATH = BACKGROUND_OUTPUTS_PATH / "shoreline_GSHHS_f_L1.geojson"
 ADMINISTRATIVE_BOUNDARIES_PATH = (
     BACKGROUND_OUTPUTS_PATH / "administrative-boundaries.geojson"
 )
-FULL_BEDROCK_GEOJSON_PATH = BACKGROUND_OUTPUTS_PATH / "bedrock_of_finland_200k.geojson"
 SFINLAND_BEDROCK_GEOJSON_PATH = (
     BACKGROUND_OUTPUTS_PATH / "bedrock_of_finland_200k_s_finland.geojson"
 )
@@ -163,6 +160,7 @@ SCALE_METADATA_TABLE_PY_PATH = SRC_PATH / "scale_metadata_table.py"
 SHORELINE_PY_PATH = SRC_PATH / "shoreline.py"
 CREATE_AREA_BOUNDARY_PY_PATH = SRC_PATH / "create_area_boundary.py"
 VISUALIZE_DRONE_RASTERS_PY_PATH = SRC_PATH / "visualize_drone_rasters.py"
+PREPARE_RASTERS_PY_PATH = SRC_PATH / "prepare_rasters.py"
 LITHOLOGY_PY_PATH = SRC_PATH / "lithology.py"
 CLI_PY_PATH = SRC_PATH / "cli.py"
 STRIATIONS_PY_PATH = SRC_PATH / "striations.py"
@@ -381,6 +379,139 @@ def command(parts: List[Any]) -> str:
     return " ".join(list(map(str, parts)))
 
 
+def wfs_download_cmd(url: str, type_name: str, output_path: Path) -> str:
+    """
+    Compile command to download features within the Åland clip box from WFS.
+    """
+    return command(
+        [
+            "python",
+            CLI_PY_PATH,
+            "wfs-download",
+            shlex.quote(f"--url={url}"),
+            shlex.quote(f"--type-name={type_name}"),
+            f"--bbox-wkt-path={ALAND_CLIP_BOX_WKT_PATH}",
+            f"--output-path={output_path}",
+        ]
+    )
+
+
+def download_cmd(url: str, output_path: Path, verify: bool = True) -> str:
+    """
+    Compile command to download url to output_path.
+
+    Downloads are verified against the sha256 manifest in ``data/``, unless
+    verify is False, and taken from the mirror directory in
+    ``$ALAND_DOWNLOAD_MIRROR`` if set.
+    """
+    return command(
+        [
+            "python",
+            CLI_PY_PATH,
+            "download",
+            shlex.quote(f"--url={url}"),
+            f"--output-path={output_path}",
+            *([] if verify else ["--no-verify"]),
+        ]
+    )
+
+
+# Run cli.py commands of tasks in the doit process instead of starting a new
+# interpreter for each. With doit -n the worker processes are reused between
+# tasks and keep imported modules, font caches and read geodata warm.
+IN_PROCESS = os.environ.get("DODO_IN_PROCESS", "0") not in ("", "0")
+SHELL_OPERATORS = {"&&", "||", "|", ";", ">", ">>", "<"}
+
+if IN_PROCESS:
+    os.environ.setdefault("GEODATA_MEMORY_CACHE_SIZE", "16")
+
+
+def _add_src_to_path():
+    src_path = str(SRC_PATH.absolute())
+    if src_path not in sys.path:
+        sys.path.insert(0, src_path)
+
+
+def _run_cli(args: List[str]) -> bool:
+    """
+    Run cli.py command in the current process.
+    """
+    _add_src_to_path()
+    from cli import APP
+
+    argv = sys.argv
+    sys.argv = [str(CLI_PY_PATH), *args]
+    try:
+        exit_code = APP(args=args, prog_name=str(CLI_PY_PATH), standalone_mode=False)
+    finally:
+        sys.argv = argv
+    return exit_code in (None, 0)
+
+
+def _cli_action(action: Any) -> Any:
+    """
+    Convert python src/cli.py shell action to an in-process python-action.
+
+    Other actions and compound shell commands are returned as is.
+    """
+    if not isinstance(action, str):
+        return action
+    parts = shlex.split(action)
+    if parts[:2] != ["python", str(CLI_PY_PATH)] or SHELL_OPERATORS & set(parts):
+        return action
+    return partial(_run_cli, parts[2:])
+
+
+def code_changed(*entrypoints: str):
+    """
+    Check if code reachable from entrypoints has changed.
+
+    Used as an uptodate check instead of file dependencies on the source
+    files. Only changes to the normalised code of the definitions reachable
+    from the entrypoints (``module:function``) in ``src`` and the ``fractopo``
+    submodule cause a rerun. The fingerprint is only computed when the task is
+    checked.
+    """
+    key = f"code_fingerprint:{','.join(entrypoints)}"
+
+    def check(task, values):
+        _add_src_to_path()
+        from code_fingerprint import code_fingerprint
+
+        fingerprint = code_fingerprint(
+            entrypoints=entrypoints, roots=[SRC_PATH, FRACTOPO_PATH]
+        )
+        task.value_savers.append(lambda: {key: fingerprint})
+        return values.get(key) == fingerprint
+
+    return check
+
+
+def _in_process_task(task: Any) -> Any:
+    if isinstance(task, dict) and ACTIONS in task:
+        task = {**task, ACTIONS: [_cli_action(action) for action in task[ACTIONS]]}
+    return task
+
+
+def in_process(func):
+    """
+    Run cli.py actions of tasks in-process when DODO_IN_PROCESS is set.
+
+    Targets, dependencies and up-to-date checks of the tasks are unchanged.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        tasks = func(*args, **kwargs)
+        if not IN_PROCESS or tasks is None:
+            return tasks
+        if isinstance(tasks, dict):
+            return _in_process_task(tasks)
+        return (_in_process_task(task) for task in tasks)
+
+    return wrapper
+
+
 @non_reproducible
 def task_qgis_source_rasters():
     """
@@ -535,19 +666,31 @@ def task_add_colorbar():
         }
 
 
-def add_label_to_image_cmd(path, label, x=30, y=60, fontsize=50):
+def image_label(label, x=30, y=60, fontsize=50, **kwargs) -> Dict[str, Any]:
     """
-    Add label to image for imagemagick processing.
+    Compose label of an image for src/compositing.py.
     """
-    return [
-        "-pointsize",
-        str(fontsize),
-        r"\( ",
-        str(path),
-        "-draw",
-        f""" "text {x},{y} '{label}'" """,
-        r" \)",
-    ]
+    return dict(text=label, x=x, y=y, font_size=fontsize, **kwargs)
+
+
+def composite_action(spec: Dict[str, Any], output_path: Path):
+    """
+    Compose python-action that renders montage spec with src/compositing.py.
+
+    Images are tiled in memory and SVGs are rasterized only once.
+    """
+
+    def composite():
+        _add_src_to_path()
+        from compositing import composite as composite_spec
+
+        composite_spec(spec=spec, output_path=output_path)
+
+    return composite
+
+
+# Uptodate check shared by all compositing tasks
+COMPOSITING_CODE_CHANGED = code_changed("compositing:composite")
 
 
 @non_reproducible
@@ -568,70 +711,43 @@ def task_qgis_fig03_and_figA01_source_rasters_montage():
     mag_3_path = SOURCE_RASTERS_OUTPUTS_PATH / MAP_MAG_3_PATH.with_suffix(".jpg").name
     int_path = SOURCE_RASTERS_OUTPUTS_PATH / MAP_INT_PATH.with_suffix(".jpg").name
 
-    cmd_base = command(
-        [
-            "magick",
-            "montage",
-            "-background",
-            "black",
-            "-font",
-            "Liberation-Mono-Bold",
-            "{}",
-            "-mattecolor",
-            "black",
-            "-fill",
-            "black",
-            "-stroke",
-            "white",
-            "-bordercolor",
-            "black",
-            "-geometry",
-            "1100x",
-            "-tile",
-            # "2x2",
-            "{}",
-            "-border",
-            "2",
-            "-frame",
-            "2",
-            "{}",
-        ]
+    spec_base = dict(
+        background="black",
+        # -border 2 -frame 2 with black bordercolor and mattecolor
+        frame=4,
+        frame_color="black",
+        geometry="1100x",
     )
-    indiv_opts = ""
-    cmd = cmd_base.format(
-        # " ".join(map(str, (dem_path, mag_2_path, em_path, int_path))),
-        " ".join(
-            [
-                f"{indiv_opts} {path}"
-                for path in (dem_path, mag_2_path, em_path, int_path)
-            ]
-        ),
-        "2x2",
-        SOURCE_MONTAGE,
+    spec = dict(
+        items=[str(path) for path in (dem_path, mag_2_path, em_path, int_path)],
+        tile="2x2",
+        **spec_base,
     )
     paths_appendix = (mag_1_path, mag_3_path)
-    cmd_appendix = cmd_base.format(
-        " ".join(map(str, paths_appendix)), "1x2", SOURCE_MONTAGE_APPENDIX
+    spec_appendix = dict(
+        items=[str(path) for path in paths_appendix], tile="1x2", **spec_base
     )
 
     yield {
         NAME: SOURCE_MONTAGE.name,
         FILE_DEP: [dem_path, em_path, mag_2_path, int_path],
-        UP_TO_DATE: [config_changed(dict(cmd_base=cmd_base, indiv_opts=indiv_opts))],
+        UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
         # TASK_DEP: ["qgis_source_rasters"],
         TASK_DEP: [resolve_task_name(task_qgis_source_rasters)],
         TARGETS: [SOURCE_MONTAGE],
-        ACTIONS: [cmd],
+        ACTIONS: [composite_action(spec=spec, output_path=SOURCE_MONTAGE)],
     }
 
     yield {
         NAME: SOURCE_MONTAGE_APPENDIX.name,
         FILE_DEP: [*paths_appendix],
-        UP_TO_DATE: [config_changed(cmd_base)],
+        UP_TO_DATE: [config_changed(spec_appendix), COMPOSITING_CODE_CHANGED],
         TASK_DEP: [resolve_task_name(task_qgis_source_rasters)],
         # TASK_DEP: ["qgis_source_rasters"],
         TARGETS: [SOURCE_MONTAGE_APPENDIX],
-        ACTIONS: [cmd_appendix],
+        ACTIONS: [
+            composite_action(spec=spec_appendix, output_path=SOURCE_MONTAGE_APPENDIX)
+        ],
     }
 
 
@@ -643,57 +759,31 @@ def task_qgis_fig04_montage():
     geta_path = QGIS_FIGS_PATH / "geta_1_20k_lineaments.jpg"
     godby_path = QGIS_FIGS_PATH / "godby_1_20k_lineaments.jpg"
 
-    cmd_base = command(
-        [
-            "magick",
-            "montage",
-            "-background",
-            "black",
-            "-font",
-            "Liberation-Mono-Bold",
-            "{}",
-            "-mattecolor",
-            "black",
-            "-fill",
-            "black",
-            "-stroke",
-            "white",
-            "-bordercolor",
-            "black",
-            "-geometry",
-            "1100x",
-            "-tile",
-            "2x1",
-            "-border",
-            "2",
-            "-frame",
-            "2",
-            "{}",
-        ]
+    label_opts = dict(
+        fontsize=250,
+        y=240,
+        font="Liberation Mono",
+        font_weight="bold",
+        fill="black",
+        stroke="white",
     )
-    label_opts = dict(fontsize=250, y=240)
     labels = ("(a)", "(b)")
-    cmd = cmd_base.format(
-        # " ".join(map(str, (dem_path, mag_2_path, em_path, int_path))),
-        " ".join(
-            [
-                " ".join(add_label_to_image_cmd(path=path, label=label, **label_opts))
-                for path, label in zip((geta_path, godby_path), labels)
-            ]
-        ),
-        SCALE_1_20000_FIG_PATH,
+    spec = dict(
+        items=[str(geta_path), str(godby_path)],
+        labels=[image_label(label, **label_opts) for label in labels],
+        background="black",
+        frame=4,
+        frame_color="black",
+        geometry="1100x",
+        tile="2x1",
     )
 
     yield {
         NAME: SCALE_1_20000_FIG_PATH.name,
         FILE_DEP: [geta_path, godby_path],
-        UP_TO_DATE: [
-            config_changed(
-                dict(cmd_base=cmd_base, label_opts=label_opts, labels=labels)
-            )
-        ],
+        UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
         TARGETS: [SCALE_1_20000_FIG_PATH],
-        ACTIONS: [cmd],
+        ACTIONS: [composite_action(spec=spec, output_path=SCALE_1_20000_FIG_PATH)],
     }
 
 
@@ -763,6 +853,8 @@ def task_concatenate_scales():
             [
                 "python",
                 CLI_PY_PATH,
+                # Leave a trace of stage durations next to the outputs
+                f"--timings={CONCATENATED_DATA_PATH / f'{name}_timings.json'}",
                 "concatenate-scale",
                 *[traces_opt.format(trace) for trace in traces],
                 *[area_opt.format(area) for area in areas],
@@ -796,142 +888,43 @@ def task_final_fig05_network_analysis_montage():
             values.append(svg_path)
             plot_svgs[plot_type] = values
 
-    # First create montages of rose and length plots individually
-    montage_paths = []
-
-    cmd_base = command(
-        [
-            "magick",
-            "montage",
-            "-font",
-            "DejaVu-Sans",
-        ]
-    )
-    cmd_montage_options = command(
-        [
-            "-geometry",
-            "1080x1080+4+4",
-            "-tile",
-        ]
-    )
-    tilings = ("3x1", "1x3")
-    density_option = "-density 300"
-
-    for plot_type, plot_paths in plot_svgs.items():
-        output_path_horizontal = OUTPUTS_PATH / f"networks/{plot_type}_montage.png"
-        output_path_vertical = (
-            OUTPUTS_PATH / f"networks/{plot_type}_vertical_montage.png"
+    # Plots of each type are tiled horizontally into rows, which are then
+    # labelled and tiled vertically, all in memory
+    rows = {
+        plot_type: dict(
+            items=[str(path) for path in plot_paths],
+            geometry="1080x1080+4+4",
+            tile="3x1",
         )
-        output_paths = (output_path_horizontal, output_path_vertical)
-        cmds = [
-            command(
-                [
-                    cmd_base,
-                    *[f"{density_option} {path.absolute()}" for path in plot_paths],
-                    cmd_montage_options,
-                    orient,
-                    output_path,
-                ]
-            )
-            for orient, output_path in zip(
-                tilings,
-                output_paths,
-            )
-        ]
-        for output_path, cmd in zip(output_paths, cmds):
-            yield {
-                NAME: f"{plot_type}_{output_path.stem}",
-                FILE_DEP: [*plot_paths],
-                # UP_TO_DATE: [config_changed(cmd_base + str(tilings))],
-                UP_TO_DATE: [
-                    config_changed(
-                        dict(
-                            cmd_base=cmd_base,
-                            tilings=str(tilings),
-                            density_option=density_option,
-                        )
-                    )
-                ],
-                # TASK_DEP: ["final_multi_network_analysis"],
-                TASK_DEP: [resolve_task_name(task_final_tab03_multi_network_analysis)],
-                ACTIONS: [_mkdir_cmd(output_path.parent), cmd],
-                TARGETS: [output_path],
-            }
-            # Do not add vertical plots for labeling
-            if output_path == output_path_horizontal:
-                montage_paths.append(output_path)
-
-    # Then create montage of the individual montages into single final montage
-    labels = ("(a)", "(b)", "(c)")
-    with_labels = [
-        # ["-density", "300"]+
-        add_label_to_image_cmd(path, label, fontsize=90, y=80, x=15)
-        for path, label in zip(montage_paths[0:3], labels)
-    ]
-    appendix_labels = ("(a)", "(b)")
-    appendix_with_labels = [
-        # ["-density", "300"]+
-        add_label_to_image_cmd(path, label, fontsize=90, y=80, x=15)
-        for path, label in zip(montage_paths[3:], appendix_labels)
-    ]
-    montage_options = command(
-        [
-            "-geometry",
-            "2200x+4+4",
-            "-frame",
-            "4",
-            "-tile",
-            "1x3",
-        ]
-    )
-    appendix_montage_options = montage_options.replace("1x3", "1x2")
-
-    def _montage_cmd(options, labels, montage_path):
-        final_montage_cmd = command(
-            [
-                "magick",
-                "montage",
-                "-font",
-                "DejaVu-Sans",
-                *list(chain(*labels)),
-                options,
-                str(montage_path),
-            ]
-        )
-        return final_montage_cmd
-
-    final_montage_cmd = _montage_cmd(
-        options=montage_options,
-        labels=with_labels,
-        montage_path=NETWORK_ANALYSIS_MONTAGE,
-    )
-    appendix_final_montage_cmd = _montage_cmd(
-        options=appendix_montage_options,
-        labels=appendix_with_labels,
-        montage_path=APPENDIX_NETWORK_ANALYSIS_MONTAGE,
-    )
+        for plot_type, plot_paths in plot_svgs.items()
+    }
+    label_opts = dict(fontsize=90, y=80, x=15)
+    montage_options = dict(geometry="2200x+4+4", frame=4)
+    specs = {
+        NETWORK_ANALYSIS_MONTAGE: dict(
+            items=[rows[plot_type] for plot_type in MONTAGE_PLOT_TYPES],
+            labels=[
+                image_label(label, **label_opts) for label in ("(a)", "(b)", "(c)")
+            ],
+            tile="1x3",
+            **montage_options,
+        ),
+        APPENDIX_NETWORK_ANALYSIS_MONTAGE: dict(
+            items=[rows[plot_type] for plot_type in APPENDIX_MONTAGE_PLOT_TYPES],
+            labels=[image_label(label, **label_opts) for label in ("(a)", "(b)")],
+            tile="1x2",
+            **montage_options,
+        ),
+    }
 
-    all_labels = tuple([*appendix_labels, *labels])
-    for target, cmd in zip(
-        (NETWORK_ANALYSIS_MONTAGE, APPENDIX_NETWORK_ANALYSIS_MONTAGE),
-        (final_montage_cmd, appendix_final_montage_cmd),
-    ):
+    for target, spec in specs.items():
         yield {
             NAME: target.name,
-            FILE_DEP: [
-                *montage_paths,
-            ],
-            UP_TO_DATE: [
-                config_changed(
-                    dict(montage_options=montage_options, all_labels=all_labels)
-                )
-            ],
+            FILE_DEP: [Path(path) for row in spec["items"] for path in row["items"]],
+            UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
             # TASK_DEP: ["final_multi_network_analysis"],
             TASK_DEP: [resolve_task_name(task_final_tab03_multi_network_analysis)],
-            ACTIONS: [
-                _mkdir_cmd(NETWORK_ANALYSIS_MONTAGE.parent),
-                cmd,
-            ],
+            ACTIONS: [composite_action(spec=spec, output_path=target)],
             TARGETS: [target],
         }
 
@@ -955,37 +948,21 @@ def task_final_fig08_multi_scale_fits_figure_montage():
     # dep_paths_with_opt = [f"-density 300 {path}" for path in [all_path, *set_paths]]
     labels = ["(a)", "(b)", "(c)", "(d)"]
     label_opts = dict(fontsize=40, y=130)
-    dep_paths_with_opt = [
-        " ".join(
-            add_label_to_image_cmd(f"-density 300 {path}", label=label, **label_opts)
-        )
-        for path, label in zip([all_path, *set_paths], labels)
-    ]
-
-    cmd = command(
-        [
-            "magick",
-            "montage",
-            "-font",
-            "DejaVu-Sans",
-            "-geometry",
-            "+4+4",
-            *dep_paths_with_opt,
-            "-tile",
-            "2x2",
-            SET_WISE_MULTI_SCALE_FITS,
-        ]
+    spec = dict(
+        items=[str(path) for path in dep_paths],
+        labels=[image_label(label, **label_opts) for label in labels],
+        geometry="+4+4",
+        tile="2x2",
     )
 
     return {
         FILE_DEP: [*dep_paths],
         # TASK_DEP: ["final_multi_network_analysis"],
         TASK_DEP: [resolve_task_name(task_final_tab03_multi_network_analysis)],
-        UP_TO_DATE: [config_changed(dict(cmd=cmd, label_opts=label_opts))],
+        UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
         ACTIONS: [
-            _mkdir_cmd(SET_WISE_MULTI_SCALE_FITS.parent),
             lambda: check_length_paths(dep_paths),
-            cmd,
+            composite_action(spec=spec, output_path=SET_WISE_MULTI_SCALE_FITS),
         ],
         TARGETS: [SET_WISE_MULTI_SCALE_FITS],
     }
@@ -994,53 +971,67 @@ def task_final_fig08_multi_scale_fits_figure_montage():
 def task_final_tab03_multi_network_analysis():
     """
     Determine multi-scale network characteristics and create montage.
+
+    Each scale is analysed in its own subtask and the multi-scale analysis
+    only loads the saved network summaries of the scales. Consequently,
+    changes to the multi-scale analysis do not rerun the scale analyses and
+    changes to the data of a single scale only rerun its own analysis.
     """
+    summary_paths = []
+    for scale in [SCALE_1_10, SCALE_1_20000, SCALE_1_200000_INT]:
+        traces_path, area_path = _concat_paths(name=scale)
+        scale_output_dir = NETWORK_OUTPUTS_PATH / scale
+        summary_path = scale_output_dir / "network_summary.joblib"
+        cmd = [
+            "python",
+            str(CLI_PY_PATH),
+            # Leave a trace of stage durations next to (not within) the
+            # outputs, which are pruned of files not written by the analysis
+            f"--timings={NETWORK_OUTPUTS_PATH / f'{scale}_timings.json'}",
+            "scale-network-analysis",
+            f"--traces-path={traces_path}",
+            f"--area-path={area_path}",
+            f"--scale={scale}",
+            f"--scale-output-dir={scale_output_dir}",
+            f"--azimuth-set-json-path={AZIMUTH_SET_JSON_PATH}",
+        ]
+        yield {
+            NAME: scale,
+            TARGETS: [summary_path, scale_output_dir],
+            ACTIONS: [
+                _mkdir_cmd(scale_output_dir),
+                " ".join(cmd),
+            ],
+            FILE_DEP: [POETRY_LOCK, AZIMUTH_SET_JSON_PATH, traces_path, area_path],
+            # Rerun only when the code used by the analysis changes
+            UP_TO_DATE: [code_changed("multi_network_analysis:scale_network_analysis")],
+            # TASK_DEP: ["concatenate_scales"],
+            TASK_DEP: [resolve_task_name(task_concatenate_scales)],
+        }
+        summary_paths.append(summary_path)
+
     cmd = [
         "python",
         str(CLI_PY_PATH),
-        "multi-network-analysis",
+        f"--timings={NETWORK_OUTPUTS_PATH / 'multi-scale_timings.json'}",
+        "multi-scale-network-analysis",
         str(MULTI_SCALE_OUTPUTS_PATH),
-        f"--azimuth-set-json-path={AZIMUTH_SET_JSON_PATH}",
         f"--latex-output-path={MULTI_SCALE_ANALYSIS_TABLE}",
+        *(f"--summary-paths={path}" for path in summary_paths),
     ]
-    traces_paths_opt = "--traces-paths={}"
-    area_paths_opt = "--area-paths={}"
-    scale_names_opt = "--scale-names={}"
-    network_outputs_opt = "--network-output-paths={}"
-
-    file_deps = [
-        MULTI_NETWORK_ANALYSIS_PY_PATH,
-        POETRY_LOCK,
-        *FRACTOPO_FILES,
-        UTILS_PY_PATH,
-        AZIMUTH_SET_JSON_PATH,
-    ]
-    output_dirs = []
-    for scale in [SCALE_1_10, SCALE_1_20000, SCALE_1_200000_INT]:
-        traces_path, area_path = _concat_paths(name=scale)
-        scale_output_dir = NETWORK_OUTPUTS_PATH / scale
-        cmd.extend(
-            [
-                traces_paths_opt.format(traces_path),
-                area_paths_opt.format(area_path),
-                scale_names_opt.format(scale),
-                network_outputs_opt.format(scale_output_dir),
-            ]
-        )
-        file_deps.extend([traces_path, area_path])
-        output_dirs.append(scale_output_dir)
-
-    return {
-        TARGETS: [MULTI_SCALE_OUTPUTS_PATH, MULTI_SCALE_ANALYSIS_TABLE, *output_dirs],
+    yield {
+        NAME: "multi-scale",
+        TARGETS: [MULTI_SCALE_OUTPUTS_PATH, MULTI_SCALE_ANALYSIS_TABLE],
         ACTIONS: [
-            # Clean output dir before new analysis
-            lambda: rmtree(MULTI_SCALE_OUTPUTS_PATH, ignore_errors=True),
+            # Unchanged outputs are left untouched and stale ones are removed
+            # by the analysis so that downstream montages are not rebuilt
             _mkdir_cmd(MULTI_SCALE_OUTPUTS_PATH),
             " ".join(cmd),
         ],
-        FILE_DEP: file_deps,
-        # TASK_DEP: ["concatenate_scales"],
-        TASK_DEP: [resolve_task_name(task_concatenate_scales)],
+        FILE_DEP: [POETRY_LOCK, *summary_paths],
+        UP_TO_DATE: [
+            code_changed("multi_network_analysis:multi_scale_network_analysis")
+        ],
     }
 
 
@@ -1052,48 +1043,21 @@ def task_final_fig07_multi_network_analysis_montage():
     montage_target_plots = [
         MULTI_SCALE_OUTPUTS_PATH / name for name in montage_target_plot_names
     ]
-    with_labels = [
-        ["-density", "300"]
-        + add_label_to_image_cmd(path=path, label=label, x=30, y=240, fontsize=50)
-        for path, label in zip(montage_target_plots, ("(a)", "(b)"))
-    ]
-    montage_cmd = command(
-        [
-            "magick",
-            "montage",
-            "-font",
-            "DejaVu-Sans",
-            *list(chain(*with_labels)),
-            "-geometry",
-            "x1200",
-            "-tile",
-            "1x2",
-            str(MULTI_NETWORK_ANALYSIS_MONTAGE),
-        ]
+    spec = dict(
+        items=[str(path) for path in montage_target_plots],
+        labels=[
+            image_label(label, x=30, y=240, fontsize=50) for label in ("(a)", "(b)")
+        ],
+        geometry="x1200",
+        tile="1x2",
     )
-    # optipng_cmd = command(
-    #     [
-    #         "optipng",
-    #         "-o7",
-    #         str(MULTI_NETWORK_ANALYSIS_MONTAGE),
-    #     ]
-    # )
     return {
         TARGETS: [MULTI_NETWORK_ANALYSIS_MONTAGE],
         ACTIONS: [
-            _mkdir_cmd(MULTI_NETWORK_ANALYSIS_MONTAGE.parent),
-            montage_cmd,
-            # optipng_cmd,
+            composite_action(spec=spec, output_path=MULTI_NETWORK_ANALYSIS_MONTAGE)
         ],
         FILE_DEP: [*montage_target_plots],
-        UP_TO_DATE: [
-            config_changed(
-                dict(
-                    montage_cmd=montage_cmd,
-                    # optipng_cmd=optipng_cmd,
-                )
-            )
-        ],
+        UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
         # TASK_DEP: ["final_multi_network_analysis"],
         TASK_DEP: [resolve_task_name(task_final_fig05_network_analysis_montage)],
     }
@@ -1286,16 +1250,53 @@ def task_final_appendix_fits_table():
     }
 
 
+@ignore_in_ci
+def task_prepare_rasters():
+    """
+    Convert downloaded rasters to cloud-optimized GeoTIFFs.
+
+    The used rasters are read straight from the downloaded zip after
+    verifying their checksums. Each raster is a subtask so they are built
+    in parallel with ``doit -n <processes>``.
+    """
+    for raster_name in RASTER_AREA_PAIRS:
+        prepared_raster = PREPARED_RASTERS_PATH / raster_name
+        cmd = command(
+            [
+                "python",
+                CLI_PY_PATH,
+                "prepare-raster",
+                f"--raster-path={raster_name}",
+                f"--zip-path={ORTHOMOSAICS_ZIP_PATH}",
+                f"--output-path={prepared_raster}",
+            ]
+        )
+        yield {
+            NAME: raster_name,
+            # The zip is tracked by content hash, which is only computed
+            # again when its modification time changes
+            FILE_DEP: [ORTHOMOSAICS_ZIP_PATH, PREPARE_RASTERS_PY_PATH],
+            # TASK_DEP: ["download_rasters"],
+            TASK_DEP: [resolve_task_name(task_download_rasters)],
+            UP_TO_DATE: [config_changed(dict(cmd=cmd))],
+            TARGETS: [prepared_raster],
+            ACTIONS: [_mkdir_cmd(PREPARED_RASTERS_PATH), cmd],
+        }
+
+
 @ignore_in_ci
 def task_visualize_rasters():
     """
     Plot rasters with traces and area.
+
+    Rasters are read directly at the plotted resolution within the bounds of
+    the traces and areas so no resampled copies are written.
     """
     # rasters = list(RASTERS_PATH.glob("*.tif"))
-    rasters = [(RASTERS_PATH / raster_target) for raster_target in RASTER_AREA_PAIRS]
-    resample_raster_cmd_base = "gdalwarp -tr 0.5 0.5 {} {}"
+    rasters = [
+        (PREPARED_RASTERS_PATH / raster_target) for raster_target in RASTER_AREA_PAIRS
+    ]
     for raster in rasters:
-        resampled_raster = RESAMPLED_RASTERS_PATH / raster.name
         traces_names = RASTER_AREA_PAIRS[raster.name]["traces"]
         area_names = RASTER_AREA_PAIRS[raster.name]["areas"]
         traces_paths = [TRACES_20M_DIR / name for name in traces_names]
@@ -1303,13 +1304,8 @@ def task_visualize_rasters():
         traces_path_opt = "--traces-paths={}"
         area_path_opt = "--area-paths={}"
 
-        # Resample rasters so that matplotlib can plot them
-        # resample_raster_cmd = f"gdalwarp -tr 0.5 0.5 {raster} {resampled_raster}"
-        resample_raster_cmd = resample_raster_cmd_base.format(raster, resampled_raster)
+        output_path = OPTIMIZED_RASTERS_PATH / raster.with_suffix(".png").name
 
-        output_path = OPTIMIZED_RASTERS_PATH / resampled_raster.with_suffix(".png").name
-
-        # f"python {VISUALIZE_DRONE_RASTERS_PY_PATH} {resampled_raster} {output_path}",
         visualize_cmd = command(
             [
                 "python",
@@ -1317,32 +1313,23 @@ def task_visualize_rasters():
                 "visualize-drone-rasters",
                 *[traces_path_opt.format(path) for path in traces_paths],
                 *[area_path_opt.format(path) for path in area_paths],
-                f"--raster-path={resampled_raster}",
+                f"--raster-path={raster}",
                 f"--output-path={output_path}",
+                # Resolution (m) that rasters were earlier resampled to with
+                # gdalwarp -tr 0.5 0.5
+                "--resolution=0.5",
             ]
         )
         yield {
             NAME: raster.name,
             FILE_DEP: [
-                # Hash for raster is expensive time-wise to calculate so ignore
-                # raster,
+                # Prepared rasters are hashed only when they are rebuilt
+                raster,
                 VISUALIZE_DRONE_RASTERS_PY_PATH,
             ],
-            # TASK_DEP: ["download_rasters"],
-            TASK_DEP: [resolve_task_name(task_download_rasters)],
-            UP_TO_DATE: [
-                config_changed(
-                    dict(
-                        resample_raster_cmd=resample_raster_cmd,
-                        visualize_cmd=visualize_cmd,
-                    )
-                ),
-            ],
-            TARGETS: [resampled_raster],
+            UP_TO_DATE: [config_changed(dict(visualize_cmd=visualize_cmd))],
+            TARGETS: [output_path],
             ACTIONS: [
-                f"rm -f {resampled_raster}",
-                _mkdir_cmd(resampled_raster.parent),
-                resample_raster_cmd,
                 _mkdir_cmd(output_path.parent),
                 visualize_cmd,
             ],
@@ -1441,46 +1428,26 @@ def task_final_fig02_add_index_to_drone_rasters():
     """
     Add index map to drone raster montage.
     """
-    # Compose montage command
-    cmd = command(
-        [
-            "magick",
-            "montage",
-            "-font",
-            "DejaVu-Sans",
-            *add_label_to_image_cmd(
-                path=DRONE_INDEX_FIGURE, label="(a)", fontsize=110, y=90, x=25
-            ),
-            *add_label_to_image_cmd(
-                path=DRONE_RASTER_MONTAGE, label="(b)", fontsize=110, y=120
-            ),
-            # str(DRONE_INDEX_FIGURE),
-            # str(DRONE_RASTER_MONTAGE),
-            "-geometry",
-            "1800x",
-            "-tile",
-            "1x2",
-            "-background",
-            "none",
-            "-bordercolor",
-            "white",
-            "-frame",
-            "5",
-            "-mattecolor",
-            "black",
-            DRONE_RASTER_MONTAGE_WITH_INDEX,
-        ]
+    spec = dict(
+        items=[str(DRONE_INDEX_FIGURE), str(DRONE_RASTER_MONTAGE)],
+        labels=[
+            image_label("(a)", fontsize=110, y=90, x=25),
+            image_label("(b)", fontsize=110, y=120),
+        ],
+        geometry="1800x",
+        tile="1x2",
+        frame=5,
+        frame_color="black",
     )
 
     return {
         # TASK_DEP: ["optimize_rasters_montage"],
         TASK_DEP: [resolve_task_name(task_optimize_rasters_montage)],
         ACTIONS: [
-            _mkdir_cmd(DRONE_RASTER_MONTAGE_WITH_INDEX.parent),
-            cmd,
+            composite_action(spec=spec, output_path=DRONE_RASTER_MONTAGE_WITH_INDEX)
         ],
         FILE_DEP: [DRONE_INDEX_FIGURE, DRONE_RASTER_MONTAGE],
-        UP_TO_DATE: [config_changed(cmd)],
+        UP_TO_DATE: [config_changed(spec), COMPOSITING_CODE_CHANGED],
         TARGETS: [DRONE_RASTER_MONTAGE_WITH_INDEX],
     }
 
@@ -1521,26 +1488,18 @@ def task_download_rasters():
     # Download url for Getaberget orthomosaic tiff rasters
     url = "https://zenodo.org/record/4719627/files/geta_orthomosaics.zip?download=1"
 
-    # Temporary path for downloaded zip
-    zip_path = OUTPUTS_PATH / "geta_orthomosaics.zip"
+    # Rasters are read from the zip by prepare_rasters so it is not
+    # extracted
+    zip_path = ORTHOMOSAICS_ZIP_PATH
 
     actions = [
-        # Create OUTPUTS_PATH directory
-        f"mkdir -p {OUTPUTS_PATH}",
         # Download rasters in a zip file
-        # --continue flag is used for if download is interrupted,
-        # it can be continued seamlessly
-        f"wget {url} --progress=dot --continue --output-document  {zip_path}",
-        # Create RASTERS_PATH directory
-        f"mkdir -p {RASTERS_PATH}",
-        # Unzip rasters to RASTERS_PATH (removed -u flag as it only updated based on file age)
-        f"unzip -q -o {zip_path} -d {RASTERS_PATH}",
-        # Remove zip file
-        # f"rm -f {zip_path}",
+        # Interrupted downloads are continued
+        download_cmd(url=url, output_path=zip_path),
     ]
     return {
         ACTIONS: actions,
-        TARGETS: [zip_path, RASTERS_PATH],
+        TARGETS: [zip_path],
         UP_TO_DATE: [run_once, config_changed(dict(url=url, actions=actions))],
     }
 
@@ -1550,18 +1509,20 @@ def task_download_striations():
     Download striations from Geological Survey of Finland WFS service.
     """
     # WFS service
-    wfs_url = "WFS:http://gtkdata.gtk.fi/arcgis/services/Rajapinnat/GTK_Maapera_WFS/MapServer/WFSServer?"
+    wfs_url = "http://gtkdata.gtk.fi/arcgis/services/Rajapinnat/GTK_Maapera_WFS/MapServer/WFSServer?"
 
     layer = "Rajapinnat_GTK_Maapera_WFS:uurteet"
 
     actions = [
-        # Create BACKGROUND_OUTPUTS_PATH directory
-        f"mkdir -p {BACKGROUND_OUTPUTS_PATH}",
-        f"ogr2ogr -f GEOJSON {STRIATIONS_GEOJSON_PATH} {wfs_url} {layer}",
+        # Only striations within the Åland clip box are downloaded
+        wfs_download_cmd(
+            url=wfs_url, type_name=layer, output_path=STRIATIONS_GEOJSON_PATH
+        ),
     ]
 
     return {
         ACTIONS: actions,
+        FILE_DEP: [ALAND_CLIP_BOX_WKT_PATH],
         TARGETS: [STRIATIONS_GEOJSON_PATH],
         UP_TO_DATE: [
             run_once,
@@ -1583,10 +1544,12 @@ def task_download_administrative_boundaries():
     # Download url
     download_url = "https://public.opendatasoft.com/explore/dataset/world-administrative-boundaries/download/?format=geojson&timezone=Europe/Helsinki&lang=en"
 
+    # The export is generated on request and is not byte-stable so it is
+    # deliberately not in the sha256 manifest
     actions = [
-        # Create BACKGROUND_OUTPUTS_PATH directory
-        f"mkdir -p {BACKGROUND_OUTPUTS_PATH}",
-        f"wget '{download_url}' --continue --output-document {ADMINISTRATIVE_BOUNDARIES_PATH}",
+        download_cmd(
+            url=download_url, output_path=ADMINISTRATIVE_BOUNDARIES_PATH, verify=False
+        ),
     ]
     return {
         ACTIONS: actions,
@@ -1602,8 +1565,8 @@ def task_download_bedrock():
     """
     Download bedrock of finland 200k data.
     """
-    # Download url for Getaberged orthomosaic tiff rasters
-    wfs_url = "WFS:http://gtkdata.gtk.fi/arcgis/services/Rajapinnat/GTK_Kalliopera_WFS/MapServer/WFSServer?"
+    # WFS service
+    wfs_url = "http://gtkdata.gtk.fi/arcgis/services/Rajapinnat/GTK_Kalliopera_WFS/MapServer/WFSServer?"
 
     # Layer name
     # layer = "Rajapinnat_GTK_Kalliopera_WFS:kalliopera_200k_kivilajit"
@@ -1612,17 +1575,17 @@ def task_download_bedrock():
     layer = "Rajapinnat_GTK_Kalliopera_WFS:Litologiset_yksiköt_200k"
 
     actions = [
-        # Create BACKGROUND_OUTPUTS_PATH directory
-        f"mkdir -p {BACKGROUND_OUTPUTS_PATH}",
-        f"rm -f {FULL_BEDROCK_GEOJSON_PATH}",
-        f"ogr2ogr -f GEOJSON {FULL_BEDROCK_GEOJSON_PATH} {wfs_url} {layer}",
-        f"rm -f {SFINLAND_BEDROCK_GEOJSON_PATH}",
-        f"ogr2ogr -f GEOJSON -spat 80000 6650000 140000 6725000 {SFINLAND_BEDROCK_GEOJSON_PATH} {FULL_BEDROCK_GEOJSON_PATH}",
+        # Only bedrock within the Åland clip box, i.e. southern Finland, is
+        # downloaded instead of all of Finland
+        wfs_download_cmd(
+            url=wfs_url, type_name=layer, output_path=SFINLAND_BEDROCK_GEOJSON_PATH
+        ),
     ]
 
     return {
         ACTIONS: actions,
-        TARGETS: [FULL_BEDROCK_GEOJSON_PATH, SFINLAND_BEDROCK_GEOJSON_PATH],
+        FILE_DEP: [ALAND_CLIP_BOX_WKT_PATH],
+        TARGETS: [SFINLAND_BEDROCK_GEOJSON_PATH],
         UP_TO_DATE: [
             run_once,
             config_changed(dict(wfs_url=wfs_url, layer=layer, actions=actions)),
@@ -1650,9 +1613,7 @@ def task_download_shoreline():
     target_shp = extract_path / target_pattern.replace("*", "shp")
 
     actions = [
-        # Create BACKGROUND_OUTPUTS_PATH directory
-        f"mkdir -p {BACKGROUND_OUTPUTS_PATH}",
-        f"wget '{download_url}' --continue --output-document {zip_path}",
+        download_cmd(url=download_url, output_path=zip_path),
         f"mkdir -p {extract_path}",
         # Unzip shoreline
         f"unzip -u {zip_path} {target_pattern} -d {extract_path}",
@@ -1687,6 +1648,8 @@ def task_final_fig06_censoring_figure():
         *list(map("--trace-length-csvs={}".format, trace_lengths_csv_paths)),
         *list(map("--trace-names='{}'".format, names)),
         f"--dump-path={CENSORING_DUMP_PATH}",
+        # Resolve fits of all cut-offs in a single pass over sorted lengths
+        "--sweep",
     ]
 
     yield {
@@ -1718,3 +1681,10 @@ def task_final_fig06_censoring_figure():
         ACTIONS: [_mkdir_cmd(CENSORING_FIG_PATH.parent), " ".join(cmd)],
         TARGETS: [CENSORING_FIG_PATH],
     }
+
+
+# Apply to all tasks
+for _name, _task_creator in list(globals().items()):
+    if _name.startswith("task_") and callable(_task_creator):
+        globals()[_name] = in_process(_task_creator)
+del _name, _task_creator
@@ -64,7 +64,6 @@
             dos2unix
             gdal
             watchexec
-            wget
             unzip
             optipng
           ];
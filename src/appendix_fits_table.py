@@ -9,6 +9,8 @@ import pandas as pd
 import typer
 from beartype.typing import List
 
+from output_writer import write_csv_if_changed, write_text_if_changed
+
 # import utils
 
 
@@ -48,7 +50,7 @@ def appendix_fits_table(
         statistically to the lognormal and exponential distributions.
     """
     ).strip()
-    dataframe.to_csv(csv_output)
+    write_csv_if_changed(df=dataframe, path=csv_output)
     dataframe_latex = dataframe.to_latex(
         None,
         index=True,
@@ -61,4 +63,4 @@ def appendix_fits_table(
         ),
     )
     assert isinstance(dataframe_latex, str)
-    latex_output.write_text(dataframe_latex)
+    write_text_if_changed(path=latex_output, text=dataframe_latex)
@@ -9,6 +9,7 @@ import pandas as pd
 import typer
 from beartype.typing import List
 
+from output_writer import write_text_if_changed
 from utils import print
 
 
@@ -61,6 +62,6 @@ def azimuth_set_table(
         None, index=False, label=tex_label, caption=caption
     )
     assert isinstance(dataframe_latex, str)
-    latex_table_output.write_text(dataframe_latex)
+    write_text_if_changed(path=latex_table_output, text=dataframe_latex)
 
     print(f"Wrote latex azimuth set table to disk at {latex_table_output}")
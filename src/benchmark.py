@@ -0,0 +1,367 @@
+"""
+Benchmark analysis stages at scaled data sizes.
+
+The bundled trace and area data is scaled up by tiling translated (and
+slightly scaled) copies of it side by side. Each stage of the analysis
+pipeline is timed at each scale factor and its peak Python memory
+allocation is measured with ``tracemalloc``. Results are stored as JSON
+keyed by the git commit so that regressions between commits can be
+compared.
+"""
+
+import json
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from math import ceil, sqrt
+from pathlib import Path
+
+import geopandas as gpd
+import matplotlib.pyplot as plt
+import pandas as pd
+import typer
+from beartype.typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from censoring_analysis import _resolve_censoring_fits, _sweep_censoring_fits
+from concatenate_scales import concatenate_scale, write_geodata
+from fractopo import MultiNetwork
+from fractopo.analysis.network import Network
+from fractopo.general import read_geofile as read_geofile_uncached
+from geodata_cache import read_geofile
+from length_fits import determine_fit
+from length_fits import install as install_length_fits
+from multi_network_analysis import (
+    CIRCULAR_TARGET_AREA,
+    SNAP_THRESHOLD,
+    TRUNCATE_TRACES,
+    plot_distribution_fits,
+)
+from utils import print
+
+STAGES = (
+    "read_geofile",
+    "read_geofile_cached",
+    "concatenate_scale",
+    "network",
+    "determine_fit",
+    "resolve_censoring_fits",
+    "sweep_censoring_fits",
+    "plot_distribution_fits",
+    "multi_network_optimize",
+)
+
+# Scale multipliers of the coarser scale copies used in MultiNetwork stage
+MULTI_SCALE_MULTIPLIERS = (100, 10000)
+
+
+class StageResult(NamedTuple):
+
+    """
+    Timing and memory of a benchmarked stage.
+    """
+
+    stage: str
+    scale_factor: int
+    trace_count: int
+    seconds: float
+    peak_memory_mb: Optional[float]
+
+
+def tile_geodata(
+    gdfs: Tuple[gpd.GeoDataFrame, ...], scale_factor: int
+) -> Tuple[gpd.GeoDataFrame, ...]:
+    """
+    Tile translated and slightly scaled copies of geodata in a grid.
+
+    All GeoDataFrames are translated by the same offsets so that traces stay
+    within their target areas.
+    """
+    if scale_factor == 1:
+        return gdfs
+    min_x, min_y, max_x, max_y = pd.concat([gdf.geometry for gdf in gdfs]).total_bounds
+    # Leave a gap between copies so they do not intersect
+    step_x, step_y = (max_x - min_x) * 1.1, (max_y - min_y) * 1.1
+    columns = ceil(sqrt(scale_factor))
+    offsets = [
+        (step_x * (idx % columns), step_y * (idx // columns))
+        for idx in range(scale_factor)
+    ]
+    origin = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+    tiled = []
+    for gdf in gdfs:
+        copies = []
+        for idx, (x_offset, y_offset) in enumerate(offsets):
+            copy = gdf.copy()
+            # Copies are scaled slightly so that lengths are not duplicated
+            multiplier = 1 + idx * 0.001
+            copy.geometry = gdf.geometry.scale(
+                xfact=multiplier, yfact=multiplier, origin=origin
+            ).translate(xoff=x_offset, yoff=y_offset)
+            copies.append(copy)
+        tiled_gdf = pd.concat(copies, ignore_index=True)
+        assert isinstance(tiled_gdf, gpd.GeoDataFrame)
+        tiled.append(tiled_gdf)
+    return tuple(tiled)
+
+
+def _measure(
+    func: Callable[[], Any], repeats: int, memory: bool
+) -> Tuple[Any, float, Optional[float]]:
+    """
+    Measure best time of repeats and peak memory of func.
+
+    Memory is measured in a separate run as ``tracemalloc`` slows down
+    execution.
+    """
+    result = None
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    peak_memory_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            result = func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_memory_mb = peak / 1024**2
+    return result, best, peak_memory_mb
+
+
+def _scaled_copy_network(network: Network, multiplier: float, name: str) -> Network:
+    """
+    Create network of a scaled copy of traces for multi-scale analysis.
+    """
+    min_x, min_y, max_x, max_y = network.area_gdf.total_bounds
+    origin = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+    trace_gdf, area_gdf = (
+        gdf.set_geometry(
+            gdf.geometry.scale(xfact=multiplier, yfact=multiplier, origin=origin)
+        )
+        for gdf in (network.trace_gdf, network.area_gdf)
+    )
+    return Network(
+        trace_gdf=trace_gdf,
+        area_gdf=area_gdf,
+        name=name,
+        circular_target_area=CIRCULAR_TARGET_AREA,
+        truncate_traces=TRUNCATE_TRACES,
+        snap_threshold=SNAP_THRESHOLD,
+        determine_branches_nodes=False,
+    )
+
+
+def benchmark_stages(
+    traces_paths: List[Path],
+    area_paths: List[Path],
+    scale_factor: int,
+    work_dir: Path,
+    set_ranges: List[Tuple[int, int]],
+    set_labels: List[str],
+    stages: Tuple[str, ...] = STAGES,
+    repeats: int = 1,
+    memory: bool = True,
+) -> List[StageResult]:
+    """
+    Benchmark analysis stages with data scaled by scale_factor.
+    """
+    trace_gdf, area_gdf = tile_geodata(
+        gdfs=(
+            pd.concat(map(read_geofile_uncached, traces_paths), ignore_index=True),
+            pd.concat(map(read_geofile_uncached, area_paths), ignore_index=True),
+        ),
+        scale_factor=scale_factor,
+    )
+    traces_path = work_dir / f"traces_{scale_factor}x.geojson"
+    area_path = work_dir / f"area_{scale_factor}x.geojson"
+    write_geodata(gdf=trace_gdf, path=traces_path)
+    write_geodata(gdf=area_gdf, path=area_path)
+
+    results = []
+
+    def measure(stage: str, func: Callable[[], Any]) -> Any:
+        if stage not in stages:
+            return None
+        print(f"Benchmarking {stage} at {scale_factor}x.")
+        result, seconds, peak_memory_mb = _measure(
+            func=func, repeats=repeats, memory=memory
+        )
+        results.append(
+            StageResult(
+                stage=stage,
+                scale_factor=scale_factor,
+                trace_count=trace_gdf.shape[0],
+                seconds=seconds,
+                peak_memory_mb=peak_memory_mb,
+            )
+        )
+        print(f"{stage}: {seconds:.3f} s")
+        return result
+
+    measure("read_geofile", lambda: read_geofile_uncached(traces_path))
+
+    cache_dir = work_dir / "geodata_cache"
+    if "read_geofile_cached" in stages:
+        # Populate cache before measuring cached reads
+        read_geofile(traces_path, cache_dir=cache_dir)
+    measure(
+        "read_geofile_cached", lambda: read_geofile(traces_path, cache_dir=cache_dir)
+    )
+
+    measure(
+        "concatenate_scale",
+        lambda: concatenate_scale(
+            traces_paths=[traces_path],
+            area_paths=[area_path],
+            concat_traces_path=work_dir / f"concat_traces_{scale_factor}x.geojson",
+            concat_area_path=work_dir / f"concat_area_{scale_factor}x.geojson",
+            coordinate_precision=None,
+        ),
+    )
+
+    network_stages = set(stages) - {
+        "read_geofile",
+        "read_geofile_cached",
+        "concatenate_scale",
+    }
+    if not network_stages:
+        return results
+
+    def create_network():
+        return Network(
+            trace_gdf=trace_gdf,
+            area_gdf=area_gdf,
+            name="1:10",
+            circular_target_area=CIRCULAR_TARGET_AREA,
+            truncate_traces=TRUNCATE_TRACES,
+            snap_threshold=SNAP_THRESHOLD,
+            determine_branches_nodes=True,
+            azimuth_set_ranges=tuple(set_ranges),
+            azimuth_set_names=tuple(set_labels),
+        )
+
+    network = measure("network", create_network)
+    if network is None:
+        network = create_network()
+    lengths = network.trace_length_array
+
+    measure("determine_fit", lambda: determine_fit(lengths))
+    measure(
+        "resolve_censoring_fits",
+        lambda: _resolve_censoring_fits(lengths=lengths, num=50),
+    )
+    measure(
+        "sweep_censoring_fits", lambda: _sweep_censoring_fits(lengths=lengths, num=50)
+    )
+
+    def plot():
+        plot_distribution_fits(
+            length_array=lengths,
+            label="Traces",
+            using_branches=False,
+            use_probability_density_function=False,
+        )
+        plt.close("all")
+
+    measure("plot_distribution_fits", plot)
+
+    if "multi_network_optimize" in stages:
+        networks = (
+            network,
+            *(
+                _scaled_copy_network(
+                    network=network, multiplier=multiplier, name=f"1:{10 * multiplier}"
+                )
+                for multiplier in MULTI_SCALE_MULTIPLIERS
+            ),
+        )
+        measure(
+            "multi_network_optimize",
+            lambda: MultiNetwork(networks)
+            .multi_length_distributions(using_branches=False)
+            .optimize_cut_offs(),
+        )
+
+    return results
+
+
+def _git_commit() -> Tuple[str, bool]:
+    """
+    Resolve current git commit and whether the working tree is dirty.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+    return commit, bool(status.strip())
+
+
+def benchmark(
+    traces_paths: List[Path] = typer.Option(..., exists=True),
+    area_paths: List[Path] = typer.Option(..., exists=True),
+    azimuth_set_json_path: Path = typer.Option(..., exists=True),
+    output_path: Path = typer.Option(...),
+    scale_factors: List[int] = typer.Option([1, 4, 16]),
+    stages: List[str] = typer.Option(list(STAGES)),
+    repeats: int = typer.Option(1),
+    memory: bool = typer.Option(True),
+):
+    """
+    Benchmark analysis stages at scaled data sizes.
+
+    Results are added to the JSON at output_path under the current git
+    commit.
+    """
+    unknown_stages = set(stages) - set(STAGES)
+    if unknown_stages:
+        raise typer.BadParameter(
+            f"Unknown stages {unknown_stages}. Expected some of {STAGES}."
+        )
+    # Benchmark the fits used by the analysis commands
+    install_length_fits()
+    azimuth_set_data = json.loads(azimuth_set_json_path.read_text())
+    set_labels = [item["name"] for item in azimuth_set_data]
+    set_ranges = [(item["start"], item["end"]) for item in azimuth_set_data]
+
+    results: List[StageResult] = []
+    for scale_factor in scale_factors:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results.extend(
+                benchmark_stages(
+                    traces_paths=traces_paths,
+                    area_paths=area_paths,
+                    scale_factor=scale_factor,
+                    work_dir=Path(tmp_dir),
+                    set_ranges=set_ranges,
+                    set_labels=set_labels,
+                    stages=tuple(stages),
+                    repeats=repeats,
+                    memory=memory,
+                )
+            )
+
+    commit, dirty = _git_commit()
+    all_results: Dict[str, Any] = (
+        json.loads(output_path.read_text()) if output_path.exists() else dict()
+    )
+    all_results[commit] = dict(
+        date=datetime.now().isoformat(timespec="seconds"),
+        dirty=dirty,
+        results=[result._asdict() for result in results],
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(all_results, indent=2, sort_keys=True))
+    print(f"Saved benchmark results of {commit} to: {output_path}")
@@ -0,0 +1,207 @@
+"""
+Bootstrap uncertainty of power-law length distribution fits.
+
+Confidence intervals of the power-law exponent and cut-off are estimated
+with a nonparametric bootstrap (resampling the lengths with replacement) and
+goodness-of-fit p-values with the semi-parametric bootstrap of Clauset et al.
+(2009): synthetic datasets follow the fitted power-law above the cut-off and
+resample the observed lengths below it. The power-law cut-off of every
+resample is determined again with ``length_fits.scan_xmin``.
+
+Resamples are drawn in batches as two-dimensional arrays and the batches are
+fitted in parallel processes. Each batch has its own random generator
+spawned from a fixed seed so the results do not depend on the number of
+workers.
+"""
+
+import numpy as np
+from beartype.typing import Any, Dict, NamedTuple, Tuple
+from joblib import Parallel, delayed
+
+from fractopo.analysis.length_distributions import calculate_exponent
+from length_fits import preprocess_lengths, scan_xmin
+
+BOOTSTRAP_SEED = 20220101
+
+# Maximum number of lengths in a single batch of resamples
+BATCH_ELEMENTS = 2**21
+
+NONPARAMETRIC = "nonparametric"
+SEMIPARAMETRIC = "semiparametric"
+
+
+class BootstrapResult(NamedTuple):
+
+    """
+    Power-law fit with bootstrapped uncertainty.
+    """
+
+    alpha: float
+    xmin: float
+    D: float
+    alpha_ci: Tuple[float, float]
+    xmin_ci: Tuple[float, float]
+    p_value: float
+    resamples: int
+
+
+def _fit_resamples(resamples: np.ndarray) -> np.ndarray:
+    """
+    Fit power-laws to rows of resampled lengths.
+
+    Returns array of (alpha, xmin, D) rows.
+    """
+    sorted_resamples = np.sort(resamples, axis=1)
+    log_cumsums = np.zeros((len(resamples), resamples.shape[1] + 1))
+    np.cumsum(np.log(sorted_resamples), axis=1, out=log_cumsums[:, 1:])
+    fits = np.empty((len(resamples), 3))
+    for row, (sorted_lengths, log_cumsum) in enumerate(
+        zip(sorted_resamples, log_cumsums)
+    ):
+        scan = scan_xmin(sorted_lengths, log_cumsum)
+        fits[row] = scan.alpha, scan.xmin, scan.D
+    return fits
+
+
+def _bootstrap_batch(
+    sorted_lengths: np.ndarray,
+    xmin: float,
+    alpha: float,
+    n_tail: int,
+    size: int,
+    seed: np.random.SeedSequence,
+    kind: str,
+) -> np.ndarray:
+    """
+    Draw and fit a batch of resamples.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(sorted_lengths)
+    if kind == NONPARAMETRIC:
+        resamples = sorted_lengths[rng.integers(0, count, size=(size, count))]
+    elif kind == SEMIPARAMETRIC:
+        # Power-law tail by inverse transform sampling
+        resamples = xmin * (1 - rng.random((size, count))) ** (-1 / (alpha - 1))
+        # Lengths below the cut-off are resampled from the data
+        body_count = count - n_tail
+        if body_count > 0:
+            in_body = rng.random((size, count)) < body_count / count
+            resamples[in_body] = sorted_lengths[
+                rng.integers(0, body_count, size=np.count_nonzero(in_body))
+            ]
+    else:
+        raise ValueError(f"Expected kind to be one of {NONPARAMETRIC, SEMIPARAMETRIC}.")
+    return _fit_resamples(resamples)
+
+
+def _bootstrap(
+    sorted_lengths: np.ndarray,
+    xmin: float,
+    alpha: float,
+    n_tail: int,
+    resamples: int,
+    seed: np.random.SeedSequence,
+    kind: str,
+    workers: int,
+) -> np.ndarray:
+    batch_size = max(1, BATCH_ELEMENTS // len(sorted_lengths))
+    sizes = [
+        min(batch_size, resamples - start) for start in range(0, resamples, batch_size)
+    ]
+    batches = Parallel(n_jobs=workers)(
+        delayed(_bootstrap_batch)(
+            sorted_lengths=sorted_lengths,
+            xmin=xmin,
+            alpha=alpha,
+            n_tail=n_tail,
+            size=size,
+            seed=batch_seed,
+            kind=kind,
+        )
+        for size, batch_seed in zip(sizes, seed.spawn(len(sizes)))
+    )
+    assert isinstance(batches, list)
+    return np.concatenate(batches)
+
+
+def bootstrap_power_law(
+    length_array: np.ndarray,
+    resamples: int,
+    seed: int = BOOTSTRAP_SEED,
+    confidence: float = 0.95,
+    workers: int = -1,
+) -> BootstrapResult:
+    """
+    Fit power-law to lengths and bootstrap its uncertainty.
+
+    ``resamples`` resamples are drawn for both the confidence intervals and
+    the goodness-of-fit p-value. A p-value below 0.1 rules out the power-law
+    (Clauset et al. 2009).
+    """
+    sorted_lengths, log_cumsum = preprocess_lengths(length_array)
+    scan = scan_xmin(sorted_lengths, log_cumsum)
+    if np.isnan(scan.xmin) or resamples < 1:
+        return BootstrapResult(
+            alpha=scan.alpha,
+            xmin=scan.xmin,
+            D=scan.D,
+            alpha_ci=(np.nan, np.nan),
+            xmin_ci=(np.nan, np.nan),
+            p_value=np.nan,
+            resamples=0,
+        )
+
+    nonparametric_seed, semiparametric_seed = np.random.SeedSequence(seed).spawn(2)
+    bootstrap_kwargs = dict(
+        sorted_lengths=sorted_lengths,
+        xmin=scan.xmin,
+        alpha=scan.alpha,
+        n_tail=scan.n_tail,
+        resamples=resamples,
+        workers=workers,
+    )
+    nonparametric_fits = _bootstrap(
+        **bootstrap_kwargs, seed=nonparametric_seed, kind=NONPARAMETRIC
+    )
+    semiparametric_fits = _bootstrap(
+        **bootstrap_kwargs, seed=semiparametric_seed, kind=SEMIPARAMETRIC
+    )
+
+    tail_probability = (1 - confidence) / 2
+    quantiles = (tail_probability, 1 - tail_probability)
+    alpha_low, alpha_high = np.nanquantile(nonparametric_fits[:, 0], quantiles)
+    xmin_low, xmin_high = np.nanquantile(nonparametric_fits[:, 1], quantiles)
+    synthetic_distances = semiparametric_fits[:, 2]
+    p_value = np.mean(synthetic_distances[~np.isnan(synthetic_distances)] >= scan.D)
+
+    return BootstrapResult(
+        alpha=scan.alpha,
+        xmin=scan.xmin,
+        D=scan.D,
+        alpha_ci=(float(alpha_low), float(alpha_high)),
+        xmin_ci=(float(xmin_low), float(xmin_high)),
+        p_value=float(p_value),
+        resamples=resamples,
+    )
+
+
+def describe_bootstrap(result: BootstrapResult) -> Dict[str, Any]:
+    """
+    Describe bootstrap result with table column names.
+
+    Exponents are reported as with ``calculate_exponent`` so the lower bound
+    of the exponent corresponds to the upper bound of alpha.
+    """
+    alpha_low, alpha_high = result.alpha_ci
+    xmin_low, xmin_high = result.xmin_ci
+    return {
+        "PL Exp.": calculate_exponent(result.alpha),
+        "PL Exp. CI Low": calculate_exponent(alpha_high),
+        "PL Exp. CI High": calculate_exponent(alpha_low),
+        r"PL Cut-Off [$m$]": result.xmin,
+        r"PL Cut-Off CI Low [$m$]": xmin_low,
+        r"PL Cut-Off CI High [$m$]": xmin_high,
+        "PL KS D": result.D,
+        "PL GOF p": result.p_value,
+        "Resamples": result.resamples,
+    }
@@ -2,47 +2,207 @@
 Create figure of censoring cut-of vs. power-law characteristics.
 """
 
+import logging
+import os
+from functools import lru_cache
+from hashlib import blake2b
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import typer
-from beartype.typing import List
-from joblib import Parallel, delayed, dump
+from beartype.typing import List, NamedTuple
+from joblib import Parallel, delayed, dump, load
 
-from fractopo.analysis.length_distributions import determine_fit
-from fractopo.general import JOBLIB_CACHE
+from code_fingerprint import code_fingerprint
+from length_fits import determine_fit, preprocess_lengths, scan_xmin
+from utils import CACHE_PATH
+
+CENSORING_CACHE_PATH = CACHE_PATH / "censoring"
+
+# Code that cached fits are computed with
+CENSORING_FITS_ENTRYPOINTS = (
+    "censoring_analysis:_resolve_censoring_fits",
+    "censoring_analysis:_sweep_censoring_fits",
+)
+CODE_ROOTS = (Path(__file__).parent, Path(__file__).parent.parent / "fractopo")
+
+
+class CensoringFits(NamedTuple):
+
+    """
+    Power-law fits of lengths censored at cut-offs.
+
+    The censored lengths of each cut-off are ``lengths[:n_censored]`` and the
+    fitted power-law tail ``lengths[n_censored - n_tail : n_censored]``.
+    """
+
+    lengths: np.ndarray
+    censoring_cut_offs: np.ndarray
+    xmins: np.ndarray
+    alphas: np.ndarray
+    n_censored: np.ndarray
+    n_tail: np.ndarray
+
+
+def _censoring_cut_offs(sorted_lengths: np.ndarray, num: int) -> np.ndarray:
+    return np.linspace(
+        start=sorted_lengths.max() + 0.001, stop=sorted_lengths.min(), num=num
+    )
 
 
 def _determine_censoring_cut_off_fit(censoring_cut_off, lengths):
     censor_cut_off_lengths = lengths[lengths < censoring_cut_off]
     fit = determine_fit(censor_cut_off_lengths)
-    return fit.xmin, fit.data, fit.alpha
-
+    if fit is None:
+        # No lengths below the cut-off
+        return np.nan, np.nan, 0
+    return fit.xmin, fit.alpha, len(fit.data)
 
-@JOBLIB_CACHE.cache
-def _resolve_censoring_fits(lengths: tuple, num: int = 20):
-    lengths = np.array(lengths)
-    censoring_cut_offs = np.linspace(
-        start=lengths.max() + 0.001, stop=lengths.min(), num=num
-    )
-    # fits = []
 
-    # for censoring_cut_off in censoring_cut_offs:
-    #     censor_cut_off_lengths = lengths[lengths < censoring_cut_off]
-    #     fit = determine_fit(censor_cut_off_lengths)
-    #     fits.append(fit)
+def _resolve_censoring_fits(lengths: np.ndarray, num: int = 20) -> CensoringFits:
+    """
+    Resolve censoring fits with a separate fit for each cut-off.
+    """
+    sorted_lengths, _ = preprocess_lengths(lengths)
+    censoring_cut_offs = _censoring_cut_offs(sorted_lengths, num=num)
 
     fits = Parallel(n_jobs=-1)(
         delayed(_determine_censoring_cut_off_fit)(
             censoring_cut_off=censoring_cut_off,
-            lengths=lengths,
+            lengths=sorted_lengths,
         )
         for censoring_cut_off in censoring_cut_offs
     )
     assert isinstance(fits, list)
+    xmins, alphas, n_tail = map(np.array, zip(*fits))
+
+    return CensoringFits(
+        lengths=sorted_lengths,
+        censoring_cut_offs=censoring_cut_offs,
+        xmins=xmins,
+        alphas=alphas,
+        n_censored=np.searchsorted(sorted_lengths, censoring_cut_offs, side="left"),
+        n_tail=n_tail,
+    )
 
-    return tuple(fits), tuple(censoring_cut_offs)
+
+def _sweep_censoring_fits(lengths: np.ndarray, num: int = 20) -> CensoringFits:
+    """
+    Resolve censoring fits by sweeping cut-offs from largest to smallest.
+
+    Lengths are sorted once and each censored length array is a prefix of
+    them. The cut-off scan of each prefix reuses the cumulative log-sums and
+    is seeded with the cut-off of the previous, slightly longer, prefix.
+    Consecutive cut-offs with no lengths between them share the fit.
+    """
+    sorted_lengths, log_cumsum = preprocess_lengths(lengths)
+    censoring_cut_offs = _censoring_cut_offs(sorted_lengths, num=num)
+    n_censored = np.searchsorted(sorted_lengths, censoring_cut_offs, side="left")
+    xmins = np.full(num, np.nan)
+    alphas = np.full(num, np.nan)
+    n_tail = np.zeros(num, dtype=int)
+
+    xmin_index = None
+    for idx, stop in enumerate(n_censored):
+        if idx > 0 and stop == n_censored[idx - 1]:
+            # No lengths between consecutive cut-offs
+            xmins[idx], alphas[idx], n_tail[idx] = (
+                xmins[idx - 1],
+                alphas[idx - 1],
+                n_tail[idx - 1],
+            )
+            continue
+        scan = scan_xmin(
+            sorted_lengths, log_cumsum, stop=stop, initial_xmin_index=xmin_index
+        )
+        if np.isnan(scan.xmin):
+            continue
+        xmin_index = scan.xmin_index
+        xmins[idx], alphas[idx], n_tail[idx] = scan.xmin, scan.alpha, scan.n_tail
+
+    return CensoringFits(
+        lengths=sorted_lengths,
+        censoring_cut_offs=censoring_cut_offs,
+        xmins=xmins,
+        alphas=alphas,
+        n_censored=n_censored,
+        n_tail=n_tail,
+    )
+
+
+@lru_cache(maxsize=None)
+def _censoring_fits_code_fingerprint() -> str:
+    """
+    Fingerprint the code reachable from the censoring fit functions.
+    """
+    return code_fingerprint(entrypoints=CENSORING_FITS_ENTRYPOINTS, roots=CODE_ROOTS)
+
+
+def _censoring_fits_key(lengths: np.ndarray, num: int, sweep: bool) -> str:
+    """
+    Compose cache key from the raw buffer of lengths, fit parameters and code.
+
+    Cached fits are invalidated when the code that computes them, e.g. in
+    ``length_fits``, changes.
+    """
+    lengths = np.ascontiguousarray(lengths)
+    digest = blake2b(memoryview(lengths).cast("B"), digest_size=20)
+    digest.update(
+        f"{lengths.dtype.str}{lengths.shape}{num}{sweep}"
+        f"{_censoring_fits_code_fingerprint()}".encode()
+    )
+    return digest.hexdigest()
+
+
+def resolve_censoring_fits(
+    lengths: np.ndarray,
+    num: int = 20,
+    sweep: bool = False,
+    cache_dir: Path = CENSORING_CACHE_PATH,
+) -> CensoringFits:
+    """
+    Resolve censoring fits through a cache of memory-mapped arrays.
+    """
+    cached_path = cache_dir / f"{_censoring_fits_key(lengths, num, sweep)}.joblib"
+    if cached_path.exists():
+        try:
+            return CensoringFits(**load(cached_path, mmap_mode="r"))
+        except Exception:
+            logging.warning(
+                f"Failed to load cached censoring fits {cached_path}.", exc_info=True
+            )
+            cached_path.unlink(missing_ok=True)
+
+    censoring_fits = (_sweep_censoring_fits if sweep else _resolve_censoring_fits)(
+        lengths=lengths, num=num
+    )
+
+    # Write to a process-specific temporary path and move it in place
+    tmp_path = cached_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        dump(censoring_fits._asdict(), tmp_path)
+        tmp_path.replace(cached_path)
+    except Exception:
+        logging.warning("Failed to cache censoring fits.", exc_info=True)
+        tmp_path.unlink(missing_ok=True)
+    return censoring_fits
+
+
+def _count_above_xmin(censoring_fits: CensoringFits) -> np.ndarray:
+    """
+    Count censored lengths strictly above the power-law cut-off.
+    """
+    xmins = np.asarray(censoring_fits.xmins)
+    at_or_below_xmin = np.searchsorted(
+        censoring_fits.lengths, np.nan_to_num(xmins, nan=np.inf), side="right"
+    )
+    return np.where(
+        np.isnan(xmins),
+        0,
+        np.maximum(np.asarray(censoring_fits.n_censored) - at_or_below_xmin, 0),
+    )
 
 
 def _create_trace_lengths_dict(trace_length_csvs, trace_names):
@@ -66,19 +226,33 @@ def censoring_analysis(
     trace_length_csvs: List[Path] = typer.Option(...),
     trace_names: List[str] = typer.Option(...),
     dump_path: Path = typer.Option(...),
+    num: int = typer.Option(50),
+    sweep: bool = typer.Option(False),
 ):
     """
     Analyse censoring cut-off vs. power-law characteristics.
+
+    With --sweep the fits of all cut-offs are resolved in a single pass over
+    the sorted lengths which allows for much denser cut-off grids.
     """
     trace_lengths_dict = _create_trace_lengths_dict(
         trace_length_csvs=trace_length_csvs, trace_names=trace_names
     )
 
-    all_fits, all_censoring_cut_offs = zip(
-        *[
-            _resolve_censoring_fits(lengths=tuple(trace_lengths), num=50)
-            for trace_lengths in trace_lengths_dict.values()
-        ]
-    )
+    # One sorted length array and per-cut-off records for each scale. Saved
+    # uncompressed so that the arrays can be memory-mapped when loaded.
+    censoring_dump = {}
+    for trace_name, trace_lengths in trace_lengths_dict.items():
+        censoring_fits = resolve_censoring_fits(
+            lengths=trace_lengths, num=num, sweep=sweep
+        )
+        censoring_dump[trace_name] = dict(
+            lengths=np.asarray(censoring_fits.lengths),
+            censoring_cut_offs=np.asarray(censoring_fits.censoring_cut_offs),
+            xmins=np.asarray(censoring_fits.xmins),
+            alphas=np.asarray(censoring_fits.alphas),
+            n_censored=np.asarray(censoring_fits.n_censored),
+            n_above_xmin=_count_above_xmin(censoring_fits),
+        )
 
-    dump((all_fits, all_censoring_cut_offs, trace_lengths_dict), dump_path)
+    dump(censoring_dump, dump_path)
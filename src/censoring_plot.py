@@ -5,7 +5,6 @@ Create figure of censoring cut-of vs. power-law characteristics.
 import string
 from functools import partial
 from pathlib import Path
-from typing import NamedTuple
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -17,28 +16,24 @@ from matplotlib import ticker
 from fractopo.analysis.length_distributions import calculate_exponent
 
 
-class FitBase(NamedTuple):
-    """
-    Holder for fit data.
-    """
-
-    xmin: float
-    data: np.ndarray
-    alpha: float
-
-
 def _visualize_effect_of_censoring(
-    fig, censoring_cut_offs, fits, suptitle, lengths, row_idx, label_gen, color
+    fig,
+    censoring_cut_offs,
+    xmins,
+    alphas,
+    n_above_xmin,
+    suptitle,
+    lengths,
+    row_idx,
+    label_gen,
+    color,
 ):
     censoring_cut_offs = np.array(censoring_cut_offs)
-    fits = [FitBase(xmin=fit[0], data=fit[1], alpha=fit[2]) for fit in fits]
 
-    exponents = np.array([calculate_exponent(fit.alpha) for fit in fits])
-    cut_offs = [fit.xmin for fit in fits]
+    exponents = np.array([calculate_exponent(float(alpha)) for alpha in alphas])
+    cut_offs = np.array(xmins)
 
-    cut_off_proportions = np.array(
-        [1 - (sum(fit.data > fit.xmin) / len(lengths)) for fit in fits]
-    )
+    cut_off_proportions = 1 - (np.array(n_above_xmin) / len(lengths))
 
     # Plotting
     with sns.plotting_context(
@@ -125,7 +120,7 @@ def censoring_plot(
     """
     Create plot of censoring cut-off vs. power-law characteristics.
     """
-    all_fits, all_censoring_cut_offs, trace_lengths_dict = load(dump_path)
+    censoring_dump = load(dump_path, mmap_mode="r")
 
     main_fig = plt.figure(figsize=(8.23, 6.5))
     subfigs = main_fig.subfigures(3)
@@ -133,23 +128,18 @@ def censoring_plot(
     label_gen = map("({})".format, string.ascii_lowercase)
     colors = ["darkblue", "darkred", "darkgreen"]
 
-    for idx, (fig, fits, suptitle, censoring_cut_offs, lengths, color) in enumerate(
-        zip(
-            subfigs,
-            all_fits,
-            trace_lengths_dict,
-            all_censoring_cut_offs,
-            trace_lengths_dict.values(),
-            colors,
-        )
+    for idx, (fig, (suptitle, scale_dump), color) in enumerate(
+        zip(subfigs, censoring_dump.items(), colors)
     ):
         # Populates subfigures of main_fig
         _visualize_effect_of_censoring(
             fig=fig,
-            fits=fits,
+            censoring_cut_offs=scale_dump["censoring_cut_offs"],
+            xmins=scale_dump["xmins"],
+            alphas=scale_dump["alphas"],
+            n_above_xmin=scale_dump["n_above_xmin"],
             suptitle=suptitle,
-            censoring_cut_offs=censoring_cut_offs,
-            lengths=lengths,
+            lengths=scale_dump["lengths"],
             row_idx=idx,
             label_gen=label_gen,
             color=color,
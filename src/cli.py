@@ -1,50 +1,248 @@
 """
 Command-line entrypoint to analysis.
 """
+import cProfile
+import json
+import pstats
+import resource
+import sys
+import time
+from importlib import import_module
+from pathlib import Path
+
+import click
 import typer
+from beartype.typing import Dict, List, Optional, Tuple
 from rich.traceback import install
+from typer.core import TyperGroup
 
-import add_colorbar
-import appendix_fits_table
-import azimuth_set_table
-import censoring_analysis
-import censoring_plot
-import concatenate_scales
-import create_area_boundary
-import create_colorbar
-import data_count_table
-import lithology
-import multi_network_analysis
-import scale_metadata_table
-import set_wise_fits_table
-import shoreline
-import striations
-import visualize_drone_rasters
+from utils import TIMINGS, peak_rss_mb, print
 
 # Install rich python tracebacks
 install()
 
-APP = typer.Typer()
-
-for entrypoint in (
-    lithology.lithology,
-    striations.striations,
-    add_colorbar.add_colorbar,
-    azimuth_set_table.azimuth_set_table,
-    concatenate_scales.concatenate_scale,
-    create_area_boundary.create_area_boundary,
-    create_colorbar.create_colorbar,
-    data_count_table.data_count_table,
-    multi_network_analysis.multi_network_analysis,
-    set_wise_fits_table.set_wise_fits_table,
-    shoreline.shoreline,
-    visualize_drone_rasters.visualize_drone_rasters,
-    scale_metadata_table.scale_metadata_table,
-    appendix_fits_table.appendix_fits_table,
-    censoring_analysis.censoring_analysis,
-    censoring_plot.censoring_plot,
+# Command name: (module, function, short help). Modules, and their heavy
+# dependencies, are only imported when their command is run.
+COMMANDS: Dict[str, Tuple[str, str, str]] = {
+    "lithology": ("lithology", "lithology", "Create lithology map."),
+    "striations": (
+        "striations",
+        "striations",
+        "Create striation map and rose plot.",
+    ),
+    "add-colorbar": ("add_colorbar", "add_colorbar", "Add colorbar to map."),
+    "azimuth-set-table": (
+        "azimuth_set_table",
+        "azimuth_set_table",
+        "Create latex table of azimuths sets.",
+    ),
+    "concatenate-scale": (
+        "concatenate_scales",
+        "concatenate_scale",
+        "Concatenate scale datasets.",
+    ),
+    "create-area-boundary": (
+        "create_area_boundary",
+        "create_area_boundary",
+        "Create buffered boundary from area.",
+    ),
+    "create-colorbar": (
+        "create_colorbar",
+        "create_colorbar",
+        "Create custom colorbar.",
+    ),
+    "data-count-table": (
+        "data_count_table",
+        "data_count_table",
+        "Create latex table of trace counts by raster source.",
+    ),
+    "multi-network-analysis": (
+        "multi_network_analysis",
+        "multi_network_analysis",
+        "Conduct multi-scale network analysis.",
+    ),
+    "scale-network-analysis": (
+        "multi_network_analysis",
+        "scale_network_analysis",
+        "Conduct network analysis of a single scale.",
+    ),
+    "multi-scale-network-analysis": (
+        "multi_network_analysis",
+        "multi_scale_network_analysis",
+        "Conduct multi-scale network analysis of analysed scales.",
+    ),
+    "set-wise-fits-table": (
+        "set_wise_fits_table",
+        "set_wise_fits_table",
+        "Create table of set-wise length distribution analysis.",
+    ),
+    "shoreline": ("shoreline", "shoreline", "Create processed shoreline."),
+    "visualize-drone-rasters": (
+        "visualize_drone_rasters",
+        "visualize_drone_rasters",
+        "Visualize drone rasters.",
+    ),
+    "download": (
+        "download",
+        "download",
+        "Download file with concurrent range requests and verify its sha256.",
+    ),
+    "wfs-download": (
+        "wfs",
+        "wfs_download",
+        "Download features within bounding box from WFS service.",
+    ),
+    "prepare-raster": (
+        "prepare_rasters",
+        "prepare_raster",
+        "Convert raster to a tiled and compressed GeoTIFF with internal overviews.",
+    ),
+    "scale-metadata-table": (
+        "scale_metadata_table",
+        "scale_metadata_table",
+        "Create latex table of scale of observation metadata.",
+    ),
+    "appendix-fits-table": (
+        "appendix_fits_table",
+        "appendix_fits_table",
+        "Create table of lognormal and exponential fits to full length data.",
+    ),
+    "censoring-analysis": (
+        "censoring_analysis",
+        "censoring_analysis",
+        "Analyse censoring cut-off vs. power-law characteristics.",
+    ),
+    "censoring-plot": (
+        "censoring_plot",
+        "censoring_plot",
+        "Create plot of censoring cut-off vs. power-law characteristics.",
+    ),
+    "benchmark": (
+        "benchmark",
+        "benchmark",
+        "Benchmark analysis stages at scaled data sizes.",
+    ),
+    "synthetic-network": (
+        "synthetic_network",
+        "synthetic_network",
+        "Generate synthetic traces and circular target area from fitted statistics.",
+    ),
+}
+
+
+class LazyGroup(TyperGroup):
+
+    """
+    Group that imports the module of a command only when it is invoked.
+    """
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        """
+        List names of all commands.
+        """
+        return sorted(COMMANDS)
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        """
+        Import module of command and create the command from its entrypoint.
+        """
+        if cmd_name not in COMMANDS:
+            return None
+        module_name, function_name, _ = COMMANDS[cmd_name]
+        entrypoint = getattr(import_module(module_name), function_name)
+        command_app = typer.Typer(add_completion=False)
+        command_app.command(name=cmd_name)(entrypoint)
+        return typer.main.get_command(command_app)
+
+    def format_help(self, ctx: click.Context, formatter: click.HelpFormatter):
+        """
+        Format help without the rich help of typer, which resolves all commands.
+        """
+        super(TyperGroup, self).format_help(ctx, formatter)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        """
+        List commands with their static help without importing them.
+        """
+        with formatter.section("Commands"):
+            formatter.write_dl(
+                [(name, COMMANDS[name][2]) for name in self.list_commands(ctx)]
+            )
+
+
+APP = typer.Typer(cls=LazyGroup)
+
+
+def _write_profile(profiler: cProfile.Profile, profile_path: Path):
+    """
+    Write profile as text report (.txt) or as pstats dump (otherwise).
+    """
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    if profile_path.suffix == ".txt":
+        with profile_path.open("w") as openfile:
+            stats = pstats.Stats(profiler, stream=openfile)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats()
+    else:
+        profiler.dump_stats(profile_path)
+    print(f"Saved profile to: {profile_path}")
+
+
+def _write_timings(timings_path: Path, command: Optional[str], start: float):
+    """
+    Write durations of named stages and peak memory of command as json.
+    """
+    timings_path.parent.mkdir(parents=True, exist_ok=True)
+    timings_path.write_text(
+        json.dumps(
+            dict(
+                command=command,
+                argv=sys.argv,
+                seconds=time.perf_counter() - start,
+                peak_rss_mb=peak_rss_mb(),
+                peak_rss_children_mb=peak_rss_mb(resource.RUSAGE_CHILDREN),
+                stages=TIMINGS,
+            ),
+            indent=2,
+        )
+    )
+    print(f"Saved timings to: {timings_path}")
+
+
+@APP.callback()
+def main(
+    ctx: typer.Context,
+    profile: Optional[Path] = typer.Option(
+        None, help="Profile command with cProfile and save report to path."
+    ),
+    timings: Optional[Path] = typer.Option(
+        None, help="Save durations of named stages and peak memory as json to path."
+    ),
 ):
-    APP.command()(entrypoint)
+    """
+    Analysis of multi-scale fracture networks at Åland Islands.
+    """
+    start = time.perf_counter()
+    # Stages of earlier commands run in the same process are not reported
+    TIMINGS.clear()
+    if profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def close_profile():
+            profiler.disable()
+            _write_profile(profiler=profiler, profile_path=profile)
+
+        ctx.call_on_close(close_profile)
+    if timings is not None:
+
+        def close_timings():
+            _write_timings(
+                timings_path=timings,
+                command=ctx.invoked_subcommand,
+                start=start,
+            )
+
+        ctx.call_on_close(close_timings)
 
 
 if __name__ == "__main__":
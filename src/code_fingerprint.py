@@ -0,0 +1,355 @@
+"""
+Fingerprint the code reachable from an entrypoint.
+
+Local modules (found under the given roots) are parsed and the top-level
+definitions reachable from the entrypoint function are collected by
+following name references and imports. Module-level statements that are not
+definitions (e.g., monkeypatching) are included whenever their module is
+reached. The fingerprint is the hash of the reachable definitions as
+normalised ASTs, i.e., without docstrings, comments and formatting.
+Consequently, edits to unrelated functions or modules, docstrings or
+formatting do not change the fingerprint.
+
+Third-party packages are not followed. Their versions are expected to be
+tracked otherwise, e.g., by poetry.lock.
+"""
+
+import ast
+import hashlib
+from pathlib import Path
+
+from beartype.typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+DEFINITION = "definition"
+MODULE = "module"
+INIT = "init"
+
+# Reachable node: (kind, module, name)
+Node = Tuple[str, str, str]
+
+DEFINITION_STATEMENTS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class ModuleInfo(NamedTuple):
+
+    """
+    Top-level structure of a parsed module.
+    """
+
+    definitions: Dict[str, List[ast.stmt]]
+    imports: Dict[str, Tuple[str, Optional[str]]]
+    star_imports: List[str]
+    side_effects: List[ast.stmt]
+
+
+def _strip_docstrings(tree: ast.AST):
+    """
+    Remove docstrings from module, class and function bodies in place.
+    """
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, *DEFINITION_STATEMENTS)):
+            continue
+        body = node.body
+        if (
+            body
+            and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)
+        ):
+            node.body = body[1:] or [ast.Pass()]
+
+
+def _absolute_module(module: Optional[str], level: int, package: str) -> str:
+    """
+    Resolve module of a (relative) from-import.
+    """
+    if level == 0:
+        assert module is not None
+        return module
+    base = package.split(".")
+    base = base[: len(base) - (level - 1)]
+    return ".".join([*base, module] if module else base)
+
+
+def _bound_names(target: ast.AST) -> List[str]:
+    """
+    Get names bound by an assignment target.
+    """
+    return [
+        node.id
+        for node in ast.walk(target)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)
+    ]
+
+
+class CodeGraph:
+
+    """
+    Lazily parsed local modules and the references between their definitions.
+    """
+
+    def __init__(self, roots: Iterable[Path]):
+        """
+        Initialize with root directories of local modules.
+        """
+        self.roots = list(roots)
+        self._modules: Dict[str, Optional[ModuleInfo]] = dict()
+
+    def module_path(self, module: str) -> Optional[Path]:
+        """
+        Find source file of a local module.
+        """
+        parts = module.split(".")
+        for root in self.roots:
+            path = root.joinpath(*parts)
+            if path.with_suffix(".py").is_file():
+                return path.with_suffix(".py")
+            if (path / "__init__.py").is_file():
+                return path / "__init__.py"
+        return None
+
+    def module(self, module: str) -> Optional[ModuleInfo]:
+        """
+        Parse local module or return None if it is not local.
+        """
+        if module not in self._modules:
+            path = self.module_path(module)
+            self._modules[module] = (
+                None if path is None else self._parse(module=module, path=path)
+            )
+        return self._modules[module]
+
+    def _parse(self, module: str, path: Path) -> ModuleInfo:
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        _strip_docstrings(tree)
+        package = module if path.name == "__init__.py" else module.rpartition(".")[0]
+        info = ModuleInfo(
+            definitions=dict(),
+            imports=dict(),
+            star_imports=[],
+            side_effects=[],
+        )
+        for statement in tree.body:
+            if isinstance(statement, ast.Pass):
+                continue
+            if isinstance(statement, DEFINITION_STATEMENTS):
+                info.definitions.setdefault(statement.name, []).append(statement)
+                continue
+            # Imports may also be nested in e.g. try-except blocks
+            names = []
+            for node in ast.walk(statement):
+                if isinstance(node, ast.Import):
+                    for alias in node.names:
+                        if alias.asname is not None:
+                            info.imports[alias.asname] = (alias.name, None)
+                        else:
+                            top_level = alias.name.split(".")[0]
+                            info.imports[top_level] = (top_level, None)
+                elif isinstance(node, ast.ImportFrom):
+                    from_module = _absolute_module(node.module, node.level, package)
+                    for alias in node.names:
+                        if alias.name == "*":
+                            info.star_imports.append(from_module)
+                        else:
+                            info.imports[alias.asname or alias.name] = (
+                                from_module,
+                                alias.name,
+                            )
+                elif isinstance(node, DEFINITION_STATEMENTS):
+                    names.append(node.name)
+                elif isinstance(
+                    node, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.For)
+                ):
+                    targets = (
+                        node.targets if isinstance(node, ast.Assign) else [node.target]
+                    )
+                    for target in targets:
+                        names.extend(_bound_names(target))
+            if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                continue
+            if isinstance(statement, (ast.Assign, ast.AnnAssign)) and all(
+                isinstance(target, ast.Name)
+                for target in (
+                    statement.targets
+                    if isinstance(statement, ast.Assign)
+                    else [statement.target]
+                )
+            ):
+                # Plain assignment of module-level names
+                for name in names:
+                    info.definitions.setdefault(name, []).append(statement)
+                continue
+            # Anything else is run on import
+            for name in names:
+                info.definitions.setdefault(name, []).append(statement)
+            info.side_effects.append(statement)
+        return info
+
+    def resolve(self, module: str, name: str) -> Optional[Node]:
+        """
+        Resolve a name in the namespace of a local module.
+        """
+        info = self.module(module)
+        if info is None:
+            return None
+        if name in info.definitions:
+            return (DEFINITION, module, name)
+        if name in info.imports:
+            target_module, attribute = info.imports[name]
+            if attribute is None:
+                return (MODULE, target_module, "")
+            return self.resolve_attribute(target_module, attribute)
+        for star_module in info.star_imports:
+            resolved = self.resolve_attribute(star_module, name)
+            if resolved is not None:
+                return resolved
+        return None
+
+    def resolve_attribute(self, module: str, attribute: str) -> Optional[Node]:
+        """
+        Resolve attribute of a module, which may also be a submodule.
+        """
+        submodule = f"{module}.{attribute}"
+        if self.module_path(submodule) is not None:
+            return (MODULE, submodule, "")
+        if self.module_path(module) is None:
+            return None
+        return self.resolve(module, attribute)
+
+    def references(self, module: str, statements: Iterable[ast.AST]) -> Set[Node]:
+        """
+        Resolve names and attribute chains referenced in statements.
+
+        Attribute chains such as ``package.module.function`` are resolved as
+        far as they refer to local modules so that referencing a single
+        function of a module does not reach the whole module.
+        """
+        references = set()
+        for statement in statements:
+            nodes = list(ast.walk(statement))
+            inner = {
+                id(node.value)
+                for node in nodes
+                if isinstance(node, ast.Attribute)
+                and isinstance(node.value, (ast.Attribute, ast.Name))
+            }
+            for node in nodes:
+                if id(node) in inner:
+                    continue
+                resolved = None
+                if isinstance(node, ast.Name):
+                    resolved = self.resolve(module, node.id)
+                elif isinstance(node, ast.Attribute):
+                    resolved = self._resolve_chain(module, node)
+                if resolved is not None:
+                    references.add(resolved)
+        return references
+
+    def _resolve_chain(self, module: str, node: ast.Attribute) -> Optional[Node]:
+        attributes = []
+        value: ast.AST = node
+        while isinstance(value, ast.Attribute):
+            attributes.append(value.attr)
+            value = value.value
+        if not isinstance(value, ast.Name):
+            return None
+        resolved = self.resolve(module, value.id)
+        for attribute in reversed(attributes):
+            if resolved is None or resolved[0] != MODULE:
+                break
+            resolved = self.resolve_attribute(resolved[1], attribute)
+        return resolved
+
+    def imported_modules(self, module: str) -> Set[str]:
+        """
+        Get local modules imported by the top-level code of a module.
+        """
+        info = self.module(module)
+        if info is None:
+            return set()
+        imported = set(info.star_imports)
+        for target_module, attribute in info.imports.values():
+            imported.add(target_module)
+            if attribute is not None:
+                resolved = self.resolve_attribute(target_module, attribute)
+                if resolved is not None and resolved[0] == MODULE:
+                    imported.add(resolved[1])
+        return {
+            imported_module
+            for imported_module in imported
+            if self.module_path(imported_module) is not None
+        }
+
+    def statements(self, node: Node) -> List[ast.stmt]:
+        """
+        Get statements of a node.
+        """
+        kind, module, name = node
+        info = self.module(module)
+        if info is None:
+            return []
+        if kind == DEFINITION:
+            return info.definitions[name]
+        if kind == INIT:
+            return info.side_effects
+        return []
+
+
+def reachable_nodes(graph: CodeGraph, entrypoints: Iterable[str]) -> Set[Node]:
+    """
+    Collect nodes reachable from entrypoints.
+
+    Entrypoints are given as ``module:function`` or as ``module`` to include
+    the whole module.
+    """
+    stack: List[Node] = []
+    for entrypoint in entrypoints:
+        module, _, name = entrypoint.partition(":")
+        stack.append((DEFINITION, module, name) if name else (MODULE, module, ""))
+
+    reached: Set[Node] = set()
+    while stack:
+        node = stack.pop()
+        if node in reached:
+            continue
+        kind, module, name = node
+        info = graph.module(module)
+        if info is None:
+            continue
+        if kind == DEFINITION and name not in info.definitions:
+            # E.g. name bound by an import in an __init__.py
+            resolved = graph.resolve(module, name)
+            if resolved is not None and resolved != node:
+                stack.append(resolved)
+            continue
+        reached.add(node)
+        if kind == MODULE:
+            # Modules referenced as a whole, e.g. passed as objects, are
+            # included as a whole unless only their attributes are used
+            stack.extend((DEFINITION, module, name) for name in info.definitions)
+        # Importing a module runs its and its parent packages' top-level code
+        parts = module.split(".")
+        stack.extend(
+            (INIT, ".".join(parts[:idx]), "") for idx in range(1, len(parts) + 1)
+        )
+        if kind == INIT:
+            # Which in turn runs the top-level code of the imported modules
+            stack.extend(
+                (INIT, imported, "") for imported in graph.imported_modules(module)
+            )
+        stack.extend(graph.references(module, graph.statements(node)))
+    return reached
+
+
+def code_fingerprint(entrypoints: Iterable[str], roots: Iterable[Path]) -> str:
+    """
+    Compute fingerprint of the code reachable from entrypoints.
+    """
+    graph = CodeGraph(roots=roots)
+    digest = hashlib.sha256()
+    for node in sorted(reachable_nodes(graph=graph, entrypoints=entrypoints)):
+        kind, module, name = node
+        digest.update(f"{kind}:{module}:{name}\n".encode())
+        for statement in graph.statements(node):
+            digest.update(ast.dump(statement, include_attributes=False).encode())
+    return digest.hexdigest()
@@ -0,0 +1,372 @@
+"""
+Composite figures from images in memory.
+
+Replaces chains of ``magick montage`` calls in which intermediate montages
+were written to disk, labelled and montaged again. Each SVG is rasterized
+only once at the given density and the rasters are cached by the content
+hash of the SVG. Labelling, resizing, framing and tiling are then done in
+memory and only the final figure is written.
+
+Layouts are given as json-like specs so that they can be composed, and
+tracked with ``config_changed``, in ``dodo.py`` without importing this
+module::
+
+    {
+        "items": ["a.svg", "b.svg", {"items": [...], "tile": "1x2"}],
+        "tile": "3x1",
+        "geometry": "1080x1080+4+4",
+        "labels": [{"text": "(a)", "x": 30, "y": 60, "font_size": 50}],
+        "frame": 4,
+    }
+
+Geometry and tile are given as in ImageMagick.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+from functools import lru_cache
+from math import ceil
+from pathlib import Path
+
+from beartype.typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+from output_writer import write_if_changed
+from utils import CACHE_PATH
+
+RASTER_CACHE_PATH = CACHE_PATH / "rasters"
+
+# Density (dpi) at which SVGs are rasterized
+DEFAULT_DENSITY = 300
+
+# Default frame color (mattecolor) of ImageMagick
+DEFAULT_FRAME_COLOR = "#bdbdbd"
+
+DEFAULT_FONT = "DejaVu Sans"
+
+# E.g. 1080x1080+4+4, 1800x, x1200 or +4+4
+GEOMETRY_PATTERN = re.compile(
+    r"^(?P<width>\d+)?(?:x(?P<height>\d+)?)?(?:\+(?P<x>\d+)\+(?P<y>\d+))?$"
+)
+
+try:
+    import cairosvg
+
+    CAIROSVG_AVAILABLE = True
+except ImportError:
+    CAIROSVG_AVAILABLE = False
+
+
+class Geometry(NamedTuple):
+
+    """
+    Size that images are fit within and spacing around them.
+    """
+
+    width: Optional[int] = None
+    height: Optional[int] = None
+    spacing_x: int = 0
+    spacing_y: int = 0
+
+
+class Label(NamedTuple):
+
+    """
+    Text drawn on an image with its baseline starting at x, y.
+    """
+
+    text: str
+    x: int = 30
+    y: int = 60
+    font_size: int = 50
+    font: str = DEFAULT_FONT
+    font_weight: str = "normal"
+    fill: str = "black"
+    stroke: Optional[str] = None
+    stroke_width: int = 1
+
+
+def parse_geometry(geometry: str) -> Geometry:
+    """
+    Parse ImageMagick montage geometry.
+
+    >>> parse_geometry("1080x1080+4+4")
+    Geometry(width=1080, height=1080, spacing_x=4, spacing_y=4)
+    >>> parse_geometry("x1200")
+    Geometry(width=None, height=1200, spacing_x=0, spacing_y=0)
+    """
+    match = GEOMETRY_PATTERN.match(geometry)
+    if match is None:
+        raise ValueError(f"Expected geometry such as 1080x1080+4+4, got {geometry}.")
+    values = {
+        key: None if value is None else int(value)
+        for key, value in match.groupdict().items()
+    }
+    return Geometry(
+        width=values["width"],
+        height=values["height"],
+        spacing_x=values["x"] or 0,
+        spacing_y=values["y"] or 0,
+    )
+
+
+def parse_tile(tile: str, count: int) -> Tuple[int, int]:
+    """
+    Parse ImageMagick montage tile as columns and rows.
+
+    >>> parse_tile("2x2", 4)
+    (2, 2)
+    >>> parse_tile("1x", 3)
+    (1, 3)
+    """
+    columns, _, rows = tile.partition("x")
+    if not columns and not rows:
+        raise ValueError(f"Expected tile such as 3x1, got {tile}.")
+    if not rows:
+        return int(columns), ceil(count / int(columns))
+    if not columns:
+        return ceil(count / int(rows)), int(rows)
+    return int(columns), int(rows)
+
+
+def _render_svg(data: bytes, path: Path, density: int) -> bytes:
+    """
+    Render SVG as png with cairosvg or, if not installed, ImageMagick.
+    """
+    if CAIROSVG_AVAILABLE:
+        return cairosvg.svg2png(bytestring=data, dpi=density)
+    magick = shutil.which("magick")
+    if magick is None:
+        raise FileNotFoundError(
+            f"Rasterizing {path} requires cairosvg or ImageMagick (magick)."
+        )
+    return subprocess.run(
+        [magick, "-density", str(density), "-background", "none", "svg:-", "png:-"],
+        input=data,
+        capture_output=True,
+        check=True,
+    ).stdout
+
+
+def rasterize_svg(
+    path: Path, density: int = DEFAULT_DENSITY, cache_dir: Path = RASTER_CACHE_PATH
+) -> Image.Image:
+    """
+    Rasterize SVG at density through the on-disk raster cache.
+    """
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    cached_path = cache_dir / f"{digest}_{density}.png"
+    if cached_path.exists():
+        try:
+            with Image.open(cached_path) as image:
+                image.load()
+                return image
+        except Exception:
+            logging.warning(
+                f"Failed to read cached raster of {path}. Rasterizing again.",
+                exc_info=True,
+            )
+            cached_path.unlink(missing_ok=True)
+
+    png = _render_svg(data=data, path=path, density=density)
+
+    tmp_path = cached_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(png)
+        tmp_path.replace(cached_path)
+    except Exception:
+        logging.warning(f"Failed to cache raster of {path}.", exc_info=True)
+        tmp_path.unlink(missing_ok=True)
+
+    with Image.open(io.BytesIO(png)) as image:
+        image.load()
+        return image
+
+
+def read_image(
+    path: Path, background: str = "white", density: int = DEFAULT_DENSITY
+) -> Image.Image:
+    """
+    Read image as RGB with transparency flattened onto background.
+
+    SVGs are rasterized at density.
+    """
+    if path.suffix.lower() == ".svg":
+        image = rasterize_svg(path=path, density=density)
+    else:
+        with Image.open(path) as opened:
+            opened.load()
+            image = opened
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        flattened = Image.new("RGB", image.size, background)
+        flattened.paste(image, mask=image.getchannel("A"))
+        return flattened
+    return image.convert("RGB")
+
+
+@lru_cache(maxsize=None)
+def _font_path(font: str, font_weight: str) -> str:
+    # Fonts are resolved with matplotlib which is only imported when labelling
+    from matplotlib import font_manager
+
+    return font_manager.findfont(
+        font_manager.FontProperties(family=font, weight=font_weight)
+    )
+
+
+def draw_label(image: Image.Image, label: Label) -> Image.Image:
+    """
+    Draw label on a copy of image.
+    """
+    image = image.copy()
+    font = ImageFont.truetype(
+        _font_path(label.font, label.font_weight), size=label.font_size
+    )
+    ImageDraw.Draw(image).text(
+        (label.x, label.y),
+        label.text,
+        font=font,
+        fill=label.fill,
+        anchor="ls",
+        stroke_width=label.stroke_width if label.stroke is not None else 0,
+        stroke_fill=label.stroke,
+    )
+    return image
+
+
+def _fit(image: Image.Image, geometry: Geometry) -> Image.Image:
+    """
+    Resize image to fit within geometry preserving aspect ratio.
+    """
+    width, height = image.size
+    scales = [
+        size / original
+        for size, original in ((geometry.width, width), (geometry.height, height))
+        if size is not None
+    ]
+    if not scales:
+        return image
+    scale = min(scales)
+    size = (max(round(width * scale), 1), max(round(height * scale), 1))
+    if size == image.size:
+        return image
+    return image.resize(size, resample=Image.LANCZOS)
+
+
+def montage(
+    images: Sequence[Image.Image],
+    tile: Tuple[int, int],
+    geometry: Geometry = Geometry(),
+    frame: int = 0,
+    frame_color: str = DEFAULT_FRAME_COLOR,
+    background: str = "white",
+) -> Image.Image:
+    """
+    Tile images into a single image as with ``magick montage``.
+
+    Images are fit within geometry, framed and centered within equally sized
+    cells that are separated by the geometry spacing.
+    """
+    columns, rows = tile
+    if len(images) > columns * rows:
+        raise ValueError(f"Cannot fit {len(images)} images in {columns}x{rows} tile.")
+    framed = []
+    for image in images:
+        image = _fit(image, geometry)
+        if frame > 0:
+            with_frame = Image.new(
+                "RGB",
+                (image.width + 2 * frame, image.height + 2 * frame),
+                frame_color,
+            )
+            with_frame.paste(image, (frame, frame))
+            image = with_frame
+        framed.append(image)
+
+    cell_width = max(image.width for image in framed) + 2 * geometry.spacing_x
+    cell_height = max(image.height for image in framed) + 2 * geometry.spacing_y
+    # Rows left empty are not drawn
+    rows = min(rows, ceil(len(framed) / columns))
+    result = Image.new("RGB", (cell_width * columns, cell_height * rows), background)
+    for idx, image in enumerate(framed):
+        row, column = divmod(idx, columns)
+        result.paste(
+            image,
+            (
+                column * cell_width + (cell_width - image.width) // 2,
+                row * cell_height + (cell_height - image.height) // 2,
+            ),
+        )
+    return result
+
+
+def render(spec: Dict[str, Any]) -> Image.Image:
+    """
+    Render a montage spec, with nested specs, into an image.
+    """
+    background = spec.get("background", "white")
+    density = spec.get("density", DEFAULT_DENSITY)
+    items = spec["items"]
+    labels: List[Optional[Dict[str, Any]]] = list(spec.get("labels", []))
+    labels.extend([None] * (len(items) - len(labels)))
+    images = []
+    for item, label in zip(items, labels):
+        image = (
+            render(item)
+            if isinstance(item, dict)
+            else read_image(Path(item), background=background, density=density)
+        )
+        if label is not None:
+            image = draw_label(image, Label(**label))
+        images.append(image)
+    return montage(
+        images=images,
+        tile=parse_tile(spec.get("tile", f"{len(items)}x1"), count=len(items)),
+        geometry=parse_geometry(spec.get("geometry", "")),
+        frame=spec.get("frame", 0),
+        frame_color=spec.get("frame_color", DEFAULT_FRAME_COLOR),
+        background=background,
+    )
+
+
+def save_image(image: Image.Image, path: Path, density: int = DEFAULT_DENSITY) -> bool:
+    """
+    Save image as pdf, jpg or png unless an existing file is unchanged.
+    """
+    suffix = path.suffix.lower()
+    buffer = io.BytesIO()
+    if suffix == ".pdf":
+        # Without dates so that unchanged figures have the same bytes
+        image.save(
+            buffer,
+            format="PDF",
+            resolution=float(density),
+            title=path.stem,
+            creationDate=None,
+            modDate=None,
+        )
+    elif suffix in (".jpg", ".jpeg"):
+        image.save(buffer, format="JPEG", quality=92, dpi=(density, density))
+    elif suffix == ".png":
+        image.save(buffer, format="PNG", dpi=(density, density))
+    else:
+        raise ValueError(f"Expected pdf, jpg or png output, got {path}.")
+    return write_if_changed(path=path, data=buffer.getvalue())
+
+
+def composite(spec: Dict[str, Any], output_path: Path):
+    """
+    Render a montage spec and save it to output_path.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_image(
+        render(spec), path=output_path, density=spec.get("density", DEFAULT_DENSITY)
+    )
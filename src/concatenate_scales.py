@@ -4,15 +4,20 @@ Network characterization of each scale.
 
 import json
 import logging
+from datetime import datetime
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import typer
-from beartype.typing import List
+from beartype.typing import Any, Dict, List, Optional, Sequence
+from shapely.geometry import mapping
+from shapely.geometry.base import BaseGeometry
 
-from fractopo.general import crop_to_target_areas, read_geofile
-from utils import print
+from fractopo.general import crop_to_target_areas
+from geodata_cache import read_geofile
+from utils import print, timed
 
 
 def convert_sequence_columns(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -35,17 +40,159 @@ def convert_sequence_columns(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
 
 
 GEOJSON_DRIVER = "GeoJSON"
+GEOJSON_INDENT = 1
 
 
-def write_geodata(gdf: gpd.GeoDataFrame, path: Path, driver: str = GEOJSON_DRIVER):
+def _is_sequence_column(column_data: pd.Series) -> bool:
+    """
+    Check if column is sequence (list/tuple) typed based on its first value.
+    """
+    return len(column_data) > 0 and isinstance(column_data.values[0], (list, tuple))
+
+
+def _geojson_property(value: Any, is_sequence: bool) -> Any:
+    """
+    Convert property value to a json serializable value.
+    """
+    if is_sequence:
+        return str(tuple(value))
+    if isinstance(value, np.generic):
+        value = value.item()
+    if not isinstance(value, (list, tuple, dict)) and pd.isna(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _round_coordinates(coordinates: Sequence, precision: int) -> list:
+    """
+    Round (nested) coordinate sequences to precision.
+    """
+    if len(coordinates) > 0 and isinstance(coordinates[0], (float, int)):
+        return [round(value, precision) for value in coordinates]
+    return [_round_coordinates(nested, precision) for nested in coordinates]
+
+
+def _geojson_geometry(
+    geometry: Optional[BaseGeometry], precision: Optional[int]
+) -> Optional[Dict[str, Any]]:
+    """
+    Convert shapely geometry to GeoJSON geometry dict.
+    """
+    if geometry is None or geometry.is_empty:
+        return None
+    geometry_dict = dict(mapping(geometry))
+    if precision is None:
+        return geometry_dict
+    if "geometries" in geometry_dict:
+        geometry_dict["geometries"] = [
+            _geojson_geometry(geom, precision) for geom in geometry.geoms
+        ]
+    else:
+        geometry_dict["coordinates"] = _round_coordinates(
+            geometry_dict["coordinates"], precision
+        )
+    return geometry_dict
+
+
+def _geojson_crs(gdf: gpd.GeoDataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Get GeoJSON crs member as written by the GDAL GeoJSON driver.
+    """
+    if gdf.crs is None:
+        return None
+    epsg = gdf.crs.to_epsg()
+    if epsg is None or epsg == 4326:
+        return None
+    return {"type": "name", "properties": {"name": f"urn:ogc:def:crs:EPSG::{epsg}"}}
+
+
+def _indent_block(dumped: str, padding: str) -> str:
+    """
+    Indent all but the first line of a json dump.
+    """
+    return dumped.replace("\n", f"\n{padding}")
+
+
+def write_geojson(
+    gdf: gpd.GeoDataFrame,
+    path: Path,
+    coordinate_precision: Optional[int] = None,
+):
+    """
+    Write GeoDataFrame as an indented GeoJSON FeatureCollection.
+
+    Features are serialized and written one by one so memory use does not
+    grow with the number of features. Sequence type columns are converted to
+    str as in ``convert_sequence_columns``. Output matches the ``json.dumps``
+    (with indent) formatted output of the GDAL GeoJSON driver.
+    """
+    if gdf.empty:
+        # Written as with to_json and indent as before, i.e. without a name
+        path.write_text(json.dumps(json.loads(gdf.to_json()), indent=GEOJSON_INDENT))
+        return
+
+    padding = " " * GEOJSON_INDENT
+    feature_padding = padding * 2
+    columns = [column for column in gdf.columns if column != gdf.geometry.name]
+    sequence_columns = [_is_sequence_column(gdf[column]) for column in columns]
+    for column, is_sequence in zip(columns, sequence_columns):
+        if is_sequence:
+            logging.info(f"Converting {column} from sequence to str.")
+
+    header: Dict[str, Any] = {"type": "FeatureCollection", "name": path.stem}
+    crs = _geojson_crs(gdf)
+    if crs is not None:
+        header["crs"] = crs
+
+    with path.open("w") as openfile:
+        openfile.write("{\n")
+        for key, value in header.items():
+            dumped = json.dumps(value, indent=GEOJSON_INDENT)
+            openfile.write(f'{padding}"{key}": {_indent_block(dumped, padding)},\n')
+        openfile.write(f'{padding}"features": [')
+
+        rows = zip(gdf.geometry.values, *(gdf[column].values for column in columns))
+        separator = ""
+        for geometry, *values in rows:
+            feature = {
+                "type": "Feature",
+                "properties": {
+                    column: _geojson_property(value, is_sequence=is_sequence)
+                    for column, value, is_sequence in zip(
+                        columns, values, sequence_columns
+                    )
+                },
+                "geometry": _geojson_geometry(geometry, precision=coordinate_precision),
+            }
+            dumped = json.dumps(feature, indent=GEOJSON_INDENT)
+            openfile.write(
+                f"{separator}\n{feature_padding}"
+                f"{_indent_block(dumped, feature_padding)}"
+            )
+            separator = ","
+
+        openfile.write(f"\n{padding}]\n}}" if separator else "]\n}")
+
+
+def write_geodata(
+    gdf: gpd.GeoDataFrame,
+    path: Path,
+    driver: str = GEOJSON_DRIVER,
+    coordinate_precision: Optional[int] = None,
+):
     """
     Write geodata with driver.
 
-    Default is GeoJSON.
+    Default is GeoJSON which is written in a single streaming pass with
+    ``write_geojson``. ``coordinate_precision`` is only used with GeoJSON.
 
     Imported from tracerepo.
     """
-    if gdf.empty:
+    if driver == GEOJSON_DRIVER:
+        write_geojson(gdf=gdf, path=path, coordinate_precision=coordinate_precision)
+    elif gdf.empty:
         # Handle empty GeoDataFrames
         path.write_text(gdf.to_json())
     else:
@@ -53,31 +200,25 @@ def write_geodata(gdf: gpd.GeoDataFrame, path: Path, driver: str = GEOJSON_DRIVE
 
         gdf.to_file(path, driver=driver)
 
-    if driver != GEOJSON_DRIVER:
-        return
-
-    # Format geojson with indent of 1
-    read_json = path.read_text()
-    loaded_json = json.loads(read_json)
-    dumped_json = json.dumps(loaded_json, indent=1)
-    path.write_text(dumped_json)
-
 
 def concatenate_scale(
     traces_paths: List[Path] = typer.Option(...),
     area_paths: List[Path] = typer.Option(...),
     concat_traces_path: Path = typer.Option(...),
     concat_area_path: Path = typer.Option(...),
+    coordinate_precision: Optional[int] = typer.Option(None),
 ):
     """
     Concatenate scale datasets.
     """
     # CONSOLE.print(f"WARNING: LOADING ONLY LIMITED DATASET FOR 20m", style="red")
 
-    trace_gdfs = [read_geofile(traces_path) for traces_path in traces_paths]
-    area_gdfs = [read_geofile(area_path) for area_path in area_paths]
-    dataset_traces = pd.concat(trace_gdfs)
-    dataset_areas = pd.concat(area_gdfs)
+    with timed("read"):
+        trace_gdfs = [read_geofile(traces_path) for traces_path in traces_paths]
+        area_gdfs = [read_geofile(area_path) for area_path in area_paths]
+    with timed("concatenate"):
+        dataset_traces = pd.concat(trace_gdfs)
+        dataset_areas = pd.concat(area_gdfs)
     print(f"Concatenated traces (n={dataset_traces.shape[0]})")
     print(f"Concatenated areas (n={dataset_areas.shape[0]})")
 
@@ -88,11 +229,16 @@ def concatenate_scale(
     assert len(set(gdf.crs for gdf in [*trace_gdfs, *area_gdfs])) == 1
 
     # Clip to target areas
-    dataset_traces = crop_to_target_areas(
-        dataset_traces, dataset_areas, keep_column_data=False
-    )
+    with timed("crop to target areas"):
+        dataset_traces = crop_to_target_areas(
+            dataset_traces, dataset_areas, keep_column_data=False
+        )
     assert isinstance(dataset_traces, gpd.GeoDataFrame)
 
     concat_traces_path.parent.mkdir(exist_ok=True, parents=True)
-    write_geodata(gdf=dataset_traces, path=concat_traces_path)
-    write_geodata(gdf=dataset_areas, path=concat_area_path)
+    for gdf, path in (
+        (dataset_traces, concat_traces_path),
+        (dataset_areas, concat_area_path),
+    ):
+        with timed(f"write {path}"):
+            write_geodata(gdf=gdf, path=path, coordinate_precision=coordinate_precision)
@@ -9,7 +9,7 @@ import typer
 from beartype.typing import List
 from shapely.geometry import MultiPolygon
 
-from fractopo.general import read_geofile
+from geodata_cache import read_geofile
 from utils import print
 
 
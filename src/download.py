@@ -0,0 +1,509 @@
+"""
+Download files with concurrent range requests and checksum verification.
+
+Downloads of large files are split into segments that are fetched
+concurrently with HTTP range requests and written in place into a partial
+file. Completed segments are recorded next to the partial file so that an
+interrupted download resumes from where it stopped. Servers that do not
+support range requests are downloaded as a single stream.
+
+Each downloaded file is verified against the sha256 committed in a
+manifest in ``data/``. The sha256 of a file missing from it is recorded on
+first use in a local manifest in the cache directory, which later downloads
+are verified against, or in the committed one with ``--record``. A mirror
+directory,
+e.g. shared between the users of a machine, is checked for the file before
+downloading and the downloaded file is added to it.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import typer
+from beartype.typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from utils import CACHE_PATH, file_digest, print, timed
+
+MANIFEST_PATH = Path(__file__).parent.parent / "data" / "download_checksums.json"
+
+# Checksums trusted on first use that are not in the committed manifest
+LOCAL_MANIFEST_PATH = CACHE_PATH / "download_checksums.json"
+
+# Manifest section of downloaded files
+FILES_SECTION = "files"
+
+# Mirror directory that is checked before downloading
+MIRROR_PATH_ENV = "ALAND_DOWNLOAD_MIRROR"
+
+CONNECTIONS = 4
+SEGMENT_SIZE = 2**26
+CHUNK_SIZE = 2**20
+TIMEOUT = 60
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+# E.g. bytes 0-0/1234
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class Probe(NamedTuple):
+
+    """
+    Final url of download and its size if range requests are supported.
+    """
+
+    url: str
+    size: Optional[int]
+
+
+def _open(
+    url: str, byte_range: Optional[Tuple[int, Optional[int]]] = None, timeout=TIMEOUT
+):
+    headers = {"User-Agent": "aland-download"}
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.urlopen(
+        urllib.request.Request(url, headers=headers), timeout=timeout
+    )
+
+
+def probe(url: str, timeout: float = TIMEOUT) -> Probe:
+    """
+    Resolve redirects of url and check whether it supports range requests.
+
+    A request for the first byte is used instead of a HEAD request as
+    ``urllib`` follows redirects of HEAD requests with GET requests.
+    """
+    with _open(url, byte_range=(0, 0), timeout=timeout) as response:
+        content_range = response.headers.get("Content-Range", "")
+        match = CONTENT_RANGE_PATTERN.match(content_range)
+        if response.status != 206 or match is None or match.group(3) == "*":
+            return Probe(url=response.geturl(), size=None)
+        return Probe(url=response.geturl(), size=int(match.group(3)))
+
+
+def segments(size: int, segment_size: int) -> List[Tuple[int, int]]:
+    """
+    Split size into inclusive byte ranges.
+
+    >>> segments(10, 4)
+    [(0, 3), (4, 7), (8, 9)]
+    >>> segments(0, 4)
+    []
+    """
+    return [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+
+
+def _read_state(state_path: Path, url: str, size: int) -> Set[int]:
+    """
+    Read start offsets of completed segments of an earlier partial download.
+    """
+    try:
+        state = json.loads(state_path.read_text())
+    except FileNotFoundError:
+        return set()
+    except Exception:
+        logging.warning(f"Failed to read {state_path}. Restarting.", exc_info=True)
+        return set()
+    if state.get("url") != url or state.get("size") != size:
+        return set()
+    return set(state.get("completed", []))
+
+
+def _write_state(state_path: Path, url: str, size: int, completed: Set[int]):
+    tmp_path = state_path.with_name(f"{state_path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(
+        json.dumps(dict(url=url, size=size, completed=sorted(completed)))
+    )
+    tmp_path.replace(state_path)
+
+
+def _download_segment(
+    url: str, part_path: Path, byte_range: Tuple[int, int], timeout: float
+):
+    start, end = byte_range
+    with _open(url, byte_range=byte_range, timeout=timeout) as response:
+        if response.status != 206:
+            raise ConnectionError(
+                f"Expected partial content for range {start}-{end} of {url}, "
+                f"got status {response.status}."
+            )
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            offset = start
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+        finally:
+            os.close(fd)
+    if offset != end + 1:
+        raise ConnectionError(
+            f"Expected {end + 1 - start} bytes for range {start}-{end} of {url}, "
+            f"got {offset - start}."
+        )
+
+
+def download_ranges(
+    url: str,
+    part_path: Path,
+    size: int,
+    connections: int = CONNECTIONS,
+    segment_size: int = SEGMENT_SIZE,
+    timeout: float = TIMEOUT,
+):
+    """
+    Download segments of url concurrently into part_path.
+
+    Segments completed by an earlier, interrupted, call are not downloaded
+    again.
+    """
+    state_path = part_path.with_name(part_path.name[: -len(PART_SUFFIX)] + STATE_SUFFIX)
+    completed = _read_state(state_path=state_path, url=url, size=size)
+    if not part_path.exists() or part_path.stat().st_size != size:
+        completed = set()
+        with part_path.open("wb") as openfile:
+            openfile.truncate(size)
+    remaining = [
+        byte_range
+        for byte_range in segments(size, segment_size)
+        if byte_range[0] not in completed
+    ]
+    if len(completed) > 0:
+        print(f"Resuming download of {url}. {len(remaining)} segments remaining.")
+    lock = threading.Lock()
+
+    def download(byte_range: Tuple[int, int]):
+        _download_segment(
+            url=url, part_path=part_path, byte_range=byte_range, timeout=timeout
+        )
+        with lock:
+            completed.add(byte_range[0])
+            _write_state(state_path=state_path, url=url, size=size, completed=completed)
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        # Raises the first exception of segment downloads
+        list(executor.map(download, remaining))
+    state_path.unlink(missing_ok=True)
+
+
+def download_stream(url: str, part_path: Path, timeout: float = TIMEOUT):
+    """
+    Download url as a single stream into part_path.
+
+    A partial download is continued if the server responds to a range
+    request and restarted otherwise.
+    """
+    start = part_path.stat().st_size if part_path.exists() else 0
+    with _open(
+        url, byte_range=(start, None) if start > 0 else None, timeout=timeout
+    ) as response:
+        mode = "ab" if start > 0 and response.status == 206 else "wb"
+        with part_path.open(mode) as openfile:
+            shutil.copyfileobj(response, openfile, CHUNK_SIZE)
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock on path while reading and updating it.
+
+    The file is created if it does not exist.
+    """
+    with path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(manifest_path: Path) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """
+    Read manifest of recorded checksums by section and name.
+    """
+    text = manifest_path.read_text() if manifest_path.exists() else ""
+    return json.loads(text) if text.strip() else dict()
+
+
+def recorded_checksums(
+    manifest_path: Path, local_manifest_path: Path, section: str, name: str
+) -> Tuple[Optional[Dict[str, str]], Path]:
+    """
+    Get checksums of name recorded in section of either manifest.
+
+    The committed manifest takes precedence over the local one. Returns the
+    manifest the checksums were found in or the local one if none were.
+    """
+    for path in (manifest_path, local_manifest_path):
+        recorded = read_manifest(path).get(section, dict()).get(name)
+        if recorded is not None:
+            return recorded, path
+    return None, local_manifest_path
+
+
+def record_checksums(
+    manifest_path: Path, section: str, name: str, checksums: Dict[str, str]
+):
+    """
+    Record checksums of name in section of the manifest.
+    """
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(manifest_path):
+        manifest = read_manifest(manifest_path)
+        manifest.setdefault(section, dict())[name] = checksums
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    print(f"Recorded checksums of {name} in {manifest_path}.")
+
+
+def check_checksums(
+    section: str,
+    name: str,
+    checksums: Dict[str, str],
+    manifest_path: Path,
+    local_manifest_path: Path = LOCAL_MANIFEST_PATH,
+    record: bool = False,
+    details: Optional[Dict[str, str]] = None,
+):
+    """
+    Compare checksums of name to the recorded ones or record them.
+
+    Checksums not in the committed manifest are recorded on first use in the
+    local manifest, or in the committed one with record, along with the
+    details (e.g. url) which are not compared. Raises ``ValueError`` on
+    mismatch.
+    """
+    recorded, recorded_path = recorded_checksums(
+        manifest_path=manifest_path,
+        local_manifest_path=local_manifest_path,
+        section=section,
+        name=name,
+    )
+    if recorded is not None:
+        mismatched = {
+            key: (value, recorded.get(key))
+            for key, value in checksums.items()
+            if recorded.get(key) != value
+        }
+        if mismatched:
+            raise ValueError(
+                f"Checksums of {name} do not match the ones recorded in "
+                f"{recorded_path} (got, recorded): {mismatched}."
+            )
+        if not record or recorded_path == manifest_path:
+            return
+    elif not record:
+        logging.warning(
+            f"No checksums of {name} in {manifest_path}. Trusting them on first "
+            "use. Commit them with --record."
+        )
+    record_checksums(
+        manifest_path=manifest_path if record else local_manifest_path,
+        section=section,
+        name=name,
+        checksums={**(details or dict()), **checksums},
+    )
+
+
+def verify(
+    path: Path,
+    url: str,
+    manifest_path: Path,
+    local_manifest_path: Path = LOCAL_MANIFEST_PATH,
+    record: bool = False,
+) -> str:
+    """
+    Verify sha256 of file against the one recorded in the manifests.
+
+    Raises ``ValueError`` on mismatch.
+    """
+    with timed(f"sha256 {path.name}"):
+        sha256 = file_digest(path)
+    check_checksums(
+        section=FILES_SECTION,
+        name=path.name,
+        checksums=dict(sha256=sha256),
+        manifest_path=manifest_path,
+        local_manifest_path=local_manifest_path,
+        record=record,
+        details=dict(url=url),
+    )
+    return sha256
+
+
+def _link_or_copy(source: Path, destination: Path):
+    """
+    Hard link source to destination or copy it if linking is not possible.
+    """
+    tmp_path = destination.with_name(f"{destination.name}.{os.getpid()}.tmp")
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        tmp_path.replace(destination)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _from_mirror(
+    output_path: Path,
+    url: str,
+    manifest_path: Optional[Path],
+    local_manifest_path: Path,
+    mirror_path: Path,
+    record: bool,
+) -> bool:
+    mirrored = mirror_path / output_path.name
+    if not mirrored.is_file():
+        return False
+    try:
+        if manifest_path is not None:
+            verify(
+                path=mirrored,
+                url=url,
+                manifest_path=manifest_path,
+                local_manifest_path=local_manifest_path,
+                record=record,
+            )
+    except ValueError:
+        logging.warning(f"Ignoring mirrored {mirrored}.", exc_info=True)
+        return False
+    _link_or_copy(mirrored, output_path)
+    print(f"Used {mirrored} from mirror.")
+    return True
+
+
+def _to_mirror(output_path: Path, mirror_path: Path):
+    try:
+        mirror_path.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(output_path, mirror_path / output_path.name)
+    except Exception:
+        logging.warning(f"Failed to add {output_path} to mirror.", exc_info=True)
+
+
+def download_file(
+    url: str,
+    output_path: Path,
+    manifest_path: Optional[Path] = MANIFEST_PATH,
+    mirror_path: Optional[Path] = None,
+    connections: int = CONNECTIONS,
+    segment_size: int = SEGMENT_SIZE,
+    timeout: float = TIMEOUT,
+    record: bool = False,
+    local_manifest_path: Path = LOCAL_MANIFEST_PATH,
+) -> Path:
+    """
+    Download url to output_path unless a verified copy already exists.
+
+    The existing output and the mirror are checked before downloading. If
+    manifest_path is None, the file is not verified at all.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.is_file():
+        if manifest_path is None:
+            print(f"Using existing unverified {output_path}.")
+            return output_path
+        try:
+            verify(
+                path=output_path,
+                url=url,
+                manifest_path=manifest_path,
+                local_manifest_path=local_manifest_path,
+                record=record,
+            )
+            print(f"Verified existing {output_path}.")
+            return output_path
+        except ValueError:
+            logging.warning(f"Downloading {output_path} again.", exc_info=True)
+    if mirror_path is not None and _from_mirror(
+        output_path=output_path,
+        url=url,
+        manifest_path=manifest_path,
+        local_manifest_path=local_manifest_path,
+        mirror_path=mirror_path,
+        record=record,
+    ):
+        return output_path
+
+    part_path = output_path.with_name(output_path.name + PART_SUFFIX)
+    with timed(f"download {output_path.name}"):
+        probed = probe(url, timeout=timeout)
+        if probed.size is None:
+            download_stream(url=probed.url, part_path=part_path, timeout=timeout)
+        else:
+            download_ranges(
+                url=probed.url,
+                part_path=part_path,
+                size=probed.size,
+                connections=connections,
+                segment_size=segment_size,
+                timeout=timeout,
+            )
+    part_path.rename(output_path)
+    if manifest_path is not None:
+        try:
+            verify(
+                path=output_path,
+                url=url,
+                manifest_path=manifest_path,
+                local_manifest_path=local_manifest_path,
+                record=record,
+            )
+        except ValueError:
+            output_path.unlink()
+            raise
+    print(f"Downloaded {url} to {output_path}.")
+    if mirror_path is not None:
+        _to_mirror(output_path=output_path, mirror_path=mirror_path)
+    return output_path
+
+
+def download(
+    url: str = typer.Option(...),
+    output_path: Path = typer.Option(..., dir_okay=False),
+    manifest_path: Path = typer.Option(MANIFEST_PATH, dir_okay=False),
+    local_manifest_path: Path = typer.Option(LOCAL_MANIFEST_PATH, dir_okay=False),
+    mirror_path: Optional[Path] = typer.Option(
+        None,
+        file_okay=False,
+        envvar=MIRROR_PATH_ENV,
+        help="Directory checked for the file before downloading.",
+    ),
+    connections: int = typer.Option(CONNECTIONS),
+    segment_size: int = typer.Option(SEGMENT_SIZE),
+    record: bool = typer.Option(
+        False, help="Record the sha256 of the file in the committed manifest."
+    ),
+    verify_sha256: bool = typer.Option(
+        True,
+        "--verify/--no-verify",
+        help="Verify against the manifest. Skip only if the file is not byte-stable.",
+    ),
+):
+    """
+    Download file with concurrent range requests and verify its sha256.
+    """
+    download_file(
+        url=url,
+        output_path=output_path,
+        manifest_path=manifest_path if verify_sha256 else None,
+        mirror_path=mirror_path,
+        connections=connections,
+        segment_size=segment_size,
+        record=record,
+        local_manifest_path=local_manifest_path,
+    )
@@ -0,0 +1,149 @@
+"""
+Content-addressed binary cache for geodata read from disk.
+
+Parsing of the GeoJSON trace and area data is the largest fixed cost of most
+commands. The first read of a file stores a GeoParquet copy (geometries as WKB)
+keyed by the sha256 digest of the file contents. Later reads of identical
+content load the columnar copy instead. The cache is bounded in size and the
+least recently used copies are evicted first.
+
+GeoParquet files (``.parquet``) are read directly without caching.
+
+Optionally, read GeoDataFrames are also kept in memory so that repeated reads
+within a long-running process, e.g., doit tasks run in-process, skip
+deserialization altogether.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import geopandas as gpd
+from beartype.typing import Optional
+
+from fractopo.general import read_geofile as read_geofile_uncached
+from utils import CACHE_PATH, file_digest
+
+try:
+    import pyarrow  # noqa: F401
+
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+GEODATA_CACHE_PATH = CACHE_PATH / "geodata"
+GEODATA_CACHE_MAX_BYTES = int(
+    os.environ.get("GEODATA_CACHE_MAX_BYTES", str(2 * 1024**3))
+)
+PARQUET_SUFFIX = ".parquet"
+
+# Number of GeoDataFrames kept in memory, disabled by default
+GEODATA_MEMORY_CACHE_SIZE = int(os.environ.get("GEODATA_MEMORY_CACHE_SIZE", "0"))
+_MEMORY_CACHE: "OrderedDict[str, gpd.GeoDataFrame]" = OrderedDict()
+
+
+def evict_least_recently_used(cache_dir: Path, max_bytes: int):
+    """
+    Remove least recently used cached files until cache fits in max_bytes.
+
+    Recency is tracked with file modification times which are refreshed on
+    every cache hit.
+    """
+    entries = []
+    for path in cache_dir.glob(f"*{PARQUET_SUFFIX}"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # Evicted concurrently
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total_size <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total_size -= size
+        logging.info(f"Evicted {path} from geodata cache.")
+
+
+def read_geofile(
+    path: Path,
+    cache_dir: Path = GEODATA_CACHE_PATH,
+    max_bytes: int = GEODATA_CACHE_MAX_BYTES,
+) -> gpd.GeoDataFrame:
+    """
+    Read geodata from path through the content-addressed cache.
+
+    Falls back to uncached reading if ``pyarrow`` is not installed. A copy is
+    returned from the in-memory cache so callers can modify it freely.
+    """
+    if GEODATA_MEMORY_CACHE_SIZE <= 0:
+        return _read_geofile(path=path, cache_dir=cache_dir, max_bytes=max_bytes)
+
+    digest = file_digest(path)
+    if digest in _MEMORY_CACHE:
+        _MEMORY_CACHE.move_to_end(digest)
+        return _MEMORY_CACHE[digest].copy()
+
+    gdf = _read_geofile(
+        path=path, cache_dir=cache_dir, max_bytes=max_bytes, digest=digest
+    )
+    _MEMORY_CACHE[digest] = gdf.copy()
+    while len(_MEMORY_CACHE) > GEODATA_MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.popitem(last=False)
+    return gdf
+
+
+@lru_cache(maxsize=None)
+def _warn_parquet_unavailable():
+    logging.warning("pyarrow is not installed. Geodata reads are not cached.")
+
+
+def _read_geofile(
+    path: Path, cache_dir: Path, max_bytes: int, digest: Optional[str] = None
+) -> gpd.GeoDataFrame:
+    """
+    Read geodata from path through the on-disk cache.
+    """
+    if not PARQUET_AVAILABLE:
+        _warn_parquet_unavailable()
+        return read_geofile_uncached(path)
+
+    if path.suffix == PARQUET_SUFFIX:
+        # Already columnar, e.g., synthetic networks, so there is nothing to cache
+        return gpd.read_parquet(path)
+
+    if digest is None:
+        digest = file_digest(path)
+    cached_path = cache_dir / f"{digest}{PARQUET_SUFFIX}"
+    if cached_path.exists():
+        try:
+            gdf = gpd.read_parquet(cached_path)
+            # Mark as recently used
+            os.utime(cached_path)
+            return gdf
+        except Exception:
+            logging.warning(
+                f"Failed to read cached copy of {path}. Reading original.",
+                exc_info=True,
+            )
+            cached_path.unlink(missing_ok=True)
+
+    gdf = read_geofile_uncached(path)
+
+    # Write to a process-specific temporary path and move it in place
+    # so that concurrent readers never see a partially written file
+    tmp_path = cached_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        gdf.to_parquet(tmp_path)
+        tmp_path.replace(cached_path)
+        evict_least_recently_used(cache_dir=cache_dir, max_bytes=max_bytes)
+    except Exception:
+        logging.warning(f"Failed to cache geodata of {path}.", exc_info=True)
+        tmp_path.unlink(missing_ok=True)
+
+    return gdf
@@ -0,0 +1,470 @@
+"""
+Vectorized power-law fitting of length data.
+
+``powerlaw.Fit`` determines the power-law cut-off (xmin) by refitting the
+power-law and recomputing the Kolmogorov-Smirnov distance separately for
+every unique length. Here the lengths are sorted once and the maximum
+likelihood exponents of all candidate cut-offs are computed from cumulative
+log-sums in a single NumPy pass. Kolmogorov-Smirnov distances are first
+bounded from below for all candidates with growing samples of the empirical
+distribution and then computed exactly only for the candidates whose lower
+bound does not exclude them. The resulting cut-off is the same as chosen by
+``powerlaw.Fit``.
+
+``install`` replaces the KS statistics of ``powerlaw`` and the fits of
+``fractopo`` with the ones here.
+"""
+
+import sys
+
+import numpy as np
+import powerlaw
+from beartype.typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from scipy import special
+
+from fractopo.analysis import length_distributions
+from fractopo.analysis.length_distributions import SilentFit
+from utils import print
+
+# Initial number of empirical distribution points used to bound KS distances
+KS_SAMPLE_SIZE = 32
+
+# Number of candidates evaluated exactly after each bounding round
+KS_PROMISING_COUNT = 16
+
+# Maximum number of elements in intermediate candidate-by-bin arrays
+KS_BLOCK_ELEMENTS = 2**22
+
+# KS of powerlaw which is replaced with _KS by install
+UPSTREAM_KS = powerlaw.Distribution.KS
+
+
+class XminScan(NamedTuple):
+
+    """
+    Result of a power-law cut-off scan.
+    """
+
+    xmin: float
+    alpha: float
+    D: float
+    n_tail: int
+    xmin_index: int
+
+
+NAN_SCAN = XminScan(xmin=np.nan, alpha=np.nan, D=np.nan, n_tail=0, xmin_index=-1)
+
+
+def preprocess_lengths(length_array: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sort lengths and compute their cumulative log-sums.
+
+    Non-positive values are dropped as in ``powerlaw.Fit``. The returned
+    cumulative sum has a leading zero so that the log-sum of
+    ``sorted_lengths[start:stop]`` is ``log_cumsum[stop] - log_cumsum[start]``.
+    """
+    lengths = np.asarray(length_array, dtype=float)
+    if np.any(lengths == 0):
+        lengths = lengths[lengths > 0]
+    sorted_lengths = np.sort(lengths)
+    log_cumsum = np.concatenate([[0.0], np.cumsum(np.log(sorted_lengths))])
+    return sorted_lengths, log_cumsum
+
+
+def _sample_bins(unique_count: int, sample_size: int) -> np.ndarray:
+    """
+    Sample bin indices evenly and densely towards the largest values.
+
+    The dense sampling at the end keeps the bounds useful also for
+    candidates with short tails.
+    """
+    evenly = np.linspace(0, unique_count - 1, num=sample_size // 2)
+    towards_end = unique_count - np.geomspace(1, unique_count, num=sample_size // 2)
+    return np.unique(np.concatenate([evenly, towards_end]).astype(int))
+
+
+def _ks_distances(
+    candidates: np.ndarray,
+    bins: np.ndarray,
+    log_uniques: np.ndarray,
+    alphas: np.ndarray,
+    starts: np.ndarray,
+    count: int,
+) -> np.ndarray:
+    """
+    Compute power-law KS distances of sorted candidates over sorted bins.
+
+    Bins below a candidate do not contribute. If ``bins`` is a subset of the
+    unique values the result is a lower bound of the exact distance.
+    """
+    distances = np.empty(len(candidates))
+    block_size = max(1, KS_BLOCK_ELEMENTS // max(1, len(bins)))
+    for block_start in range(0, len(candidates), block_size):
+        block = candidates[block_start : block_start + block_size]
+        block_bins = bins[np.searchsorted(bins, block[0]) :][None, :]
+        # Theoretical power-law CDF: 1 - (x / xmin) ** (1 - alpha)
+        # Bins below xmin are clipped so that both CDFs are zero there
+        theoretical = np.subtract(log_uniques[block_bins], log_uniques[block][:, None])
+        np.maximum(theoretical, 0.0, out=theoretical)
+        theoretical *= (1.0 - alphas[block])[:, None]
+        np.expm1(theoretical, out=theoretical)
+        # Empirical CDF of the data above the candidate xmin
+        block_starts = starts[block][:, None]
+        empirical = np.subtract(starts[block_bins], block_starts, dtype=float)
+        np.maximum(empirical, 0.0, out=empirical)
+        empirical /= count - block_starts
+        # |F_theoretical - F_empirical| with F_theoretical = -theoretical
+        theoretical += empirical
+        np.abs(theoretical, out=theoretical)
+        distances[block_start : block_start + len(block)] = theoretical.max(axis=1)
+    return distances
+
+
+def scan_xmin(
+    sorted_lengths: np.ndarray,
+    log_cumsum: np.ndarray,
+    stop: Optional[int] = None,
+    initial_xmin_index: Optional[int] = None,
+    sample_size: int = KS_SAMPLE_SIZE,
+) -> XminScan:
+    """
+    Find the power-law cut-off that minimizes the KS distance.
+
+    Only ``sorted_lengths[:stop]`` is used so that prefixes of the same
+    sorted array can be scanned without copying. ``initial_xmin_index`` (an
+    index into the unique values) can be given to seed the search with a
+    known good candidate, e.g., from a scan of a similar dataset.
+    """
+    count = len(sorted_lengths) if stop is None else stop
+    lengths = sorted_lengths[:count]
+    if count < 2:
+        return NAN_SCAN
+
+    # Start positions of unique values
+    is_start = np.empty(count, dtype=bool)
+    is_start[0] = True
+    np.not_equal(lengths[1:], lengths[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    unique_count = len(starts)
+    if unique_count < 2:
+        return NAN_SCAN
+
+    log_uniques = np.log(lengths[starts])
+
+    # Maximum likelihood exponents of all candidates. The last unique value
+    # is not a candidate as at least two points are needed in the fit.
+    candidates = np.arange(unique_count - 1)
+    n_tails = count - starts[candidates]
+    log_sums = log_cumsum[count] - log_cumsum[starts[candidates]]
+    alphas = 1.0 + n_tails / (log_sums - n_tails * log_uniques[candidates])
+
+    all_bins = np.arange(unique_count)
+
+    def exact_distances(indices: np.ndarray) -> np.ndarray:
+        return _ks_distances(indices, all_bins, log_uniques, alphas, starts, count)
+
+    best_index, best_distance = -1, np.inf
+    if initial_xmin_index is not None and 0 <= initial_xmin_index < len(candidates):
+        best_index = initial_xmin_index
+        best_distance = exact_distances(np.array([best_index]))[0]
+
+    # Bound distances from below with increasingly large samples of bins
+    # and drop candidates that cannot beat the best exact distance found
+    survivors = candidates
+    while sample_size < unique_count and len(survivors) > KS_PROMISING_COUNT:
+        bins = _sample_bins(unique_count, sample_size)
+        lower_bounds = _ks_distances(
+            survivors, bins, log_uniques, alphas, starts, count
+        )
+        promising = np.sort(
+            survivors[np.argsort(lower_bounds, kind="stable")[:KS_PROMISING_COUNT]]
+        )
+        promising_distances = exact_distances(promising)
+        promising_best = np.argmin(promising_distances)
+        if (promising_distances[promising_best], promising[promising_best]) < (
+            best_distance,
+            best_index,
+        ):
+            best_index = promising[promising_best]
+            best_distance = promising_distances[promising_best]
+        survivors = survivors[lower_bounds <= best_distance]
+        sample_size *= 8
+
+    distances = exact_distances(survivors)
+    if len(survivors) > 0:
+        # Ties resolve to the smallest xmin as with numpy.argmin in powerlaw
+        survivor_best = np.argmin(distances)
+        if (distances[survivor_best], survivors[survivor_best]) < (
+            best_distance,
+            best_index if best_index >= 0 else len(candidates),
+        ):
+            best_index = survivors[survivor_best]
+            best_distance = distances[survivor_best]
+
+    # Recompute the exponent of the chosen cut-off directly from the tail
+    # as the difference of cumulative log-sums loses precision for short,
+    # narrow tails
+    xmin = lengths[starts[best_index]]
+    alpha = 1 + n_tails[best_index] / np.sum(
+        np.log(lengths[starts[best_index] :] / xmin)
+    )
+    return XminScan(
+        xmin=float(xmin),
+        alpha=float(alpha),
+        D=float(best_distance),
+        n_tail=int(n_tails[best_index]),
+        xmin_index=int(best_index),
+    )
+
+
+class KSStatistics(NamedTuple):
+
+    """
+    Kolmogorov-Smirnov statistics of a theoretical distribution.
+    """
+
+    D: float
+    D_plus: float
+    D_minus: float
+    Kappa: float
+    V: float
+
+
+def _theoretical_cdf(
+    distribution: powerlaw.Distribution, bins: np.ndarray, out: np.ndarray
+) -> np.ndarray:
+    """
+    Evaluate theoretical CDF of distribution at bins (>= xmin) into out.
+
+    Matches ``powerlaw.Distribution.cdf`` but without temporary copies of
+    the data for the continuous power-law, exponential and lognormal
+    distributions without xmax. Other distributions use their own ``cdf``.
+    """
+    if (
+        distribution.discrete
+        or distribution.xmax
+        or not isinstance(
+            distribution, (powerlaw.Power_Law, powerlaw.Exponential, powerlaw.Lognormal)
+        )
+    ):
+        out[:] = distribution.cdf(bins)
+        return out
+    if not distribution.in_range():
+        out.fill(10**sys.float_info.min_10_exp)
+        return out
+
+    xmin = distribution.xmin
+    if isinstance(distribution, powerlaw.Power_Law):
+        # 1 - (x / xmin) ** (1 - alpha)
+        np.divide(bins, xmin, out=out)
+        np.power(out, 1 - distribution.alpha, out=out)
+        np.subtract(1, out, out=out)
+    elif isinstance(distribution, powerlaw.Exponential):
+        # (F(x) - F(xmin)) / (1 - F(xmin)) with F(x) = 1 - exp(-lambda * x)
+        cdf_xmin = 1 - np.exp(-distribution.Lambda * xmin)
+        if cdf_xmin == 1:
+            out.fill(1.0)
+            return out
+        np.multiply(bins, -distribution.Lambda, out=out)
+        np.exp(out, out=out)
+        np.subtract(1, out, out=out)
+        out -= cdf_xmin
+        out /= 1 - cdf_xmin
+    else:
+        # Formulated with erfc to avoid underflow as in powerlaw
+        scale = np.sqrt(2) * distribution.sigma
+        erfc_xmin = special.erfc((np.log(xmin) - distribution.mu) / scale)
+        np.log(bins, out=out)
+        out -= distribution.mu
+        out /= scale
+        special.erfc(out, out=out)
+        np.subtract(erfc_xmin, out, out=out)
+        out /= erfc_xmin
+    return out
+
+
+def theoretical_cdfs(
+    distributions: Sequence[powerlaw.Distribution],
+    bins: np.ndarray,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Evaluate theoretical CDFs of distributions at bins in one call.
+
+    Each row of the returned (or given) array is the CDF of the respective
+    distribution. The distributions must share their xmin.
+    """
+    if out is None:
+        out = np.empty((len(distributions), len(bins)))
+    for distribution, row in zip(distributions, out):
+        _theoretical_cdf(distribution=distribution, bins=bins, out=row)
+    return out
+
+
+def ks_statistics(
+    distributions: Sequence[powerlaw.Distribution],
+    bins: np.ndarray,
+    empirical_cdf: np.ndarray,
+    offset: int,
+    workspace: Optional[np.ndarray] = None,
+) -> List[KSStatistics]:
+    """
+    Compute KS statistics of distributions against the empirical CDF.
+
+    ``bins`` and ``empirical_cdf`` are the sorted unique values and the
+    empirical CDF of the whole data (e.g., ``fitting_cdf_bins`` and
+    ``fitting_cdf`` of a ``powerlaw.Fit``) and ``offset`` is the index of the
+    first bin at or above xmin. The empirical CDF of the tail is renormalized
+    on the fly so no slices of the data are copied. A workspace with at least
+    ``len(distributions) + 1`` rows and ``len(bins)`` columns can be given to
+    reuse between calls.
+    """
+    tail_count = len(bins) - offset
+    rows = len(distributions)
+    if workspace is None:
+        workspace = np.empty((rows + 1, len(bins)))
+    differences = workspace[:rows, :tail_count]
+    tail_cdf = workspace[rows, :tail_count]
+
+    # Empirical CDF of the tail
+    dropped_probability = empirical_cdf[offset]
+    np.subtract(empirical_cdf[offset:], dropped_probability, out=tail_cdf)
+    tail_cdf /= 1 - dropped_probability
+
+    theoretical_cdfs(distributions, bins[offset:], out=differences)
+    differences -= tail_cdf
+
+    statistics = []
+    for row in differences:
+        D_plus = row.max()
+        D_minus = -1.0 * row.min()
+        statistics.append(
+            KSStatistics(
+                D=max(D_plus, D_minus),
+                D_plus=D_plus,
+                D_minus=D_minus,
+                Kappa=1 + row.mean(),
+                V=D_plus + D_minus,
+            )
+        )
+    return statistics
+
+
+def fit_ks_statistics(
+    fit: powerlaw.Fit,
+    distribution_names: Sequence[str] = ("power_law", "exponential", "lognormal"),
+) -> Dict[str, KSStatistics]:
+    """
+    Compute KS statistics of the named distributions of a fit in one pass.
+    """
+    bins = fit.fitting_cdf_bins
+    offset = int(np.searchsorted(bins, fit.xmin, side="left"))
+    distributions = [getattr(fit, name) for name in distribution_names]
+    statistics = ks_statistics(
+        distributions=distributions,
+        bins=bins,
+        empirical_cdf=fit.fitting_cdf,
+        offset=offset,
+    )
+    return dict(zip(distribution_names, statistics))
+
+
+def determine_fit(
+    length_array: np.ndarray, cut_off: Optional[float] = None
+) -> Optional[powerlaw.Fit]:
+    """
+    Determine powerlaw (along other) length distribution fits for given data.
+
+    Drop-in replacement of ``length_distributions.determine_fit``. If cut-off
+    is not given it is determined with ``scan_xmin`` and the fit is created
+    with it fixed, which skips the ``powerlaw`` cut-off search. As in the
+    replaced function, None is returned for empty data and a cut-off at or
+    above the maximum length raises ``ValueError``.
+    """
+    if len(length_array) == 0:
+        return None
+    length_array_max = length_array.max()
+    if cut_off is not None and cut_off >= length_array_max:
+        raise ValueError(
+            f"Expected lower cut_off ({cut_off}) "
+            f"than max of length_array ({length_array_max})."
+        )
+    if cut_off is None:
+        scan = scan_xmin(*preprocess_lengths(length_array))
+        if not np.isnan(scan.xmin):
+            cut_off = scan.xmin
+    return (
+        SilentFit(length_array, xmin=cut_off, verbose=False)
+        if cut_off is not None
+        else SilentFit(length_array, verbose=False)
+    )
+
+
+def _KS(self, data=None):
+    """
+    Override powerlaw.Distribution.KS
+
+    Uses the empirical CDF of the parent fit through an index offset instead
+    of copying the data within range.
+    """
+    parent_fit = getattr(self, "parent_Fit", None)
+    if data is None and parent_fit is not None:
+        # Data of a fit is sorted
+        data = parent_fit.data
+        start = np.searchsorted(data, self.xmin, side="left")
+        stop = (
+            np.searchsorted(data, self.xmax, side="right") if self.xmax else len(data)
+        )
+        data_count = stop - start
+    else:
+        data_count = len(powerlaw.trim_to_range(data, xmin=self.xmin, xmax=self.xmax))
+    if data_count < 2:
+        print("Not enough data. Returning np.nan")
+        self.D = np.nan
+        self.D_plus = np.nan
+        self.D_minus = np.nan
+        self.Kappa = np.nan
+        self.V = np.nan
+        self.Asquare = np.nan
+        return self.D
+
+    if parent_fit is not None:
+        bins = parent_fit.fitting_cdf_bins
+        actual_cdf = parent_fit.fitting_cdf
+        offset = int(np.searchsorted(bins, self.xmin, side="left"))
+        # Reuse the same workspace for all distributions of the fit
+        workspace = getattr(parent_fit, "_ks_workspace", None)
+        if workspace is None or workspace.shape[1] < len(bins):
+            workspace = np.empty((2, len(bins)))
+            parent_fit._ks_workspace = workspace
+    else:
+        bins, actual_cdf = powerlaw.cdf(
+            powerlaw.trim_to_range(data, xmin=self.xmin, xmax=self.xmax)
+        )
+        offset = 0
+        workspace = None
+
+    (statistics,) = ks_statistics(
+        distributions=[self],
+        bins=bins,
+        empirical_cdf=actual_cdf,
+        offset=offset,
+        workspace=workspace,
+    )
+    self.D_plus = statistics.D_plus
+    self.D_minus = statistics.D_minus
+    self.Kappa = statistics.Kappa
+    self.V = statistics.V
+    self.D = statistics.D
+    return self.D
+
+
+def install():
+    """
+    Use _KS and determine_fit in ``powerlaw`` and ``fractopo`` fits.
+
+    Both are replaced for the whole process so this is called explicitly by
+    the commands that analyse networks instead of on import.
+    """
+    powerlaw.Distribution.KS = _KS
+    length_distributions.determine_fit = determine_fit
@@ -2,76 +2,72 @@
 Network characterization of all scales together.
 """
 
+import io
 import json
 import logging
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from textwrap import dedent
 
+import geopandas as gpd
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import powerlaw
 import typer
-from beartype.typing import Any, Dict, List, Literal, Optional, Tuple, Type, Union
+from beartype.typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+from joblib import Parallel, delayed, dump, load
 from matplotlib.axes import Axes
+from matplotlib.collections import PathCollection
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 
 # import utils
+from bootstrap import bootstrap_power_law, describe_bootstrap
 from fractopo import MultiNetwork
 from fractopo.analysis import length_distributions
 from fractopo.analysis.length_distributions import Dist
 from fractopo.analysis.network import Network
-from fractopo.general import MINIMUM_LINE_LENGTH, NAME, Param, ParamInfo, read_geofile
-from utils import print
-
-
-def _KS(self, data=None):
-    """
-    Override powerlaw.Distribution.KS
-    """
-    if data is None and hasattr(self, "parent_Fit"):
-        data = self.parent_Fit.data
-    data = powerlaw.trim_to_range(data, xmin=self.xmin, xmax=self.xmax)
-    if len(data) < 2:
-        print("Not enough data. Returning np.nan")
-        self.D = np.nan
-        self.D_plus = np.nan
-        self.D_minus = np.nan
-        self.Kappa = np.nan
-        self.V = np.nan
-        self.Asquare = np.nan
-        return self.D
-
-    if hasattr(self, "parent_Fit"):
-        bins = self.parent_Fit.fitting_cdf_bins
-        Actual_CDF = self.parent_Fit.fitting_cdf
-        ind = bins >= self.xmin
-        bins = bins[ind]
-        Actual_CDF = Actual_CDF[ind]
-        dropped_probability = Actual_CDF[0]
-        Actual_CDF -= dropped_probability
-        Actual_CDF /= 1 - dropped_probability
-    else:
-        bins, Actual_CDF = powerlaw.cdf(data)
-
-    Theoretical_CDF = self.cdf(bins)
-
-    CDF_diff = Theoretical_CDF - Actual_CDF
-
-    self.D_plus = CDF_diff.max()
-    self.D_minus = -1.0 * CDF_diff.min()
-    self.Kappa = 1 + np.mean(CDF_diff)
-
-    self.V = self.D_plus + self.D_minus
-    self.D = max(self.D_plus, self.D_minus)
-    # self.Asquare = np.sum(
-    #     ((CDF_diff**2) / (Theoretical_CDF * (1 - Theoretical_CDF) + 1e-12))[1:]
-    # )
-    return self.D
-
-
-powerlaw.Distribution.KS = _KS
+from fractopo.general import MINIMUM_LINE_LENGTH, NAME, Param, ParamInfo
+from geodata_cache import read_geofile
+from length_fits import determine_fit
+from length_fits import install as install_length_fits
+from output_writer import (
+    OUTPUT_PATHS,
+    prune_outputs,
+    write_csv_if_changed,
+    write_fig_if_changed,
+    write_if_changed,
+    write_text_if_changed,
+)
+from topology_cache import load_topology, save_topology, topology_key
+from utils import TIMINGS, print, timed
+
+SET_WISE_BOOTSTRAP_CSV = "set_wise_bootstrap_df.csv"
+
+# Serialized inputs and topology of a scale consumed by multi-scale analysis
+NETWORK_SUMMARY = "network_summary.joblib"
+
+# Topology-relevant Network parameters
+CIRCULAR_TARGET_AREA = True
+TRUNCATE_TRACES = True
+SNAP_THRESHOLD = 0.001
+
+# Reduction of plotted length distribution points, see compact_length_plot
+CCDF_POINTS_PER_DECADE = 50
+RASTERIZE_MIN_POINTS = 2000
+RASTERIZED_DPI = 300
 
 
 def save_fig(
@@ -83,13 +79,25 @@ def save_fig(
 ):
     """
     Save figure as svg image to results dir.
+
+    An existing image is left untouched if it is unchanged.
     """
     assert results_dir.exists() and results_dir.is_dir()
     assert len(name) > 0
-    fig.savefig(results_dir / f"{name}.{extension}", bbox_inches="tight", **kwargs)
+    path = results_dir / f"{name}.{extension}"
+    with timed(f"save_fig {path}"):
+        write_fig_if_changed(fig=fig, path=path, bbox_inches="tight", **kwargs)
     plt.close("all")
 
 
+def save_csv(df: pd.DataFrame, path: Path):
+    """
+    Save DataFrame as csv unless an existing csv is unchanged.
+    """
+    with timed(f"write {path}"):
+        write_csv_if_changed(df=df, path=path)
+
+
 def add_identifier(ax, identifier):
     """
     Add identifier to multi-scale length plots.
@@ -157,6 +165,86 @@ def _setup_length_plot_axlims(
         # Don't try setting if it errors
 
 
+def ccdf_decimation_indices(x: np.ndarray, points_per_decade: int) -> np.ndarray:
+    """
+    Get indices of points kept when decimating into log-spaced buckets.
+
+    Points are bucketed by their x value into ``points_per_decade`` buckets per
+    decade. The first and last point of each bucket are kept so that the
+    extent of each step of a CCDF is preserved while dense stretches of
+    points, e.g., the tens of thousands of shortest traces, collapse to a few
+    points. Non-positive values, which cannot be shown on a log axis, are
+    kept.
+
+    >>> x = np.linspace(1.0, 10.0, 1000)
+    >>> indices = ccdf_decimation_indices(x, points_per_decade=10)
+    >>> len(indices)
+    21
+    >>> int(indices[0]), int(indices[-1])
+    (0, 999)
+    """
+    if points_per_decade <= 0 or len(x) == 0:
+        return np.arange(len(x))
+    order = np.argsort(x, kind="stable")
+    sorted_x = x[order]
+    buckets = np.full(len(x), -np.inf)
+    positive = sorted_x > 0
+    buckets[positive] = np.floor(np.log10(sorted_x[positive]) * points_per_decade)
+    changes = buckets[1:] != buckets[:-1]
+    keep = np.concatenate([[True], changes]) | np.concatenate([changes, [True]])
+    keep |= ~positive
+    return np.sort(order[keep])
+
+
+def compact_length_plot(
+    fig: Figure,
+    points_per_decade: int = CCDF_POINTS_PER_DECADE,
+    rasterize_min_points: int = RASTERIZE_MIN_POINTS,
+) -> Figure:
+    """
+    Reduce plotted points of length distribution plots in place.
+
+    Scatters and lines on logarithmic x axes are decimated with
+    ``ccdf_decimation_indices`` (disabled with ``points_per_decade`` <= 0).
+    Scatters that still have at least ``rasterize_min_points`` points are
+    rasterized within otherwise vector (svg) output (disabled with
+    ``rasterize_min_points`` <= 0).
+    """
+    for ax in fig.axes:
+        if ax.get_xscale() != "log":
+            continue
+        for collection in ax.collections:
+            if not isinstance(collection, PathCollection):
+                continue
+            offsets = np.asarray(collection.get_offsets())
+            count = len(offsets)
+            if count == 0:
+                continue
+            indices = ccdf_decimation_indices(offsets[:, 0], points_per_decade)
+            if len(indices) < count:
+                collection.set_offsets(offsets[indices])
+                # Per point properties
+                for getter, setter in (
+                    (collection.get_sizes, collection.set_sizes),
+                    (collection.get_facecolor, collection.set_facecolor),
+                    (collection.get_edgecolor, collection.set_edgecolor),
+                ):
+                    values = getter()
+                    if len(values) == count:
+                        setter(values[indices])
+            if 0 < rasterize_min_points <= len(indices):
+                collection.set_rasterized(True)
+        for line in ax.get_lines():
+            assert isinstance(line, Line2D)
+            x_data, y_data = np.asarray(line.get_xdata()), np.asarray(line.get_ydata())
+            if x_data.ndim != 1 or len(x_data) != len(y_data):
+                continue
+            indices = ccdf_decimation_indices(x_data.astype(float), points_per_decade)
+            if len(indices) < len(x_data):
+                line.set_data(x_data[indices], y_data[indices])
+    return fig
+
+
 def plot_distribution_fits(
     length_array: np.ndarray,
     label: str,
@@ -176,7 +264,7 @@ def plot_distribution_fits(
     """
     if fit is None:
         # Determine powerlaw, exponential, lognormal fits
-        fit = length_distributions.determine_fit(length_array, cut_off)
+        fit = determine_fit(length_array, cut_off)
 
     if fig is None:
         if ax is None:
@@ -289,27 +377,69 @@ def plot_distribution_fits(
     return fit, fig, ax
 
 
+def _set_wise_bootstrap(network: Network, resamples: int) -> pd.DataFrame:
+    """
+    Bootstrap power-law fits of all traces and branches and trace sets.
+    """
+    length_arrays = {
+        f"{network.name} Traces All": network.trace_length_array,
+        f"{network.name} Branches All": network.branch_length_array,
+        **{
+            f"{network.name} Traces {azimuth_set_name}": set_lengths
+            for (
+                azimuth_set_name,
+                set_lengths,
+            ) in network.trace_data.azimuth_set_length_arrays.items()
+        },
+    }
+    descs = []
+    for name, lengths in length_arrays.items():
+        print(f"Bootstrapping {name} power-law fit with {resamples} resamples.")
+        desc = describe_bootstrap(
+            bootstrap_power_law(length_array=lengths, resamples=resamples)
+        )
+        descs.append({"Name": name, "n": len(lengths), **desc})
+    bootstrap_df = pd.DataFrame(descs)
+    bootstrap_df.set_index("Name", inplace=True, drop=True)
+    return bootstrap_df
+
+
 def _scale_network_analysis(
     network: Network,
     scale_output_dir: Path,
+    bootstrap_resamples: int = 0,
+    ccdf_points_per_decade: int = CCDF_POINTS_PER_DECADE,
+    rasterize_min_points: int = RASTERIZE_MIN_POINTS,
 ):
     """
     Conduct network analysis of a scale.
+
+    With ``bootstrap_resamples`` > 0 the uncertainty of the set-wise
+    power-law fits is bootstrapped and saved alongside the set-wise fits.
+    Points of the length distribution plots are reduced with
+    ``compact_length_plot``.
     """
+
+    def compact(fig: Figure) -> Figure:
+        return compact_length_plot(
+            fig,
+            points_per_decade=ccdf_points_per_decade,
+            rasterize_min_points=rasterize_min_points,
+        )
+
     numerical_desc = network.numerical_network_description()
     numerical_desc_df = pd.DataFrame([numerical_desc])
 
-    # Clean old
-    if scale_output_dir.exists():
-        for path in scale_output_dir.iterdir():
-            path.unlink()
+    # Outputs of earlier runs are overwritten only if changed and stale ones
+    # are removed afterwards
+    first_output = len(OUTPUT_PATHS)
 
     # scale_output_dir: Path = data.NETWORK_OUTPUTS_PATH / scale.value
     scale_output_dir.mkdir(exist_ok=True, parents=True)
 
     csv_output_path = scale_output_dir / "numerical_desc.csv"
 
-    numerical_desc_df.to_csv(csv_output_path)
+    save_csv(numerical_desc_df, csv_output_path)
 
     print(f"Saved numerical characteristics to: {csv_output_path}")
     print("Creating network plots.")
@@ -332,8 +462,8 @@ def _scale_network_analysis(
     # Save lengths to csvs in scale_output_dir
     trace_lengths_df = pd.DataFrame({"lengths": network.trace_length_array})
     branch_lengths_df = pd.DataFrame({"lengths": network.branch_length_array})
-    trace_lengths_df.to_csv(scale_output_dir / "trace_lengths.csv")
-    branch_lengths_df.to_csv(scale_output_dir / "branch_lengths.csv")
+    save_csv(trace_lengths_df, scale_output_dir / "trace_lengths.csv")
+    save_csv(branch_lengths_df, scale_output_dir / "branch_lengths.csv")
 
     with mpl.rc_context(
         rc={
@@ -348,10 +478,11 @@ def _scale_network_analysis(
             fit.data.max() * 5,
         )
         save_fig(
-            fig=fig,
+            fig=compact(fig),
             results_dir=scale_output_dir,
             name="trace_length_plot",
             extension="svg",
+            dpi=RASTERIZED_DPI,
         )
 
         fit, fig, ax = network.plot_branch_lengths()
@@ -361,10 +492,11 @@ def _scale_network_analysis(
             fit.data.max() * 5,
         )
         save_fig(
-            fig=fig,
+            fig=compact(fig),
             results_dir=scale_output_dir,
             name="branch_length_plot",
             extension="svg",
+            dpi=RASTERIZED_DPI,
         )
 
     # Set-wise length distributions as numeric table
@@ -396,17 +528,18 @@ def _scale_network_analysis(
     all_desc_branches_mod[count_key] = len(network.branch_length_array)
 
     descs = [all_desc_traces, all_desc_branches_mod]
-    for (
-        azimuth_set_name,
-        set_lengths,
-    ) in network.trace_data.azimuth_set_length_arrays.items():
-        fit = length_distributions.determine_fit(length_array=set_lengths, cut_off=None)
-        desc: Dict[str, Any] = length_distributions.describe_powerlaw_fit(
-            fit=fit, length_array=set_lengths, label="trace"
-        )
-        desc[name_key] = f"{network.name} Traces {azimuth_set_name}"
-        desc[count_key] = len(set_lengths)
-        descs.append(desc)
+    with timed(f"fits {network.name} set-wise"):
+        for (
+            azimuth_set_name,
+            set_lengths,
+        ) in network.trace_data.azimuth_set_length_arrays.items():
+            fit = determine_fit(length_array=set_lengths, cut_off=None)
+            desc: Dict[str, Any] = length_distributions.describe_powerlaw_fit(
+                fit=fit, length_array=set_lengths, label="trace"
+            )
+            desc[name_key] = f"{network.name} Traces {azimuth_set_name}"
+            desc[count_key] = len(set_lengths)
+            descs.append(desc)
 
     set_wise_df = pd.DataFrame(descs)
     set_wise_df.set_index(name_key, inplace=True, drop=True)
@@ -437,16 +570,26 @@ def _scale_network_analysis(
     set_wise_df.rename(columns=column_renames_all, inplace=True)
 
     set_wise_csv_path = scale_output_dir / "set_wise_df.csv"
-    set_wise_df.to_csv(set_wise_csv_path)
+    save_csv(set_wise_df, set_wise_csv_path)
+
+    if bootstrap_resamples > 0:
+        with timed(f"fits {network.name} set-wise bootstrap"):
+            set_wise_bootstrap_df = _set_wise_bootstrap(
+                network=network, resamples=bootstrap_resamples
+            )
+        save_csv(set_wise_bootstrap_df, scale_output_dir / SET_WISE_BOOTSTRAP_CSV)
 
     # Also create set_wise plots for traces
     _, figs, _ = network.plot_trace_azimuth_set_lengths()
     for fig, azimuth_set in zip(figs, network.azimuth_set_names):
         clean_label = "".join(filter(str.isalpha, azimuth_set))
-        save_fig(fig=fig, results_dir=scale_output_dir, name=clean_label)
+        save_fig(fig=compact(fig), results_dir=scale_output_dir, name=clean_label)
 
     # Save branches and nodes
-    network.write_branches_and_nodes(output_dir_path=scale_output_dir)
+    with TemporaryDirectory() as tmp_dir:
+        network.write_branches_and_nodes(output_dir_path=Path(tmp_dir))
+        for path in Path(tmp_dir).iterdir():
+            write_if_changed(path=scale_output_dir / path.name, data=path.read_bytes())
 
     # Appendix table of lognormal and exponential fits to full length data
     column_renames_appendix_base = {
@@ -460,15 +603,16 @@ def _scale_network_analysis(
         "lognormal vs. exponential p": "LN vs. Exp p",
     }
 
-    all_desc_appendix_traces: Dict[str, Any] = network.trace_data.describe_fit(
-        cut_off=MINIMUM_LINE_LENGTH,
-    )
+    with timed(f"fits {network.name} appendix"):
+        all_desc_appendix_traces: Dict[str, Any] = network.trace_data.describe_fit(
+            cut_off=MINIMUM_LINE_LENGTH,
+        )
+        all_desc_appendix_branches: Dict[str, Any] = network.branch_data.describe_fit(
+            cut_off=MINIMUM_LINE_LENGTH,
+        )
     all_desc_appendix_traces[name_key] = f"{network.name} Traces"
     all_desc_appendix_traces[count_key] = len(network.trace_length_array)
 
-    all_desc_appendix_branches: Dict[str, Any] = network.branch_data.describe_fit(
-        cut_off=MINIMUM_LINE_LENGTH,
-    )
     all_desc_appendix_branches[name_key] = f"{network.name} Branches"
     all_desc_appendix_branches[count_key] = len(network.branch_length_array)
 
@@ -478,7 +622,7 @@ def _scale_network_analysis(
     appendix_df = appendix_df[appendix_columns]
     appendix_df.set_index(name_key, inplace=True, drop=True)
     appendix_df_path = scale_output_dir / "appendix_df.csv"
-    appendix_df.to_csv(appendix_df_path)
+    save_csv(appendix_df, appendix_df_path)
 
     # Appendix figure of lognormal and exponential length distribution fits
     # to full data
@@ -499,14 +643,38 @@ def _scale_network_analysis(
             ),
         )
         save_fig(
-            fig=fig,
+            fig=compact(fig),
             results_dir=scale_output_dir,
             name="branch_length_plot_full"
             if using_branches
             else "trace_length_plot_full",
             extension="svg",
+            dpi=RASTERIZED_DPI,
         )
 
+    for path in prune_outputs(
+        directory=scale_output_dir,
+        keep=[*OUTPUT_PATHS[first_output:], scale_output_dir / NETWORK_SUMMARY],
+    ):
+        print(f"Removed stale output: {path}")
+
+
+def _read_azimuth_sets(
+    azimuth_set_json_path: Path,
+) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Read azimuth set labels and ranges.
+    """
+    azimuth_set_data = json.loads(azimuth_set_json_path.read_text())
+    assert isinstance(azimuth_set_data, list)
+    set_labels: List[str] = []
+    set_ranges: List[Tuple[int, int]] = []
+    for item in azimuth_set_data:
+        assert isinstance(item, dict)
+        set_labels.append(item["name"])
+        set_ranges.append((item["start"], item["end"]))
+    return set_labels, set_ranges
+
 
 def _pretty_name(scale: str):
     split = scale.split("_")
@@ -516,6 +684,195 @@ def _pretty_name(scale: str):
     return f"{start}:{end_pretty}"
 
 
+class ScaleNetworkResult(NamedTuple):
+
+    """
+    Compact results of a scale network analysis.
+
+    Only the determined topology and stage timings are returned from worker
+    processes. The ``Network`` is rehydrated from the topology in the parent
+    without recomputing it.
+    """
+
+    branch_gdf: gpd.GeoDataFrame
+    node_gdf: gpd.GeoDataFrame
+    # Stage timings recorded in the worker process
+    timings: Tuple[Dict[str, Any], ...] = ()
+
+
+def _create_network(
+    trace_gdf: gpd.GeoDataFrame,
+    area_gdf: gpd.GeoDataFrame,
+    scale: str,
+    set_ranges: List[Tuple[int, int]],
+    set_labels: List[str],
+    result: Optional[ScaleNetworkResult] = None,
+) -> Network:
+    """
+    Create Network of a scale from its traces and area.
+
+    Topology is determined unless it is given in ``result``.
+    """
+    topology = (
+        dict(branch_gdf=result.branch_gdf, node_gdf=result.node_gdf)
+        if result is not None
+        else dict()
+    )
+    with timed(f"network {scale}"):
+        return Network(
+            trace_gdf=trace_gdf,
+            area_gdf=area_gdf,
+            name=_pretty_name(scale),
+            circular_target_area=CIRCULAR_TARGET_AREA,
+            truncate_traces=TRUNCATE_TRACES,
+            snap_threshold=SNAP_THRESHOLD,
+            determine_branches_nodes=True,
+            azimuth_set_ranges=tuple(set_ranges),
+            azimuth_set_names=tuple(set_labels),
+            **topology,
+        )
+
+
+def save_network_summary(
+    network: Network,
+    trace_gdf: gpd.GeoDataFrame,
+    area_gdf: gpd.GeoDataFrame,
+    scale: str,
+    set_ranges: List[Tuple[int, int]],
+    set_labels: List[str],
+    path: Path,
+):
+    """
+    Save inputs and determined topology of a scale Network.
+
+    The Network can be recreated with ``load_network_summary`` without
+    reading the inputs or determining the topology again.
+    """
+    buffer = io.BytesIO()
+    with timed(f"write {path}"):
+        dump(
+            dict(
+                scale=scale,
+                trace_gdf=trace_gdf,
+                area_gdf=area_gdf,
+                set_ranges=set_ranges,
+                set_labels=set_labels,
+                branch_gdf=network.branch_gdf,
+                node_gdf=network.node_gdf,
+            ),
+            buffer,
+        )
+        write_if_changed(path=path, data=buffer.getvalue())
+
+
+def load_network_summary(path: Path) -> Network:
+    """
+    Recreate Network of a scale from its summary.
+    """
+    with timed(f"read {path}"):
+        summary = load(path)
+    return _create_network(
+        trace_gdf=summary["trace_gdf"],
+        area_gdf=summary["area_gdf"],
+        scale=summary["scale"],
+        set_ranges=summary["set_ranges"],
+        set_labels=summary["set_labels"],
+        result=ScaleNetworkResult(
+            branch_gdf=summary["branch_gdf"], node_gdf=summary["node_gdf"]
+        ),
+    )
+
+
+def _scale_network(
+    traces_path: Path,
+    area_path: Path,
+    scale: str,
+    set_ranges: List[Tuple[int, int]],
+    set_labels: List[str],
+    result: Optional[ScaleNetworkResult] = None,
+    use_topology_cache: bool = True,
+) -> Network:
+    """
+    Create Network of a scale.
+
+    Topology is determined unless it is given in ``result`` or found in the
+    topology cache.
+    """
+    with timed(f"read {scale}"):
+        trace_gdf, area_gdf = read_geofile(traces_path), read_geofile(area_path)
+
+    key = None
+    if result is None and use_topology_cache:
+        key = topology_key(
+            traces_path=traces_path,
+            area_path=area_path,
+            circular_target_area=CIRCULAR_TARGET_AREA,
+            truncate_traces=TRUNCATE_TRACES,
+            snap_threshold=SNAP_THRESHOLD,
+        )
+        cached = load_topology(key=key)
+        if cached is not None:
+            print(f"Using cached topology for {scale}.")
+            result = ScaleNetworkResult(branch_gdf=cached[0], node_gdf=cached[1])
+
+    network = _create_network(
+        trace_gdf=trace_gdf,
+        area_gdf=area_gdf,
+        scale=scale,
+        set_ranges=set_ranges,
+        set_labels=set_labels,
+        result=result,
+    )
+
+    if key is not None and result is None:
+        # Topology was determined, store it for later runs
+        save_topology(key=key, branch_gdf=network.branch_gdf, node_gdf=network.node_gdf)
+    return network
+
+
+def _analyse_scale(
+    traces_path: Path,
+    area_path: Path,
+    scale: str,
+    scale_output_dir: Path,
+    set_ranges: List[Tuple[int, int]],
+    set_labels: List[str],
+    use_topology_cache: bool = True,
+    bootstrap_resamples: int = 0,
+    ccdf_points_per_decade: int = CCDF_POINTS_PER_DECADE,
+    rasterize_min_points: int = RASTERIZE_MIN_POINTS,
+) -> ScaleNetworkResult:
+    """
+    Create Network of a scale and conduct its network analysis.
+
+    Used as the unit of work of parallel scale analysis.
+    """
+    # Worker processes do not run the command so install fits here
+    install_length_fits()
+    # Worker processes are reused so only the records of this scale are returned
+    first_timing = len(TIMINGS)
+    network = _scale_network(
+        traces_path=traces_path,
+        area_path=area_path,
+        scale=scale,
+        set_ranges=set_ranges,
+        set_labels=set_labels,
+        use_topology_cache=use_topology_cache,
+    )
+    _scale_network_analysis(
+        network=network,
+        scale_output_dir=scale_output_dir,
+        bootstrap_resamples=bootstrap_resamples,
+        ccdf_points_per_decade=ccdf_points_per_decade,
+        rasterize_min_points=rasterize_min_points,
+    )
+    return ScaleNetworkResult(
+        branch_gdf=network.branch_gdf,
+        node_gdf=network.node_gdf,
+        timings=tuple(TIMINGS[first_timing:]),
+    )
+
+
 def multi_network_analysis(
     multi_scale_outputs_path: Path = typer.Argument(...),
     traces_paths: List[Path] = typer.Option(..., file_okay=True, exists=True),
@@ -524,46 +881,199 @@ def multi_network_analysis(
     scale_names: List[str] = typer.Option(...),
     azimuth_set_json_path: Path = typer.Option(..., exists=True),
     latex_output_path: Path = typer.Option(...),
+    workers: int = typer.Option(1),
+    use_topology_cache: bool = typer.Option(True),
+    bootstrap_resamples: int = typer.Option(0),
+    ccdf_points_per_decade: int = typer.Option(CCDF_POINTS_PER_DECADE),
+    rasterize_min_points: int = typer.Option(RASTERIZE_MIN_POINTS),
 ):
     """
     Conduct multi-scale network analysis.
+
+    With ``workers`` > 1 the scales are analysed in parallel processes.
+    Determined branches and nodes are reused from the topology cache unless
+    disabled with ``--no-use-topology-cache``. With ``bootstrap_resamples`` >
+    0 confidence intervals and goodness-of-fit p-values of the set-wise
+    power-law fits are bootstrapped. Length distribution plots are decimated
+    to ``ccdf_points_per_decade`` points per decade and scatters with at
+    least ``rasterize_min_points`` points are rasterized (0 disables either).
     """
+    install_length_fits()
     # Make plot directory
     multi_scale_outputs_path.mkdir(exist_ok=True, parents=True)
 
     # Set multi-scale network characteristics
-    azimuth_set_data = json.loads(azimuth_set_json_path.read_text())
-    assert isinstance(azimuth_set_data, list)
-    set_labels: List[str] = []
-    set_ranges: List[Tuple[int, int]] = []
-    for item in azimuth_set_data:
-        assert isinstance(item, dict)
-        set_labels.append(item["name"])
-        set_ranges.append((item["start"], item["end"]))
+    set_labels, set_ranges = _read_azimuth_sets(azimuth_set_json_path)
+
+    scale_inputs = list(
+        zip(traces_paths, area_paths, scale_names, network_output_paths)
+    )
 
     # Collect Networks
     networks = []
-    for (
-        tp,
-        ap,
-        scale,
-        scale_output_dir,
-    ) in zip(traces_paths, area_paths, scale_names, network_output_paths):
-        trace_gdf, area_gdf = read_geofile(tp), read_geofile(ap)
-        network = Network(
-            trace_gdf=trace_gdf,
-            area_gdf=area_gdf,
-            name=_pretty_name(scale),
-            circular_target_area=True,
-            truncate_traces=True,
-            determine_branches_nodes=True,
-            azimuth_set_ranges=tuple(set_ranges),
-            azimuth_set_names=tuple(set_labels),
+    if workers > 1:
+        # Determine topology and analyse each scale in its own process
+        results = Parallel(n_jobs=workers)(
+            delayed(_analyse_scale)(
+                traces_path=tp,
+                area_path=ap,
+                scale=scale,
+                scale_output_dir=scale_output_dir,
+                set_ranges=set_ranges,
+                set_labels=set_labels,
+                use_topology_cache=use_topology_cache,
+                bootstrap_resamples=bootstrap_resamples,
+                ccdf_points_per_decade=ccdf_points_per_decade,
+                rasterize_min_points=rasterize_min_points,
+            )
+            for tp, ap, scale, scale_output_dir in scale_inputs
         )
+        assert isinstance(results, list)
+        for (tp, ap, scale, _), result in zip(scale_inputs, results):
+            TIMINGS.extend(result.timings)
+            networks.append(
+                _scale_network(
+                    traces_path=tp,
+                    area_path=ap,
+                    scale=scale,
+                    set_ranges=set_ranges,
+                    set_labels=set_labels,
+                    result=result,
+                )
+            )
+    else:
+        for tp, ap, scale, scale_output_dir in scale_inputs:
+            network = _scale_network(
+                traces_path=tp,
+                area_path=ap,
+                scale=scale,
+                set_ranges=set_ranges,
+                set_labels=set_labels,
+                use_topology_cache=use_topology_cache,
+            )
+
+            _scale_network_analysis(
+                network=network,
+                scale_output_dir=scale_output_dir,
+                bootstrap_resamples=bootstrap_resamples,
+                ccdf_points_per_decade=ccdf_points_per_decade,
+                rasterize_min_points=rasterize_min_points,
+            )
+
+            networks.append(network)
+
+    _multi_scale_network_analysis(
+        networks=networks,
+        multi_scale_outputs_path=multi_scale_outputs_path,
+        latex_output_path=latex_output_path,
+        bootstrap_paths=(
+            [path / SET_WISE_BOOTSTRAP_CSV for path in network_output_paths]
+            if bootstrap_resamples > 0
+            else []
+        ),
+    )
+
+
+def scale_network_analysis(
+    traces_path: Path = typer.Option(..., exists=True, dir_okay=False),
+    area_path: Path = typer.Option(..., exists=True, dir_okay=False),
+    scale: str = typer.Option(...),
+    scale_output_dir: Path = typer.Option(..., file_okay=False),
+    azimuth_set_json_path: Path = typer.Option(..., exists=True),
+    use_topology_cache: bool = typer.Option(True),
+    bootstrap_resamples: int = typer.Option(0),
+    ccdf_points_per_decade: int = typer.Option(CCDF_POINTS_PER_DECADE),
+    rasterize_min_points: int = typer.Option(RASTERIZE_MIN_POINTS),
+):
+    """
+    Conduct network analysis of a single scale.
+
+    The inputs and determined topology of the scale are saved to
+    ``scale_output_dir`` (``network_summary.joblib``) for
+    ``multi-scale-network-analysis``. Length distribution plots are
+    decimated and rasterized as in ``multi-network-analysis``.
+    """
+    install_length_fits()
+    scale_output_dir.mkdir(exist_ok=True, parents=True)
+    set_labels, set_ranges = _read_azimuth_sets(azimuth_set_json_path)
+    network = _scale_network(
+        traces_path=traces_path,
+        area_path=area_path,
+        scale=scale,
+        set_ranges=set_ranges,
+        set_labels=set_labels,
+        use_topology_cache=use_topology_cache,
+    )
+    _scale_network_analysis(
+        network=network,
+        scale_output_dir=scale_output_dir,
+        bootstrap_resamples=bootstrap_resamples,
+        ccdf_points_per_decade=ccdf_points_per_decade,
+        rasterize_min_points=rasterize_min_points,
+    )
+    # Network traces are truncated so the inputs are stored instead
+    save_network_summary(
+        network=network,
+        trace_gdf=read_geofile(traces_path),
+        area_gdf=read_geofile(area_path),
+        scale=scale,
+        set_ranges=set_ranges,
+        set_labels=set_labels,
+        path=scale_output_dir / NETWORK_SUMMARY,
+    )
 
-        _scale_network_analysis(network=network, scale_output_dir=scale_output_dir)
 
-        networks.append(network)
+def multi_scale_network_analysis(
+    multi_scale_outputs_path: Path = typer.Argument(...),
+    summary_paths: List[Path] = typer.Option(..., exists=True, dir_okay=False),
+    latex_output_path: Path = typer.Option(...),
+):
+    """
+    Conduct multi-scale network analysis of analysed scales.
+
+    Scales are loaded from the network summaries saved by
+    ``scale-network-analysis``. Set-wise bootstraps found next to the summaries
+    are collected. Files left in ``multi_scale_outputs_path`` by earlier
+    runs that are not written anymore are removed.
+    """
+    install_length_fits()
+    multi_scale_outputs_path.mkdir(exist_ok=True, parents=True)
+    first_output = len(OUTPUT_PATHS)
+    networks = [load_network_summary(path) for path in summary_paths]
+    bootstrap_paths = [
+        path.parent / SET_WISE_BOOTSTRAP_CSV
+        for path in summary_paths
+        if (path.parent / SET_WISE_BOOTSTRAP_CSV).exists()
+    ]
+    _multi_scale_network_analysis(
+        networks=networks,
+        multi_scale_outputs_path=multi_scale_outputs_path,
+        latex_output_path=latex_output_path,
+        bootstrap_paths=bootstrap_paths,
+    )
+    for path in prune_outputs(
+        directory=multi_scale_outputs_path, keep=OUTPUT_PATHS[first_output:]
+    ):
+        print(f"Removed stale output: {path}")
+
+
+def _multi_scale_network_analysis(
+    networks: List[Network],
+    multi_scale_outputs_path: Path,
+    latex_output_path: Path,
+    bootstrap_paths: List[Path],
+):
+    """
+    Conduct multi-scale analysis of scale Networks.
+    """
+    if len(bootstrap_paths) > 0:
+        # Collect set-wise bootstraps of all scales
+        bootstrap_df = pd.concat(
+            [pd.read_csv(path, index_col="Name") for path in bootstrap_paths]
+        )
+        bootstrap_path = multi_scale_outputs_path / "bootstrap_df.csv"
+        save_csv(bootstrap_df, bootstrap_path)
+        print(f"Saved bootstrapped power-law fits to: {bootstrap_path}")
 
     # Create DataFrame of network descriptions
     network_desc_df = pd.DataFrame(
@@ -574,7 +1084,7 @@ def multi_network_analysis(
 
     # Write to disk
     network_desc_path = multi_scale_outputs_path / "numerical_descriptions.csv"
-    network_desc_df.to_csv(network_desc_path)
+    save_csv(network_desc_df, network_desc_path)
 
     # Create MultiNetwork from loaded Networks
     multi_network = MultiNetwork(tuple(networks))
@@ -601,9 +1111,10 @@ def multi_network_analysis(
     )
 
     # Plot trace optimized multi-scale length distribution
-    _, optimized_mld = multi_network.multi_length_distributions(
-        using_branches=False
-    ).optimize_cut_offs()
+    with timed("fits multi-scale optimized cut-offs"):
+        _, optimized_mld = multi_network.multi_length_distributions(
+            using_branches=False
+        ).optimize_cut_offs()
     _, fig, _ = optimized_mld.plot_multi_length_distributions(
         automatic_cut_offs=False, plot_truncated_data=True
     )
@@ -741,8 +1252,9 @@ def multi_network_analysis(
     )
 
     # Write as csv and latex
-    basic_network_descriptions_df.to_csv(
-        multi_scale_outputs_path / "basic_descriptions.csv"
+    save_csv(
+        basic_network_descriptions_df,
+        multi_scale_outputs_path / "basic_descriptions.csv",
     )
     basic_network_descriptions_df_latex = basic_network_descriptions_df.to_latex(
         None,
@@ -769,7 +1281,10 @@ def multi_network_analysis(
     assert isinstance(basic_network_descriptions_df_latex, str)
     # latex_output_path.write_text(utils.wide_table(basic_network_descriptions_df_latex))
     latex_output_path.parent.mkdir(parents=True, exist_ok=True)
-    latex_output_path.write_text(basic_network_descriptions_df_latex)
+    with timed(f"write {latex_output_path}"):
+        write_text_if_changed(
+            path=latex_output_path, text=basic_network_descriptions_df_latex
+        )
 
     # Plot trace multi-scale length distribution
     using_branches = False
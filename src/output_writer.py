@@ -0,0 +1,136 @@
+"""
+Write outputs only when their content changes.
+
+Outputs are rendered to memory and compared with the existing file by a
+digest of their normalised content. Unchanged files are left untouched so
+that their timestamps and bytes stay the same and the doit tasks depending on
+them are not rerun.
+"""
+
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+from beartype.typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    # Not imported at runtime as table commands use this module without figures
+    from matplotlib.figure import Figure
+
+# Paths written, or found unchanged, with write_if_changed
+OUTPUT_PATHS: List[Path] = []
+
+# Metadata date of matplotlib svg output
+SVG_DATE_PATTERN = re.compile(rb"<dc:date>[^<]*</dc:date>")
+
+# Ids hashed from a random salt by matplotlib: markers (m), clip paths (p),
+# hatches (h), images (image) and paths of collections (C<id>_<index>_)
+SVG_ID_PATTERN = re.compile(
+    rb"(?<=[\"#])(image|[hmp]|C[0-9a-f]+_[0-9a-f]+_)[0-9a-f]{10}(?=[\")])"
+)
+
+# Fixed salt so that matplotlib svg ids are deterministic
+SVG_HASH_SALT = "aland"
+
+
+def normalize_svg(data: bytes) -> bytes:
+    """
+    Remove nondeterministic dates and ids from matplotlib svg output.
+
+    Hashed ids are replaced by their order of appearance.
+
+    >>> normalize_svg(b'<image id="image0123456789" href="#image0123456789"/>')
+    b'<image id="image0" href="#image0"/>'
+    """
+    ids: Dict[bytes, bytes] = dict()
+
+    def replace_id(match: re.Match) -> bytes:
+        return ids.setdefault(match.group(0), match.group(1) + str(len(ids)).encode())
+
+    return SVG_ID_PATTERN.sub(replace_id, SVG_DATE_PATTERN.sub(b"", data))
+
+
+def _digest(data: bytes, normalize: Optional[Callable[[bytes], bytes]]) -> str:
+    return hashlib.sha256(data if normalize is None else normalize(data)).hexdigest()
+
+
+def write_if_changed(
+    path: Path,
+    data: bytes,
+    normalize: Optional[Callable[[bytes], bytes]] = None,
+) -> bool:
+    """
+    Write data to path unless the file already has the same content.
+
+    Contents are compared after ``normalize``. Returns whether the file was
+    written.
+    """
+    OUTPUT_PATHS.append(path)
+    if path.is_file() and _digest(path.read_bytes(), normalize) == _digest(
+        data, normalize
+    ):
+        return False
+    # Write atomically so an interrupted write does not leave a partial file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return True
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """
+    Write text to path unless the file already has the same content.
+    """
+    return write_if_changed(path=path, data=text.encode("utf-8"))
+
+
+def write_csv_if_changed(df: pd.DataFrame, path: Path) -> bool:
+    """
+    Write DataFrame as csv unless the file already has the same content.
+    """
+    return write_text_if_changed(path=path, text=df.to_csv())
+
+
+def write_fig_if_changed(fig: "Figure", path: Path, **kwargs) -> bool:
+    """
+    Save figure to path unless the file already has the same content.
+
+    The format is determined by the suffix of the path. Svgs are saved
+    without a date and with deterministic ids.
+    """
+    import matplotlib as mpl
+
+    extension = path.suffix.lstrip(".")
+    buffer = io.BytesIO()
+    if extension == "svg":
+        kwargs.setdefault("metadata", {"Date": None})
+        with mpl.rc_context({"svg.hashsalt": SVG_HASH_SALT}):
+            fig.savefig(buffer, format=extension, **kwargs)
+    else:
+        fig.savefig(buffer, format=extension, **kwargs)
+    return write_if_changed(
+        path=path,
+        data=buffer.getvalue(),
+        normalize=normalize_svg if extension == "svg" else None,
+    )
+
+
+def prune_outputs(directory: Path, keep: Iterable[Path]) -> List[Path]:
+    """
+    Remove files in directory, recursively, that are not in keep.
+
+    Used instead of wiping output directories before a rerun so that
+    unchanged outputs keep their timestamps. Returns the removed paths.
+    """
+    keep = {path.resolve() for path in keep}
+    removed = [
+        path
+        for path in sorted(directory.rglob("*"))
+        if path.is_file() and path.resolve() not in keep
+    ]
+    for path in removed:
+        path.unlink()
+    return removed
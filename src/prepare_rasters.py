@@ -0,0 +1,213 @@
+"""
+Prepare rasters as cloud-optimized GeoTIFFs.
+
+Rasters are converted to tiled, compressed GeoTIFFs with internal overviews
+so that reads of a part of a raster at a lower resolution only decode the
+tiles of the matching overview level.
+
+Rasters can be read straight from a zip archive through GDAL ``/vsizip/``
+so that only the used members of the archive are ever written to disk, and
+then only as the prepared rasters.
+"""
+
+import hashlib
+import logging
+import os
+import zipfile
+from pathlib import Path
+
+import rasterio
+import rasterio.shutil
+import typer
+from beartype.typing import Dict, List, Optional
+from rasterio.enums import Resampling
+
+from download import LOCAL_MANIFEST_PATH, MANIFEST_PATH, check_checksums
+from utils import print, timed
+
+COG_DRIVER = "COG"
+GTIFF_DRIVER = "GTiff"
+
+# Overview decimation factors
+OVERVIEW_LEVELS = (2, 4, 8, 16, 32, 64)
+
+# Manifest section of archive members
+MEMBERS_SECTION = "members"
+
+
+def _cog_driver_available() -> bool:
+    with rasterio.Env() as env:
+        return COG_DRIVER in env.drivers()
+
+
+def cog_overview_count(overview_levels: List[int]) -> Optional[int]:
+    """
+    Get the ``OVERVIEW_COUNT`` of the COG driver matching overview_levels.
+
+    The COG driver halves the resolution at each overview level so only
+    levels 2, 4, 8, ... can be expressed as a count. Returns None otherwise.
+
+    >>> cog_overview_count([2, 4, 8])
+    3
+    >>> cog_overview_count([2, 8]) is None
+    True
+    """
+    expected = [2 ** (idx + 1) for idx in range(len(overview_levels))]
+    if not overview_levels or sorted(overview_levels) != expected:
+        return None
+    return len(overview_levels)
+
+
+def find_member(archive: zipfile.ZipFile, name: str) -> zipfile.ZipInfo:
+    """
+    Find archive member by its file name in any directory of the archive.
+    """
+    matches = [
+        info
+        for info in archive.infolist()
+        if not info.is_dir() and Path(info.filename).name == name
+    ]
+    if len(matches) != 1:
+        raise FileNotFoundError(
+            f"Expected exactly one member named {name} in {archive.filename}, "
+            f"found {len(matches)}."
+        )
+    return matches[0]
+
+
+def verify_member(
+    zip_path: Path, name: str, chunk_size: int = 2**24
+) -> Dict[str, str]:
+    """
+    Stream archive member through its CRC-32 check and get its checksums.
+
+    ``zipfile`` compares the CRC-32 of the decompressed data to the one in
+    the archive when the member is read to its end and raises
+    ``zipfile.BadZipFile`` on mismatch. Nothing is written to disk.
+    """
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(zip_path) as archive:
+        info = find_member(archive, name)
+        with archive.open(info) as member:
+            for chunk in iter(lambda: member.read(chunk_size), b""):
+                digest.update(chunk)
+    return dict(
+        member=info.filename, crc32=f"{info.CRC:08x}", sha256=digest.hexdigest()
+    )
+
+
+def prepare_raster(
+    raster_path: Path = typer.Option(...),
+    output_path: Path = typer.Option(...),
+    zip_path: Optional[Path] = typer.Option(
+        None,
+        exists=True,
+        dir_okay=False,
+        help="Read raster_path, by its file name, from within this zip archive.",
+    ),
+    manifest_path: Path = typer.Option(MANIFEST_PATH, dir_okay=False),
+    local_manifest_path: Path = typer.Option(LOCAL_MANIFEST_PATH, dir_okay=False),
+    record: bool = typer.Option(
+        False, help="Record checksums of the member in the committed manifest."
+    ),
+    compression: str = typer.Option("deflate"),
+    block_size: int = typer.Option(512),
+    overview_levels: List[int] = typer.Option(
+        list(OVERVIEW_LEVELS),
+        help=(
+            "Overview decimation factors. Levels other than 2, 4, 8, ... "
+            "are built without the COG driver."
+        ),
+    ),
+):
+    """
+    Convert raster to a tiled and compressed GeoTIFF with internal overviews.
+
+    The COG driver of GDAL (>= 3.1) is used if available. Otherwise, the
+    overviews are built into a tiled GeoTIFF which is then copied with the
+    overviews placed before the full resolution data as in a COG.
+
+    With the COG driver, overview_levels is passed as its ``OVERVIEW_COUNT``
+    (GDAL >= 3.6) and must then be 2, 4, 8, ... up to some level. Other levels
+    are built with the fallback instead.
+
+    If zip_path is given, the member is first streamed through its CRC-32
+    check and its checksums are compared to the ones committed in the
+    manifest. Checksums of a member missing from it are trusted on first use
+    and recorded in the local manifest, or in the committed one with record.
+    The member is then read through ``/vsizip/`` without extracting it.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    source: str
+    if zip_path is not None:
+        with timed(f"verify {raster_path.name}"):
+            checksums = verify_member(zip_path=zip_path, name=raster_path.name)
+        check_checksums(
+            section=MEMBERS_SECTION,
+            name=raster_path.name,
+            checksums=checksums,
+            manifest_path=manifest_path,
+            local_manifest_path=local_manifest_path,
+            record=record,
+        )
+        source = f"/vsizip/{zip_path.resolve()}/{checksums['member']}"
+    elif raster_path.is_file():
+        source = str(raster_path)
+    else:
+        raise FileNotFoundError(f"Expected raster at {raster_path}.")
+    # Written to a temporary path so an interrupted run leaves no output
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    creation_options = dict(
+        compress=compression, num_threads="ALL_CPUS", bigtiff="IF_SAFER"
+    )
+    try:
+        overview_count = cog_overview_count(overview_levels)
+        if overview_count is not None and _cog_driver_available():
+            with timed(f"cog {raster_path}"):
+                rasterio.shutil.copy(
+                    source,
+                    tmp_path,
+                    driver=COG_DRIVER,
+                    blocksize=block_size,
+                    overview_resampling="average",
+                    overview_count=overview_count,
+                    **creation_options,
+                )
+        else:
+            logging.info(
+                f"COG driver not available or overview levels {overview_levels} "
+                "not supported by it. Building overviews separately."
+            )
+            tiled_path = tmp_path.with_suffix(".tiled.tmp")
+            try:
+                with timed(f"tile {raster_path}"):
+                    rasterio.shutil.copy(
+                        source,
+                        tiled_path,
+                        driver=GTIFF_DRIVER,
+                        tiled=True,
+                        blockxsize=block_size,
+                        blockysize=block_size,
+                        **creation_options,
+                    )
+                with timed(f"overviews {raster_path}"):
+                    with rasterio.open(tiled_path, "r+") as raster:
+                        raster.build_overviews(overview_levels, Resampling.average)
+                        raster.update_tags(ns="rio_overview", resampling="average")
+                with timed(f"copy overviews {raster_path}"):
+                    rasterio.shutil.copy(
+                        tiled_path,
+                        tmp_path,
+                        driver=GTIFF_DRIVER,
+                        tiled=True,
+                        blockxsize=block_size,
+                        blockysize=block_size,
+                        copy_src_overviews=True,
+                        **creation_options,
+                    )
+            finally:
+                tiled_path.unlink(missing_ok=True)
+        tmp_path.replace(output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    print(f"Prepared {raster_path} as {output_path}.")
@@ -10,7 +10,7 @@ import pandas as pd
 import typer
 from beartype.typing import List
 
-from fractopo.general import read_geofile
+from geodata_cache import read_geofile
 
 
 def scientific_notation(value: int):
@@ -9,6 +9,8 @@ import pandas as pd
 import typer
 from beartype.typing import List
 
+from output_writer import write_csv_if_changed, write_text_if_changed
+
 # import utils
 
 
@@ -49,7 +51,7 @@ def set_wise_fits_table(
         values (<0.1) correspond to high statistical significance.
     """.strip()
     )
-    dataframe.to_csv(csv_output)
+    write_csv_if_changed(df=dataframe, path=csv_output)
     dataframe_latex = dataframe.to_latex(
         None,
         index=True,
@@ -60,4 +62,4 @@ def set_wise_fits_table(
         column_format="lp{0.7cm}p{1.1cm}p{1.1cm}p{1.1cm}p{1.1cm}p{1.1cm}p{1.1cm}p{1.3cm}",
     )
     assert isinstance(dataframe_latex, str)
-    latex_output.write_text(dataframe_latex)
+    write_text_if_changed(path=latex_output, text=dataframe_latex)
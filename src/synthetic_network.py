@@ -0,0 +1,246 @@
+"""
+Generate synthetic fracture trace networks from fitted length statistics.
+
+Traces are straight lines with lengths following the fitted length
+distribution of a scale: lengths above the power-law cut-off are drawn from
+the power-law and the proportion of lengths below it (``Cut-Off %``) from
+the lognormal distribution truncated at the cut-off. Azimuths are drawn
+uniformly within the azimuth sets in proportion to the set-wise trace counts
+and trace centers uniformly within a circular target area.
+
+Everything is drawn as arrays and the geometries are created from WKB in one
+call so that millions of traces can be generated in seconds.
+"""
+
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import typer
+from beartype.typing import List, NamedTuple, Tuple
+from scipy.special import ndtr, ndtri
+from shapely.geometry import Point
+
+from concatenate_scales import write_geodata
+from geodata_cache import PARQUET_SUFFIX
+from utils import print
+
+# Coordinate reference system of the trace data (ETRS-TM35FIN)
+CRS = "EPSG:3067"
+
+# Byte layout of a little-endian WKB LineString with two points
+LINESTRING_WKB_DTYPE = np.dtype(
+    [
+        ("byte_order", "u1"),
+        ("geometry_type", "<u4"),
+        ("count", "<u4"),
+        ("coords", "<f8", (4,)),
+    ]
+)
+WKB_LITTLE_ENDIAN = 1
+WKB_LINESTRING = 2
+
+
+class LengthParameters(NamedTuple):
+
+    """
+    Fitted length distribution parameters as in set_wise_df.csv.
+    """
+
+    exponent: float
+    cut_off: float
+    cut_off_percent: float
+    lognormal_sigma: float
+    lognormal_mu: float
+
+
+def read_set_wise_parameters(
+    set_wise_csv_path: Path, name: str, set_names: List[str]
+) -> Tuple[LengthParameters, np.ndarray]:
+    """
+    Read length parameters and azimuth set weights from set_wise_df.csv.
+
+    ``name`` is the name of the fitted length data, e.g., ``1:10 Traces All``.
+    The set weights are the trace counts of the respective set-wise rows.
+    """
+    set_wise_df = pd.read_csv(set_wise_csv_path, index_col="Name")
+
+    # Only names with set-wise rows for all sets, e.g., not branches, are valid
+    valid_names = [
+        valid_name
+        for valid_name in set_wise_df.index
+        if valid_name.rsplit(" ", 1)[-1] not in set_names
+        and all(
+            f"{valid_name.rsplit(' ', 1)[0]} {set_name}" in set_wise_df.index
+            for set_name in set_names
+        )
+    ]
+    if name not in valid_names:
+        raise typer.BadParameter(
+            f"No set-wise rows for name {name!r}. Expected one of {valid_names}.",
+            param_hint="'--name'",
+        )
+    row = set_wise_df.loc[name]
+    parameters = LengthParameters(
+        exponent=float(row["PL Exp."]),
+        cut_off=float(row[r"PL Cut-Off [$m$]"]),
+        cut_off_percent=float(row[r"Cut-Off \%"]),
+        lognormal_sigma=float(row["LN Sigma"]),
+        lognormal_mu=float(row["LN Mu"]),
+    )
+    prefix = name.rsplit(" ", 1)[0]
+    set_weights = np.array(
+        [set_wise_df.loc[f"{prefix} {set_name}", "n"] for set_name in set_names],
+        dtype=float,
+    )
+    return parameters, set_weights
+
+
+def synthetic_lengths(
+    rng: np.random.Generator, count: int, parameters: LengthParameters
+) -> np.ndarray:
+    """
+    Draw lengths from power-law tail and truncated lognormal body.
+    """
+    alpha = 1 - parameters.exponent
+    below_cut_off = rng.random(count) < parameters.cut_off_percent / 100
+    lengths = np.empty(count)
+
+    # Power-law by inverse transform sampling
+    tail_count = count - np.count_nonzero(below_cut_off)
+    lengths[~below_cut_off] = parameters.cut_off * (1 - rng.random(tail_count)) ** (
+        -1 / (alpha - 1)
+    )
+
+    # Lognormal truncated to below the cut-off by inverse transform sampling
+    cut_off_probability = ndtr(
+        (np.log(parameters.cut_off) - parameters.lognormal_mu)
+        / parameters.lognormal_sigma
+    )
+    probabilities = rng.random(count - tail_count) * cut_off_probability
+    lengths[below_cut_off] = np.exp(
+        parameters.lognormal_mu + parameters.lognormal_sigma * ndtri(probabilities)
+    )
+    return lengths
+
+
+def synthetic_azimuths(
+    rng: np.random.Generator,
+    count: int,
+    set_ranges: List[Tuple[int, int]],
+    set_weights: np.ndarray,
+) -> np.ndarray:
+    """
+    Draw azimuths uniformly within azimuth sets chosen by weight.
+
+    Set ranges may wrap around 180 degrees, e.g., (155, 25).
+    """
+    starts = np.array([start for start, _ in set_ranges], dtype=float)
+    widths = np.array([(end - start) % 180 for start, end in set_ranges], dtype=float)
+    sets = rng.choice(len(set_ranges), size=count, p=set_weights / set_weights.sum())
+    return (starts[sets] + rng.random(count) * widths[sets]) % 180
+
+
+def synthetic_centers(
+    rng: np.random.Generator, count: int, center: Tuple[float, float], radius: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draw points uniformly within a circle.
+    """
+    distances = radius * np.sqrt(rng.random(count))
+    angles = rng.random(count) * 2 * np.pi
+    return (
+        center[0] + distances * np.cos(angles),
+        center[1] + distances * np.sin(angles),
+    )
+
+
+def linestrings_from_arrays(
+    center_x: np.ndarray,
+    center_y: np.ndarray,
+    lengths: np.ndarray,
+    azimuths: np.ndarray,
+    crs: str = CRS,
+) -> gpd.GeoSeries:
+    """
+    Create straight traces from centers, lengths and azimuths.
+
+    The WKB of all traces is written into a single structured array so no
+    geometries are created one by one in Python.
+    """
+    radians = np.deg2rad(azimuths)
+    half_dx = lengths / 2 * np.sin(radians)
+    half_dy = lengths / 2 * np.cos(radians)
+
+    wkbs = np.empty(len(lengths), dtype=LINESTRING_WKB_DTYPE)
+    wkbs["byte_order"] = WKB_LITTLE_ENDIAN
+    wkbs["geometry_type"] = WKB_LINESTRING
+    wkbs["count"] = 2
+    wkbs["coords"] = np.stack(
+        [
+            center_x - half_dx,
+            center_y - half_dy,
+            center_x + half_dx,
+            center_y + half_dy,
+        ],
+        axis=1,
+    )
+    return gpd.GeoSeries.from_wkb(
+        wkbs.view(f"V{LINESTRING_WKB_DTYPE.itemsize}").tolist(), crs=crs
+    )
+
+
+def synthetic_network(
+    set_wise_csv_path: Path = typer.Option(..., exists=True, dir_okay=False),
+    azimuth_set_json_path: Path = typer.Option(..., exists=True),
+    traces_path: Path = typer.Option(...),
+    area_path: Path = typer.Option(...),
+    name: str = typer.Option("1:10 Traces All"),
+    trace_count: int = typer.Option(100000),
+    areal_frequency: float = typer.Option(1.0),
+    center_x: float = typer.Option(110000.0),
+    center_y: float = typer.Option(6720000.0),
+    seed: int = typer.Option(0),
+):
+    """
+    Generate synthetic traces and circular target area from fitted statistics.
+
+    The radius of the target area is chosen so that the number of trace
+    centers per square meter equals areal_frequency.
+
+    Paths with a ``.parquet`` suffix are written as GeoParquet, which is
+    much faster to write and read than GeoJSON with millions of traces.
+    """
+    azimuth_set_data = json.loads(azimuth_set_json_path.read_text())
+    set_names = [item["name"] for item in azimuth_set_data]
+    set_ranges = [(item["start"], item["end"]) for item in azimuth_set_data]
+    parameters, set_weights = read_set_wise_parameters(
+        set_wise_csv_path=set_wise_csv_path, name=name, set_names=set_names
+    )
+    print(f"Generating {trace_count} traces with {parameters}.")
+
+    rng = np.random.default_rng(seed)
+    radius = np.sqrt(trace_count / (np.pi * areal_frequency))
+    center = (center_x, center_y)
+    traces = linestrings_from_arrays(
+        *synthetic_centers(rng=rng, count=trace_count, center=center, radius=radius),
+        lengths=synthetic_lengths(rng=rng, count=trace_count, parameters=parameters),
+        azimuths=synthetic_azimuths(
+            rng=rng, count=trace_count, set_ranges=set_ranges, set_weights=set_weights
+        ),
+    )
+    area = gpd.GeoSeries([Point(center).buffer(radius, resolution=64)], crs=CRS)
+
+    for gdf, path in (
+        (gpd.GeoDataFrame(geometry=traces), traces_path),
+        (gpd.GeoDataFrame(geometry=area), area_path),
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == PARQUET_SUFFIX:
+            # Writing GeoJSON takes most of the time with millions of traces
+            gdf.to_parquet(path)
+        else:
+            write_geodata(gdf=gdf, path=path)
+        print(f"Saved synthetic data to: {path}")
@@ -0,0 +1,214 @@
+"""
+Tests for src/download.py.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import download
+
+CONTENT = os.urandom(10_000)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+
+    """
+    Serve CONTENT at /file with optional support for range requests.
+    """
+
+    def __init__(self, *args, supports_ranges: bool, requests: list, **kwargs):
+        """
+        Record Range headers of requests to requests.
+        """
+        self.supports_ranges = supports_ranges
+        self.requests = requests
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        """
+        Serve the whole content or the requested range of it.
+        """
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/file")
+            self.end_headers()
+            return
+        byte_range = self.headers.get("Range")
+        self.requests.append(byte_range)
+        match = re.match(r"bytes=(\d+)-(\d*)", byte_range or "")
+        if self.supports_ranges and match is not None:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(CONTENT) - 1
+            body = CONTENT[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        else:
+            body = CONTENT
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """
+        Do not log requests.
+        """
+
+
+@pytest.fixture(params=[True, False], ids=["ranges", "no_ranges"])
+def server(request):
+    """
+    Start local http server.
+
+    Yields its url, list of received Range headers and whether ranges are
+    supported.
+    """
+    requests = []
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        partial(RangeHandler, supports_ranges=request.param, requests=requests),
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests, request.param
+    httpd.shutdown()
+    httpd.server_close()
+
+
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def _write_manifest(manifest_path, url, sha256=SHA256):
+    manifest_path.write_text(
+        json.dumps({"files": {"file.zip": dict(url=url, sha256=sha256)}})
+    )
+    return manifest_path
+
+
+def test_download_file(server, tmp_path):
+    """
+    Test download_file from local server against the manifest.
+    """
+    url, _, _ = server
+    manifest_path = _write_manifest(tmp_path / "manifest.json", f"{url}/redirect")
+    manifest = manifest_path.read_text()
+    output_path = download.download_file(
+        url=f"{url}/redirect",
+        output_path=tmp_path / "file.zip",
+        manifest_path=manifest_path,
+        segment_size=1024,
+    )
+    assert output_path.read_bytes() == CONTENT
+    assert not (tmp_path / "file.zip.part").exists()
+    assert manifest_path.read_text() == manifest
+
+
+def test_download_file_first_use(server, tmp_path):
+    """
+    Test that a file not in the manifest is trusted on first use.
+
+    Its sha256 is recorded in the local manifest and only recorded in the
+    committed one with record.
+    """
+    url, requests, _ = server
+    manifest_path = tmp_path / "manifest.json"
+    local_manifest_path = tmp_path / "cache" / "manifest.json"
+    kwargs = dict(
+        url=f"{url}/file",
+        output_path=tmp_path / "file.zip",
+        manifest_path=manifest_path,
+        local_manifest_path=local_manifest_path,
+    )
+    output_path = download.download_file(**kwargs)
+    assert output_path.read_bytes() == CONTENT
+    assert not manifest_path.exists()
+    local_manifest = json.loads(local_manifest_path.read_text())
+    assert local_manifest["files"]["file.zip"] == dict(url=f"{url}/file", sha256=SHA256)
+
+    # Changed file does not match the checksum trusted on first use
+    output_path.write_bytes(CONTENT[::-1])
+    request_count = len(requests)
+    download.download_file(**kwargs)
+    assert output_path.read_bytes() == CONTENT
+    assert len(requests) > request_count
+
+    download.download_file(**kwargs, record=True)
+    manifest = json.loads(manifest_path.read_text())
+    assert manifest["files"]["file.zip"] == dict(url=f"{url}/file", sha256=SHA256)
+
+
+def test_download_file_resume(server, tmp_path):
+    """
+    Test that completed segments of a partial download are not downloaded again.
+    """
+    url, requests, supports_ranges = server
+    part_path = tmp_path / "file.zip.part"
+    part_path.write_bytes(CONTENT[:4096] + bytes(len(CONTENT) - 4096))
+    (tmp_path / "file.zip.part.json").write_text(
+        json.dumps(dict(url=f"{url}/file", size=len(CONTENT), completed=[0, 2048]))
+    )
+    output_path = download.download_file(
+        url=f"{url}/file",
+        output_path=tmp_path / "file.zip",
+        manifest_path=_write_manifest(tmp_path / "manifest.json", f"{url}/file"),
+        segment_size=2048,
+    )
+    assert output_path.read_bytes() == CONTENT
+    if supports_ranges:
+        # Probe and the three remaining segments, in any order
+        assert requests[0] == "bytes=0-0"
+        assert sorted(requests[1:]) == [
+            "bytes=4096-6143",
+            "bytes=6144-8191",
+            "bytes=8192-9999",
+        ]
+
+
+def test_download_file_mismatch(server, tmp_path):
+    """
+    Test that a download not matching the manifest is removed.
+    """
+    url, _, _ = server
+    manifest_path = _write_manifest(
+        tmp_path / "manifest.json", f"{url}/file", sha256="0" * 64
+    )
+    with pytest.raises(ValueError):
+        download.download_file(
+            url=f"{url}/file",
+            output_path=tmp_path / "file.zip",
+            manifest_path=manifest_path,
+        )
+    assert not (tmp_path / "file.zip").exists()
+
+
+def test_download_file_mirror(server, tmp_path):
+    """
+    Test that a download is added to and then used from the mirror.
+    """
+    url, requests, _ = server
+    mirror_path = tmp_path / "mirror"
+    manifest_path = _write_manifest(tmp_path / "manifest.json", f"{url}/file")
+    download.download_file(
+        url=f"{url}/file",
+        output_path=tmp_path / "first" / "file.zip",
+        manifest_path=manifest_path,
+        mirror_path=mirror_path,
+    )
+    assert (mirror_path / "file.zip").read_bytes() == CONTENT
+    request_count = len(requests)
+
+    output_path = download.download_file(
+        url=f"{url}/file",
+        output_path=tmp_path / "second" / "file.zip",
+        manifest_path=manifest_path,
+        mirror_path=mirror_path,
+    )
+    assert output_path.read_bytes() == CONTENT
+    assert len(requests) == request_count
@@ -0,0 +1,104 @@
+"""
+Tests for src/length_fits.py.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import powerlaw
+import pytest
+
+import length_fits
+from fractopo.analysis import length_distributions
+
+TRACES_PATH = Path(__file__).parent.parent.parent / "data/trace_data/traces"
+TRACE_PATHS = [
+    TRACES_PATH / "20m/getaberget_20m_4_traces.geojson",
+    TRACES_PATH / "200000/ahvenanmaa_integrated_lineaments_1_200000_traces.geojson",
+    TRACES_PATH / "200000/ahvenanmaa_mag_lineaments_1_200000_traces.geojson",
+]
+
+
+@lru_cache(maxsize=None)
+def _lengths(path: Path) -> np.ndarray:
+    return gpd.read_file(path).length.values
+
+
+@lru_cache(maxsize=None)
+def _powerlaw_fit(path: Path) -> powerlaw.Fit:
+    """
+    Fit with the cut-off search of powerlaw.
+    """
+    return powerlaw.Fit(_lengths(path), verbose=False)
+
+
+@pytest.mark.parametrize("path", TRACE_PATHS, ids=lambda path: path.stem)
+def test_scan_xmin(path):
+    """
+    Test that scan_xmin finds the same cut-off as powerlaw.Fit.
+    """
+    fit = _powerlaw_fit(path)
+    scan = length_fits.scan_xmin(*length_fits.preprocess_lengths(_lengths(path)))
+    assert scan.xmin == fit.xmin
+    assert np.isclose(scan.alpha, fit.alpha, rtol=1e-12)
+    assert np.isclose(scan.D, fit.D, rtol=1e-9)
+    assert scan.n_tail == len(fit.data)
+
+
+@pytest.mark.parametrize("path", TRACE_PATHS, ids=lambda path: path.stem)
+def test_determine_fit(path):
+    """
+    Test that determine_fit matches powerlaw.Fit.
+    """
+    expected = _powerlaw_fit(path)
+    fit = length_fits.determine_fit(_lengths(path))
+    assert fit.xmin == expected.xmin
+    assert np.isclose(fit.alpha, expected.alpha, rtol=1e-12)
+    assert np.isclose(fit.power_law.D, expected.power_law.D, rtol=1e-9)
+    assert np.isclose(fit.lognormal.mu, expected.lognormal.mu, rtol=1e-6)
+    assert np.isclose(fit.lognormal.sigma, expected.lognormal.sigma, rtol=1e-6)
+
+
+def test_determine_fit_guards():
+    """
+    Test determine_fit with empty lengths and a cut-off above the lengths.
+    """
+    assert length_fits.determine_fit(np.array([])) is None
+    lengths = _lengths(TRACE_PATHS[-1])
+    with pytest.raises(ValueError):
+        length_fits.determine_fit(lengths, cut_off=lengths.max())
+
+
+@pytest.mark.parametrize("path", TRACE_PATHS, ids=lambda path: path.stem)
+@pytest.mark.parametrize("name", ["power_law", "exponential", "lognormal"])
+@pytest.mark.parametrize("with_data", [False, True])
+def test_ks(path, name, with_data):
+    """
+    Test that _KS matches the KS statistics of powerlaw.
+    """
+    fit = length_fits.determine_fit(_lengths(path))
+    distribution = getattr(fit, name)
+    data = _lengths(path) if with_data else None
+    statistics = ("D", "D_plus", "D_minus", "Kappa", "V")
+
+    length_fits.UPSTREAM_KS(distribution, data=data)
+    expected = [getattr(distribution, statistic) for statistic in statistics]
+    length_fits._KS(distribution, data=data)
+    result = [getattr(distribution, statistic) for statistic in statistics]
+    assert np.allclose(result, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_install(monkeypatch):
+    """
+    Test that fits are only replaced by install.
+    """
+    monkeypatch.setattr(powerlaw.Distribution, "KS", length_fits.UPSTREAM_KS)
+    monkeypatch.setattr(
+        length_distributions, "determine_fit", length_distributions.determine_fit
+    )
+    assert powerlaw.Distribution.KS is not length_fits._KS
+    length_fits.install()
+    assert powerlaw.Distribution.KS is length_fits._KS
+    assert length_distributions.determine_fit is length_fits.determine_fit
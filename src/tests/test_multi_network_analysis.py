@@ -0,0 +1,52 @@
+"""
+Tests for src/multi_network_analysis.py.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+import multi_network_analysis
+
+
+def _rasterized_length_plot():
+    """
+    Create length plot with a scatter that is decimated and rasterized.
+    """
+    lengths = np.sort(np.random.default_rng(0).pareto(1.5, 5000) + 1.0)
+    ccm = 1.0 - np.arange(len(lengths)) / len(lengths)
+    fig, ax = plt.subplots()
+    ax.scatter(lengths, ccm, s=2)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    multi_network_analysis.compact_length_plot(
+        fig, points_per_decade=50, rasterize_min_points=10
+    )
+    assert any(collection.get_rasterized() for collection in ax.collections)
+    return fig
+
+
+def test_save_fig_rasterized_unchanged(tmp_path):
+    """
+    Test that saving an unchanged rasterized svg leaves the file untouched.
+    """
+    path = tmp_path / "length_plot.svg"
+    multi_network_analysis.save_fig(
+        _rasterized_length_plot(),
+        results_dir=tmp_path,
+        name=path.stem,
+        extension="svg",
+        dpi=multi_network_analysis.RASTERIZED_DPI,
+    )
+    saved = path.read_bytes()
+    modified = path.stat().st_mtime_ns
+    assert b"<image" in saved
+
+    multi_network_analysis.save_fig(
+        _rasterized_length_plot(),
+        results_dir=tmp_path,
+        name=path.stem,
+        extension="svg",
+        dpi=multi_network_analysis.RASTERIZED_DPI,
+    )
+    assert path.read_bytes() == saved
+    assert path.stat().st_mtime_ns == modified
@@ -0,0 +1,83 @@
+"""
+Tests for src/prepare_rasters.py.
+"""
+
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+
+from rasterio.transform import from_origin  # noqa: E402
+
+import prepare_rasters  # noqa: E402
+
+RASTER_NAME = "raster.tif"
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    """
+    Write a small raster into a zip archive under a directory.
+    """
+    raster_path = tmp_path / RASTER_NAME
+    with rasterio.open(
+        raster_path,
+        "w",
+        driver="GTiff",
+        width=256,
+        height=256,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:3067",
+        transform=from_origin(1000.0, 2000.0, 0.1, 0.1),
+    ) as dataset:
+        dataset.write(np.arange(256 * 256, dtype="uint8").reshape(1, 256, 256))
+    zip_path = tmp_path / "rasters.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(raster_path, arcname=f"rasters/{RASTER_NAME}")
+    raster_path.unlink()
+    return zip_path
+
+
+def _prepare_raster(zip_path, manifest_path, record=False):
+    output_path = zip_path.parent / "prepared" / RASTER_NAME
+    prepare_rasters.prepare_raster(
+        raster_path=zip_path.parent / RASTER_NAME,
+        output_path=output_path,
+        zip_path=zip_path,
+        manifest_path=manifest_path,
+        local_manifest_path=zip_path.parent / "cache" / manifest_path.name,
+        record=record,
+        compression="deflate",
+        block_size=128,
+        overview_levels=[2, 4],
+    )
+    return output_path
+
+
+def test_prepare_raster_checksums(zip_path, tmp_path):
+    """
+    Test that members are checked against the recorded checksums.
+
+    Checksums of members missing from the manifest are trusted on first use.
+    """
+    manifest_path = tmp_path / "manifest.json"
+    local_manifest_path = tmp_path / "cache" / manifest_path.name
+    output_path = _prepare_raster(zip_path, manifest_path)
+    assert not manifest_path.exists()
+    recorded = json.loads(local_manifest_path.read_text())["members"][RASTER_NAME]
+    assert recorded["member"] == f"rasters/{RASTER_NAME}"
+    with rasterio.open(output_path) as raster:
+        assert raster.overviews(1) == [2, 4]
+
+    _prepare_raster(zip_path, manifest_path, record=True)
+    assert json.loads(manifest_path.read_text())["members"][RASTER_NAME] == recorded
+
+    manifest_path.write_text(
+        json.dumps({"members": {RASTER_NAME: dict(recorded, sha256="0" * 64)}})
+    )
+    with pytest.raises(ValueError):
+        _prepare_raster(zip_path, manifest_path)
@@ -0,0 +1,85 @@
+"""
+Tests for src/visualize_drone_rasters.py.
+"""
+
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+
+from rasterio.io import MemoryFile  # noqa: E402
+from rasterio.transform import Affine, from_origin  # noqa: E402
+
+import visualize_drone_rasters  # noqa: E402
+
+# 100 x 100 raster of 0.1 m pixels with origin at (1000, 2000)
+WIDTH, HEIGHT, PIXEL_SIZE = 100, 100, 0.1
+TRANSFORM = from_origin(1000.0, 2000.0, PIXEL_SIZE, PIXEL_SIZE)
+
+
+@pytest.fixture
+def raster():
+    """
+    Open an in-memory three band raster.
+    """
+    data = np.arange(3 * HEIGHT * WIDTH, dtype="uint16").reshape(3, HEIGHT, WIDTH)
+    with MemoryFile() as memfile:
+        with memfile.open(
+            driver="GTiff",
+            width=WIDTH,
+            height=HEIGHT,
+            count=3,
+            dtype=data.dtype,
+            crs="EPSG:3067",
+            transform=TRANSFORM,
+        ) as dataset:
+            dataset.write(data)
+        with memfile.open() as dataset:
+            yield dataset
+
+
+@pytest.mark.parametrize(
+    "bounds,resolution,expected_shape,expected_transform",
+    [
+        # Decimated to 0.5 m pixels
+        (
+            (1001.0, 1992.0, 1005.0, 1998.0),
+            0.5,
+            (3, 12, 8),
+            Affine(0.5, 0.0, 1001.0, 0.0, -0.5, 1998.0),
+        ),
+        # Finer resolution than the raster is not upsampled
+        (
+            (1001.0, 1992.0, 1005.0, 1998.0),
+            0.01,
+            (3, 60, 40),
+            Affine(PIXEL_SIZE, 0.0, 1001.0, 0.0, -PIXEL_SIZE, 1998.0),
+        ),
+        # Bounds partly outside the raster are clipped to it
+        (
+            (995.0, 1995.0, 1002.0, 2005.0),
+            1.0,
+            (3, 5, 2),
+            Affine(1.0, 0.0, 1000.0, 0.0, -1.0, 2000.0),
+        ),
+    ],
+)
+def test_read_decimated(raster, bounds, resolution, expected_shape, expected_transform):
+    """
+    Test read_decimated output shape and transform.
+    """
+    data, transform = visualize_drone_rasters.read_decimated(
+        raster, bounds=bounds, resolution=resolution
+    )
+    assert data.shape == expected_shape
+    assert transform.almost_equals(expected_transform)
+
+
+def test_read_decimated_no_overlap(raster):
+    """
+    Test that read_decimated raises ValueError with bounds outside the raster.
+    """
+    with pytest.raises(ValueError, match="do not overlap"):
+        visualize_drone_rasters.read_decimated(
+            raster, bounds=(0.0, 0.0, 10.0, 10.0), resolution=0.5
+        )
@@ -0,0 +1,126 @@
+"""
+Tests for src/wfs.py.
+"""
+
+import json
+import threading
+import urllib.parse
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import wfs
+
+# Points along a line, some of which are within BOUNDS
+POINTS = [(float(x), 6650000.0 + x / 2) for x in range(0, 200000, 1000)]
+BOUNDS = (80000.0, 6650000.0, 140000.0, 6725000.0)
+
+
+def _within(point, bounds) -> bool:
+    x, y = point
+    min_x, min_y, max_x, max_y = bounds
+    return min_x <= x <= max_x and min_y <= y <= max_y
+
+
+class WFSHandler(BaseHTTPRequestHandler):
+
+    """
+    Serve POINTS as a WFS 2.0.0 GetFeature stand-in with BBOX and paging.
+    """
+
+    def __init__(self, *args, report_hits: bool, requests: list, **kwargs):
+        """
+        Record query parameters of requests to requests.
+        """
+        self.report_hits = report_hits
+        self.requests = requests
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        """
+        Respond to hits and paged GetFeature requests.
+        """
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+        self.requests.append(params)
+        assert params["request"] == "GetFeature"
+        bounds = tuple(map(float, params["bbox"].split(",")[:4]))
+        matched = [point for point in POINTS if _within(point, bounds)]
+        if params.get("resultType") == "hits":
+            number = len(matched) if self.report_hits else "unknown"
+            body = (
+                f'<wfs:FeatureCollection numberMatched="{number}" numberReturned="0"/>'
+            ).encode()
+        else:
+            start = int(params["startIndex"])
+            page = matched[start : start + int(params["count"])]
+            body = json.dumps(
+                dict(
+                    type="FeatureCollection",
+                    features=[
+                        dict(
+                            type="Feature",
+                            properties=dict(x=x),
+                            geometry=dict(type="Point", coordinates=[x, y]),
+                        )
+                        for x, y in page
+                    ],
+                )
+            ).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """
+        Do not log requests.
+        """
+
+
+@pytest.fixture(params=[True, False], ids=["hits", "no_hits"])
+def server(request):
+    """
+    Start local WFS stand-in.
+
+    Yields its url and list of received query parameters.
+    """
+    requests = []
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        partial(WFSHandler, report_hits=request.param, requests=requests),
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/wfs?", requests
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_features(server, tmp_path):
+    """
+    Test fetch_features within bounds in pages and that responses are cached.
+    """
+    url, requests = server
+    expected = sorted(x for x, _ in filter(partial(_within, bounds=BOUNDS), POINTS))
+    kwargs = dict(
+        url=url,
+        type_name="test:points",
+        bounds=BOUNDS,
+        page_size=7,
+        workers=3,
+        cache_dir=tmp_path,
+    )
+    gdf = wfs.fetch_features(**kwargs)
+    assert len(expected) == 61
+    assert sorted(gdf["x"]) == expected
+    assert gdf.crs.to_epsg() == 3067
+    assert all(
+        request["bbox"] == wfs.bbox_param(BOUNDS, wfs.SRS) for request in requests
+    )
+    assert all(int(request.get("count", 7)) == 7 for request in requests)
+    request_count = len(requests)
+
+    cached = wfs.fetch_features(**kwargs)
+    assert len(requests) == request_count
+    assert sorted(cached["x"]) == expected
@@ -0,0 +1,106 @@
+"""
+Persistent cache of Network branch and node topology.
+
+Determination of branches and nodes is the dominant cost of creating a
+``Network``. The determined topology is stored as GeoParquet keyed by the
+content digests of the trace and area inputs and the topology-relevant
+``Network`` parameters so that it can be reused as long as none of these
+change.
+"""
+
+import json
+import logging
+import os
+from hashlib import sha256
+from pathlib import Path
+
+import geopandas as gpd
+from beartype.typing import Optional, Tuple
+
+import fractopo
+from geodata_cache import PARQUET_AVAILABLE, PARQUET_SUFFIX
+from utils import CACHE_PATH, file_digest
+
+TOPOLOGY_CACHE_PATH = CACHE_PATH / "topology"
+BRANCHES = "branches"
+NODES = "nodes"
+
+
+def topology_key(
+    traces_path: Path,
+    area_path: Path,
+    circular_target_area: bool,
+    truncate_traces: bool,
+    snap_threshold: float,
+) -> str:
+    """
+    Compose cache key of the topology of a Network.
+    """
+    key_data = dict(
+        traces=file_digest(traces_path),
+        area=file_digest(area_path),
+        circular_target_area=circular_target_area,
+        truncate_traces=truncate_traces,
+        snap_threshold=snap_threshold,
+        fractopo_version=fractopo.__version__,
+    )
+    return sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+def _topology_paths(key: str, cache_dir: Path) -> Tuple[Path, Path]:
+    return (
+        cache_dir / f"{key}_{BRANCHES}{PARQUET_SUFFIX}",
+        cache_dir / f"{key}_{NODES}{PARQUET_SUFFIX}",
+    )
+
+
+def load_topology(
+    key: str, cache_dir: Path = TOPOLOGY_CACHE_PATH
+) -> Optional[Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]]:
+    """
+    Load cached branches and nodes.
+
+    Returns None on cache miss or if ``pyarrow`` is not installed.
+    """
+    if not PARQUET_AVAILABLE:
+        return None
+    branch_path, node_path = _topology_paths(key=key, cache_dir=cache_dir)
+    if not (branch_path.exists() and node_path.exists()):
+        return None
+    try:
+        branch_gdf, node_gdf = (
+            gpd.read_parquet(branch_path),
+            gpd.read_parquet(node_path),
+        )
+    except Exception:
+        logging.warning(f"Failed to load cached topology {key}.", exc_info=True)
+        return None
+    logging.info(f"Loaded cached topology {key}.")
+    return branch_gdf, node_gdf
+
+
+def save_topology(
+    key: str,
+    branch_gdf: gpd.GeoDataFrame,
+    node_gdf: gpd.GeoDataFrame,
+    cache_dir: Path = TOPOLOGY_CACHE_PATH,
+):
+    """
+    Save branches and nodes to cache.
+
+    Does nothing if ``pyarrow`` is not installed.
+    """
+    if not PARQUET_AVAILABLE:
+        return
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for path, gdf in zip(
+        _topology_paths(key=key, cache_dir=cache_dir), (branch_gdf, node_gdf)
+    ):
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            gdf.to_parquet(tmp_path)
+            tmp_path.replace(path)
+        except Exception:
+            logging.warning(f"Failed to cache topology {key}.", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+            return
@@ -2,13 +2,61 @@
 General utilities.
 """
 
+import hashlib
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from beartype.typing import Any, Dict, Iterator, List
 from rich.console import Console
 
 CONSOLE = Console()
 
+# Root directory of on-disk caches shared by the analysis stages
+CACHE_PATH = Path(os.environ.get("ALAND_CACHE_PATH", ".cache"))
+
 
 print = CONSOLE.print
 
+# Named stage durations recorded with timed
+TIMINGS: List[Dict[str, Any]] = []
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """
+    Get peak resident set size of process in megabytes.
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Record duration and peak resident set size of a named stage.
+
+    Records are appended to ``TIMINGS`` and written by the ``--timings``
+    option of ``cli.py``.
+    """
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS.append(
+            dict(
+                name=name,
+                started=started,
+                seconds=time.perf_counter() - start,
+                peak_rss_mb=peak_rss_mb(),
+                pid=os.getpid(),
+            )
+        )
+
 
 def wide_table(latex_table: str) -> str:
     """
@@ -17,3 +65,14 @@ def wide_table(latex_table: str) -> str:
     return latex_table.replace(r"\begin{table}", r"\begin{table*}").replace(
         r"\end{table}", r"\end{table*}"
     )
+
+
+def file_digest(path: Path, chunk_size: int = 2**20) -> str:
+    """
+    Get sha256 hexdigest of file contents.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as openfile:
+        for chunk in iter(lambda: openfile.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
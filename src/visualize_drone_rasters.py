@@ -2,16 +2,24 @@
 Script to visualize drone target areas and traces.
 """
 
+from math import ceil
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import rasterio
 import seaborn as sns
 import typer
-from beartype.typing import List
+from beartype.typing import List, Tuple
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.io import DatasetReader
 from rasterio.plot import show
+from rasterio.transform import Affine
+from rasterio.windows import Window, from_bounds
 
-from fractopo.general import read_geofile
+from geodata_cache import read_geofile
 
 RASTER_AREA_PAIRS = {
     # "getaberget1_20m_070820_orto_test_1_1_area.tif": [
@@ -89,15 +97,60 @@ RASTER_AREA_PAIRS = {
 }
 
 
+# Pixel size (m) at which rasters are visualized
+RESOLUTION = 0.5
+
+
+def read_decimated(
+    raster: DatasetReader,
+    bounds: Tuple[float, float, float, float],
+    resolution: float,
+) -> Tuple[np.ndarray, Affine]:
+    """
+    Read raster within bounds at resolution.
+
+    Only the window within bounds is read and it is decimated while reading
+    so that GDAL can use internal overviews and memory use is proportional to
+    the output pixels. Rasters are never upsampled.
+
+    Raises ValueError if bounds do not overlap the raster.
+    """
+    try:
+        window = from_bounds(*bounds, transform=raster.transform).intersection(
+            Window(0, 0, raster.width, raster.height)
+        )
+    except WindowError as exc:
+        raise ValueError(
+            f"Bounds {bounds} do not overlap raster {raster.name} "
+            f"with bounds {tuple(raster.bounds)}."
+        ) from exc
+    pixel_width, pixel_height = (abs(value) for value in raster.res)
+    out_width = max(1, ceil(window.width * min(pixel_width / resolution, 1.0)))
+    out_height = max(1, ceil(window.height * min(pixel_height / resolution, 1.0)))
+    data = raster.read(
+        window=window,
+        out_shape=(raster.count, out_height, out_width),
+        resampling=Resampling.average,
+    )
+    transform = raster.window_transform(window) * Affine.scale(
+        window.width / out_width, window.height / out_height
+    )
+    return data, transform
+
+
 def visualize_drone_rasters(
     traces_paths: List[Path] = typer.Option(...),
     area_paths: List[Path] = typer.Option(...),
     raster_path: Path = typer.Option(...),
     output_path: Path = typer.Option(...),
+    resolution: float = typer.Option(RESOLUTION),
     # polygons: bool = typer.Option(...),
 ):
     """
     Visualize drone rasters.
+
+    Only the part of the raster within the bounds of the traces and areas is
+    read at the given resolution (m).
     """
     # raster_name = raster_path.name
     # raster_areas = RASTER_AREA_PAIRS[raster_name]["areas"]
@@ -107,10 +160,16 @@ def visualize_drone_rasters(
     area_gdfs = [read_geofile(path) for path in area_paths]
     traces_gdfs = [read_geofile(path) for path in traces_paths]
 
+    min_x, min_y, max_x, max_y = pd.concat(
+        [gdf.geometry for gdf in [*area_gdfs, *traces_gdfs]]
+    ).total_bounds
+
     fig, ax = plt.subplots()
     with rasterio.open(raster_path) as raster:
-
-        show(raster.read(), transform=raster.transform, ax=ax)
+        data, transform = read_decimated(
+            raster=raster, bounds=(min_x, min_y, max_x, max_y), resolution=resolution
+        )
+    show(data, transform=transform, ax=ax)
 
     for traces_gdf in traces_gdfs:
         traces_gdf.plot(color="blue", ax=ax, linewidth=0.25)
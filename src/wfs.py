@@ -0,0 +1,239 @@
+"""
+Download features within a bounding box from a WFS service.
+
+Only features intersecting the bounding box are requested (``BBOX``) and
+they are requested in pages (``startIndex`` and ``count``) that are fetched
+concurrently once the number of matching features is known. Responses are
+cached on disk by the request parameters so that repeated downloads, e.g.
+after a failed page, do not request the same pages again.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import typer
+from beartype.typing import Dict, List, Optional, Tuple
+from shapely.wkt import loads
+
+from utils import CACHE_PATH, print, timed
+
+WFS_CACHE_PATH = CACHE_PATH / "wfs"
+
+WFS_VERSION = "2.0.0"
+SRS = "EPSG:3067"
+PAGE_SIZE = 1000
+WORKERS = 4
+TIMEOUT = 120
+
+# E.g. numberMatched="1234" of wfs:FeatureCollection
+NUMBER_MATCHED_PATTERN = re.compile(rb'numberMatched="(\d+)"')
+
+
+def srs_urn(srs: str) -> str:
+    """
+    Convert EPSG code to the urn form used in WFS 2.0.0 requests.
+
+    >>> srs_urn("EPSG:3067")
+    'urn:ogc:def:crs:EPSG::3067'
+    """
+    authority, code = srs.split(":")
+    return f"urn:ogc:def:crs:{authority}::{code}"
+
+
+def bbox_param(bounds: Tuple[float, float, float, float], srs: str) -> str:
+    """
+    Create BBOX parameter from bounds.
+
+    >>> bbox_param((80000.0, 6650000.0, 140000.0, 6725000.0), "EPSG:3067")
+    '80000.0,6650000.0,140000.0,6725000.0,urn:ogc:def:crs:EPSG::3067'
+    """
+    return ",".join([*map(str, bounds), srs_urn(srs)])
+
+
+def get_feature_params(
+    type_name: str,
+    bounds: Tuple[float, float, float, float],
+    srs: str = SRS,
+    output_format: Optional[str] = None,
+    **extra: str,
+) -> Dict[str, str]:
+    """
+    Create parameters of GetFeature request.
+    """
+    params = dict(
+        service="WFS",
+        version=WFS_VERSION,
+        request="GetFeature",
+        typeNames=type_name,
+        srsName=srs_urn(srs),
+        bbox=bbox_param(bounds, srs),
+        **extra,
+    )
+    if output_format is not None:
+        params["outputFormat"] = output_format
+    return params
+
+
+def fetch(
+    url: str,
+    params: Dict[str, str],
+    cache_dir: Optional[Path] = WFS_CACHE_PATH,
+    timeout: float = TIMEOUT,
+) -> bytes:
+    """
+    Fetch response to request through the on-disk cache.
+
+    Responses are cached by the url and the sorted request parameters.
+    """
+    query = urllib.parse.urlencode(sorted(params.items()))
+    request_url = f"{url}{'&' if '?' in url else '?'}{query}"
+    cached_path = None
+    if cache_dir is not None:
+        digest = hashlib.sha256(request_url.encode()).hexdigest()
+        cached_path = cache_dir / f"{digest}.xml"
+        if cached_path.exists():
+            return cached_path.read_bytes()
+
+    with urllib.request.urlopen(request_url, timeout=timeout) as response:
+        content = response.read()
+    if b"ExceptionReport" in content[:1000]:
+        raise ValueError(f"WFS request {request_url} failed: {content[:1000]!r}")
+
+    if cached_path is not None:
+        tmp_path = cached_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            cached_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(content)
+            tmp_path.replace(cached_path)
+        except Exception:
+            logging.warning(f"Failed to cache {request_url}.", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+    return content
+
+
+def number_matched(content: bytes) -> Optional[int]:
+    """
+    Parse number of matched features from hits response.
+
+    >>> number_matched(b'<wfs:FeatureCollection numberMatched="12"/>')
+    12
+    >>> number_matched(b'<wfs:FeatureCollection numberMatched="unknown"/>') is None
+    True
+    """
+    match = NUMBER_MATCHED_PATTERN.search(content)
+    return None if match is None else int(match.group(1))
+
+
+def read_page(content: bytes, srs: str) -> gpd.GeoDataFrame:
+    """
+    Read features of a page response.
+
+    Coordinates are in the requested srs (``srsName``) even if the format,
+    e.g. GeoJSON, implies another.
+    """
+    return gpd.read_file(io.BytesIO(content)).set_crs(srs, allow_override=True)
+
+
+def fetch_features(
+    url: str,
+    type_name: str,
+    bounds: Tuple[float, float, float, float],
+    srs: str = SRS,
+    output_format: Optional[str] = None,
+    page_size: int = PAGE_SIZE,
+    workers: int = WORKERS,
+    cache_dir: Optional[Path] = WFS_CACHE_PATH,
+) -> gpd.GeoDataFrame:
+    """
+    Fetch features of type_name intersecting bounds in concurrent pages.
+
+    If the service does not report the number of matched features, pages
+    are fetched in batches of workers until a page is not full.
+    """
+    params = get_feature_params(
+        type_name=type_name, bounds=bounds, srs=srs, output_format=output_format
+    )
+
+    def fetch_page(start_index: int) -> bytes:
+        return fetch(
+            url=url,
+            params=dict(params, startIndex=str(start_index), count=str(page_size)),
+            cache_dir=cache_dir,
+        )
+
+    with timed(f"wfs hits {type_name}"):
+        total = number_matched(
+            fetch(url=url, params=dict(params, resultType="hits"), cache_dir=cache_dir)
+        )
+    pages: List[gpd.GeoDataFrame] = []
+    with timed(f"wfs pages {type_name}"), ThreadPoolExecutor(workers) as executor:
+        if total is not None:
+            starts = range(0, total, page_size)
+            pages = [
+                read_page(content, srs=srs)
+                for content in executor.map(fetch_page, starts)
+            ]
+        else:
+            start = 0
+            while len(pages) == 0 or len(pages[-1]) == page_size:
+                starts = range(start, start + workers * page_size, page_size)
+                batch = [
+                    read_page(content, srs=srs)
+                    for content in executor.map(fetch_page, starts)
+                ]
+                # Pages after the first non-full page are empty
+                for page in batch:
+                    pages.append(page)
+                    if len(page) < page_size:
+                        break
+                start += workers * page_size
+
+    non_empty = [page for page in pages if len(page) > 0]
+    if len(non_empty) == 0:
+        return gpd.GeoDataFrame(geometry=[], crs=srs)
+    gdf = gpd.GeoDataFrame(pd.concat(non_empty, ignore_index=True), crs=srs)
+    if total is not None and len(gdf) != total:
+        raise ValueError(
+            f"Expected {total} features of {type_name} from {url}, got {len(gdf)}."
+        )
+    return gdf
+
+
+def wfs_download(
+    url: str = typer.Option(...),
+    type_name: str = typer.Option(...),
+    bbox_wkt_path: Path = typer.Option(..., exists=True, dir_okay=False),
+    output_path: Path = typer.Option(..., dir_okay=False),
+    srs: str = typer.Option(SRS),
+    output_format: Optional[str] = typer.Option(None),
+    page_size: int = typer.Option(PAGE_SIZE),
+    workers: int = typer.Option(WORKERS),
+    cache: bool = typer.Option(True),
+):
+    """
+    Download features intersecting the bounds of WKT geometry from WFS service.
+    """
+    bounds = loads(bbox_wkt_path.read_text()).bounds
+    gdf = fetch_features(
+        url=url,
+        type_name=type_name,
+        bounds=bounds,
+        srs=srs,
+        output_format=output_format,
+        page_size=page_size,
+        workers=workers,
+        cache_dir=WFS_CACHE_PATH if cache else None,
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.unlink(missing_ok=True)
+    gdf.to_file(output_path, driver="GeoJSON")
+    print(f"Saved {len(gdf)} features of {type_name} within {bounds} to {output_path}.")